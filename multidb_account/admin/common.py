@@ -17,11 +17,12 @@ from django.views.decorators.csrf import csrf_protect
 from django.core.urlresolvers import reverse
 from django.http import HttpResponseRedirect
 from django.utils.translation import ugettext_lazy as _
-from django.conf import settings as django_settings
 
+from multidb_account.fanout import fan_out
 from multidb_account.promocode.models import Promocode
+from multidb_account.shards import get_shard_databases
 from multidb_account.sport.models import Sport, ChosenSport
-from multidb_account.assessment.models import AssessmentTopCategory, AssessmentTopCategoryPermission
+from multidb_account.assessment.models import AssessmentTopCategory
 from multidb_account.user.models import BaseCustomUser
 
 csrf_protect_m = method_decorator(csrf_protect)
@@ -70,14 +71,14 @@ class CustomAdminSite(AdminSite):
 
 # Create site admin for every LOCALIZED_DATABASE
 SITE_ADMINS = []
-for db in django_settings.DATABASES:
+for db in get_shard_databases():
     SITE_ADMINS.append({
         'name': db,
         'value': CustomAdminSite(name='admin_' + db)
     })
 
 
-databases_expr = '|'.join(django_settings.DATABASES)
+databases_expr = '|'.join(get_shard_databases())
 RE_ADMIN_LOCALIZED_DB = re.compile(r'/admin/(' + databases_expr + r')/')
 
 
@@ -178,15 +179,14 @@ class CustomLogEntry(LogEntry):
 
 
 def get_localized_db():
-    from multidb_account.middleware import thread_locals
-    return thread_locals.admin_show_localized_db
+    from multidb_account.shards import get_admin_shard
+    return get_admin_shard()
 
 
 def delete_selected(modeladmin, request, queryset):
 
     if modeladmin.sync_databases:
-        for db in django_settings.DATABASES.keys():
-            queryset.using(db).delete()
+        fan_out(lambda db: queryset.using(db).delete(), get_shard_databases(), skip_unavailable=False)
     else:
         queryset.delete()
 
@@ -213,7 +213,7 @@ class MultiDBAdminMixin(object):
 
         # Tell Django to save objects to the localized database.
         if self.sync_databases:
-            for db_ in django_settings.DATABASES.keys():
+            for db_ in get_shard_databases():
                 self._handle_promocode_updates(change, db_, obj, old_obj)
 
                 if not change:
@@ -249,45 +249,17 @@ class MultiDBAdminMixin(object):
 
     @staticmethod
     def _create_assessment_top_category(sport, db_):
-        asses_top_cat = AssessmentTopCategory.objects.using(db_).create(
+        # Every assessor assessed pair is denied the new top category (see AssessmentAccess): nothing else to create
+        AssessmentTopCategory.objects.using(db_).create(
             id=sport.id, name=sport.name, description=sport.description,
             sport=sport)
 
-        MultiDBAdminMixin._handle_topcategory_creation(False, db_, asses_top_cat)
-
-    @staticmethod
-    def _handle_topcategory_creation(change, db_, obj):
-        if change or type(obj) != AssessmentTopCategory:
-            return
-
-        # For each new AssessmentTopCategory create related A
-        # AssessmentTopCategoryPermissions for every assessed assessor pair
-        first_obj = AssessmentTopCategoryPermission.objects.using(db_).first()
-
-        if first_obj is None:
-            return
-
-        all_permissions = AssessmentTopCategoryPermission.objects.using(db_)\
-            .filter(assessment_top_category=first_obj.assessment_top_category)
-
-        new_permissions = [
-            AssessmentTopCategoryPermission(
-                assessment_top_category=obj,
-                assessor_has_access=False,
-                assessed=permission.assessed,
-                assessor=permission.assessor,
-
-            ) for permission in all_permissions]
-
-        AssessmentTopCategoryPermission.objects.using(db_).bulk_create(new_permissions)
-
     def delete_model(self, request, obj):
         # Tell Django to save objects to the localized database.
         if self.sync_databases:
-            obj_id = obj.id
-            for db in django_settings.DATABASES.keys():
-                obj.delete(using=db)
-                obj.id = obj_id
+            model, obj_id = type(obj), obj.id
+            fan_out(lambda db: model.objects.using(db).filter(pk=obj_id).delete(), get_shard_databases(),
+                    skip_unavailable=False)
         else:
             obj.delete(using=get_localized_db())
 
@@ -301,7 +273,7 @@ class MultiDBAdminMixin(object):
         """
 
         if self.sync_databases:
-            for db in django_settings.DATABASES.keys():
+            for db in get_shard_databases():
                 this_db_instance = form.instance.__class__.objects.db_manager(db).latest('id')
 
                 if form.instance.pk != this_db_instance.pk:
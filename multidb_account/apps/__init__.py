@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MultidbAppConfig(AppConfig):
     name = 'multidb_account'
     verbose_name = 'All Items'
+
+    def ready(self):
+        # noinspection PyUnresolvedReferences
+        from multidb_account import signals
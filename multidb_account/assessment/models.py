@@ -1,11 +1,26 @@
-from django.db import models
+from django.contrib.postgres.fields import ArrayField
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 from multidb_account.sport.models import Sport
 from multidb_account.constants import USER_TYPE_ATHLETE, USER_TYPE_COACH
+from multidb_account.identity_map import get_object
 from multidb_account.team.models import Team
-from multidb_account.user.models import AthleteUser, CoachUser
+from multidb_account.user.models import AthleteUser, BaseCustomUser, CoachUser, Organisation
+
+
+def get_relationship_type(assessed, assessor):
+    """ Type of `AssessmentRelationshipType` an assessor needs to assess an assessed, or None """
+    assessor_type = assessor.get_user_type()
+    assessed_type = assessed.get_user_type()
+    if assessor_type == USER_TYPE_COACH and assessed_type == USER_TYPE_ATHLETE:
+        return "coach_athlete"
+    if assessor_type == USER_TYPE_ATHLETE and assessed_type == USER_TYPE_COACH:
+        return "athlete_coach"
+    if assessor.id == assessed.id:
+        return "self"
+    return None
 
 
 class AssessmentTopCategory(models.Model):
@@ -107,68 +122,68 @@ class Assessment(models.Model):
             obj = obj.parent_sub_category
         return obj.parent_top_category
 
+    def has_relationship_type(self, relationship_type):
+        # Iterate over .all() to use the prefetched relationship types, if any
+        return any(rt.type == relationship_type for rt in self.relationship_types.all())
+
     def is_relationship_type_valid(self, assessed, assessor):
-        if assessor.get_user_type() == USER_TYPE_COACH and assessed.get_user_type() == USER_TYPE_ATHLETE:
-            return self.relationship_types.filter(type="coach_athlete").exists()
-        if assessor.get_user_type() == USER_TYPE_ATHLETE and assessed.get_user_type() == USER_TYPE_COACH:
-            return self.relationship_types.filter(type="athlete_coach").exists()
-        if assessor.id == assessed.id:
-            return self.relationship_types.filter(type="self").exists()
-        return False
+        relationship_type = get_relationship_type(assessed, assessor)
+        return relationship_type is not None and self.has_relationship_type(relationship_type)
 
 
 class AssessorAssessedBase(models.Model):
     class Meta:
         abstract = True
 
-    def get_user_type(self):
+    def _load_user(self, typed_user_name):
+        # Load `athlete` (or `coach`) with its user in one query, unless already loaded (e.g. with `select_related()`)
+        typed_user_field = self._meta.get_field(typed_user_name)
+        cache_name = typed_user_field.get_cache_name()
+        if not hasattr(self, cache_name):
+            setattr(self, cache_name, typed_user_field.related_model.objects.using(self._state.db)
+                    .select_related('user')
+                    .get(pk=getattr(self, typed_user_field.attname)))
+        return getattr(self, typed_user_name).user
+
+    def get_user(self):
+        """ User of the athlete or coach, shared by the request """
         if self.athlete_id is not None:
-            return self.athlete.user.user_type
+            return get_object(BaseCustomUser, using=self._state.db, load=lambda: self._load_user('athlete'),
+                              pk=self.athlete_id)
         if self.coach_id is not None:
-            return self.coach.user.user_type
+            return get_object(BaseCustomUser, using=self._state.db, load=lambda: self._load_user('coach'),
+                              pk=self.coach_id)
         return None
 
+    def get_user_type(self):
+        user = self.get_user()
+        return user.user_type if user is not None else None
+
     def get_email(self):
-        if self.athlete_id is not None:
-            return self.athlete.user.email
-        if self.coach_id is not None:
-            return self.coach.user.email
-        return None
+        user = self.get_user()
+        return user.email if user is not None else None
 
     def get_user_id(self):
-        if self.athlete_id is not None:
-            return self.athlete.user.id
-        if self.coach_id is not None:
-            return self.coach.user.id
-        return None
+        # The athletes and coaches share the primary key of their user
+        return self.athlete_id if self.athlete_id is not None else self.coach_id
 
     def get_first_name(self):
-        if self.athlete_id is not None:
-            return self.athlete.user.first_name
-        if self.coach_id is not None:
-            return self.coach.user.first_name
-        return None
+        user = self.get_user()
+        return user.first_name if user is not None else None
 
     def get_last_name(self):
-        if self.athlete_id is not None:
-            return self.athlete.user.last_name
-        if self.coach_id is not None:
-            return self.coach.user.last_name
-        return None
+        user = self.get_user()
+        return user.last_name if user is not None else None
 
     def get_profile_picture_url(self):
-        if self.athlete_id is not None:
-            user = self.athlete.user
-        if self.coach_id is not None:
-            user = self.coach.user
-
-        if user.profile_picture and user.profile_picture.url:
+        user = self.get_user()
+        if user is not None and user.profile_picture and user.profile_picture.url:
             return user.profile_picture.url
 
         return None
 
     def delete_all_assessment_permissions(self):
-        self.assessmenttopcategorypermission_set.all().delete()
+        self.assessmentaccess_set.all().delete()
 
 
 
@@ -194,9 +209,8 @@ class Assessor(AssessorAssessedBase):
         if self.id == assessed.id:
             return True
         else:
-            return self.assessmenttopcategorypermission_set.filter(assessed=assessed,
-                                                                   assessment_top_category=top_category,
-                                                                   assessor_has_access=True).exists()
+            return self.assessmentaccess_set.filter(assessed=assessed,
+                                                    top_category_ids__contains=[top_category.id]).exists()
 
     def __str__(self):
         return 'Assessor: {}'.format(str(self.athlete or self.coach))
@@ -227,12 +241,119 @@ class ChosenAssessment(models.Model):
         return self.assessment.name
 
 
-class AssessmentTopCategoryPermission(models.Model):
+class TeamAssessmentRollup(models.Model):
+    """
+    Running aggregates of the values of an assessment chosen within a team (see multidb_account.assessment_rollup),
+    only maintained when `settings.TEAM_ASSESSMENT_ROLLUP` is enabled.
+    """
+    class Meta:
+        db_table = 'multidb_account_team_assessment_rollup'
+        unique_together = (('team', 'assessment'),)
+
+    team = models.ForeignKey(Team, on_delete=models.CASCADE)
+    assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE)
+    value_sum = models.DecimalField(max_digits=25, decimal_places=6, default=0)
+    value_count = models.IntegerField(default=0)
+    value_min = models.DecimalField(max_digits=15, decimal_places=6, null=True)
+    value_max = models.DecimalField(max_digits=15, decimal_places=6, null=True)
+    latest_value = models.DecimalField(max_digits=15, decimal_places=6, null=True)
+    latest_date = models.DateTimeField(null=True)
+
+    def add_value(self, value, date):
+        self.value_sum += value
+        self.value_count += 1
+        self.value_min = value if self.value_min is None else min(self.value_min, value)
+        self.value_max = value if self.value_max is None else max(self.value_max, value)
+        if self.latest_date is None or date >= self.latest_date:
+            self.latest_value = value
+            self.latest_date = date
+
+    @property
+    def average(self):
+        return self.value_sum / self.value_count if self.value_count else None
+
+
+class AssessmentAccess(models.Model):
+    """
+    Assessment permissions of an assessor on an assessed, by top category: the pair has a permission for every top
+    category, granted for the ones of `top_category_ids` only. A new top category is thus denied to every pair.
+    """
     class Meta:
-        db_table = 'multidb_account_assessment_top_category_permission'
+        db_table = 'multidb_account_assessment_access'
+        unique_together = (('assessed', 'assessor'),)
 
     assessed = models.ForeignKey(Assessed, on_delete=models.CASCADE)
     assessor = models.ForeignKey(Assessor, on_delete=models.CASCADE)
-    assessment_top_category = models.ForeignKey(AssessmentTopCategory, on_delete=models.CASCADE)
-    assessor_has_access = models.BooleanField(verbose_name=_('assessor has access'), default=False)
+    top_category_ids = ArrayField(models.IntegerField(), verbose_name=_('granted top categories'), default=list,
+                                  blank=True)
+
+    @classmethod
+    def create_if_not_exist(cls, localized_db, assessed, assessor, top_category_ids):
+        """ Give the permissions of a pair, granted for `top_category_ids`, unless it has some already """
+        cls.objects.using(localized_db).get_or_create(assessed=assessed, assessor=assessor,
+                                                      defaults={'top_category_ids': sorted(set(top_category_ids))})
+
+    @classmethod
+    def set_access(cls, localized_db, assessed_id, assessor_id, top_category_id, has_access):
+        """ Grant or revoke a top category to an existing pair, return whether it has permissions """
+        with transaction.atomic(using=localized_db):
+            access = cls.objects.using(localized_db) \
+                .select_for_update() \
+                .filter(assessed_id=assessed_id, assessor_id=assessor_id) \
+                .first()
+            if access is None:
+                return False
+            top_category_ids = set(access.top_category_ids)
+            if has_access:
+                top_category_ids.add(top_category_id)
+            else:
+                top_category_ids.discard(top_category_id)
+            access.top_category_ids = sorted(top_category_ids)
+            access.save(using=localized_db, update_fields=['top_category_ids'])
+        return True
+
+    @classmethod
+    def revoke(cls, localized_db, assessed_id, assessor_id):
+        """ Remove the permissions of a pair """
+        cls.objects.using(localized_db).filter(assessed_id=assessed_id, assessor_id=assessor_id).delete()
+
+    def has_access(self, top_category_id):
+        return top_category_id in self.top_category_ids
+
+    def get_permissions(self, top_categories):
+        """ One permission by top category, as `AssessmentTopCategoryPermission` rows used to be """
+        return [{
+            'assessed_id': self.assessed_id,
+            'assessor_id': self.assessor_id,
+            'assessment_top_category_id': top_category.id,
+            'assessment_top_category_name': top_category.name,
+            'assessor_has_access': self.has_access(top_category.id),
+        } for top_category in top_categories]
+
+
+class AssessmentTreeNode(models.Model):
+    """
+    Ancestry of the sub categories attached to a top category (see multidb_account.assessment_tree),
+    with the visibility counters of the assessments directly under them.
+    """
+    class Meta:
+        db_table = 'multidb_account_assessment_tree_node'
+
+    subcategory = models.OneToOneField(AssessmentSubCategory, primary_key=True, on_delete=models.CASCADE,
+                                       related_name='tree_node')
+    # The sub category right below the top category this sub category descends from
+    top_subcategory = models.ForeignKey(AssessmentSubCategory, on_delete=models.CASCADE, related_name='+')
+    top_category = models.ForeignKey(AssessmentTopCategory, on_delete=models.CASCADE, related_name='+')
+    public_count = models.IntegerField(default=0)
+    public_everywhere_count = models.IntegerField(default=0)
+
+
+class AssessmentTreeOrganisationCount(models.Model):
+    """ Number of assessments of a top level sub category's subtree owned by an organisation """
+    class Meta:
+        db_table = 'multidb_account_assessment_tree_organisation_count'
+        unique_together = (('top_subcategory', 'organisation'),)
 
+    top_subcategory = models.ForeignKey(AssessmentSubCategory, on_delete=models.CASCADE, related_name='+')
+    organisation = models.ForeignKey(Organisation, on_delete=models.CASCADE, related_name='+')
+    count = models.IntegerField(default=0)
@@ -0,0 +1,89 @@
+from itertools import groupby
+
+from django.db.models import Aggregate, Avg, Count, Max, Min
+from django.db.models.functions import Trunc
+
+HISTORY_BUCKETS = ('day', 'week', 'month')
+
+
+class Latest(Aggregate):
+    """
+    PostgreSQL: value of the first expression in the row of the group with the greatest other expressions,
+    e.g. `Latest('value', 'date_assessed', 'id')`.
+    """
+    template = '(ARRAY_AGG(%(expression)s ORDER BY %(ordering)s))[1]'
+
+    def __init__(self, expression, *ordering, output_field=None, **extra):
+        super().__init__(expression, *ordering, output_field=output_field, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql = []
+        params = []
+        for source_expression in self.get_source_expressions():
+            source_sql, source_params = compiler.compile(source_expression)
+            sql.append(source_sql)
+            params.extend(source_params)
+        ordering = ', '.join('{} DESC'.format(x) for x in sql[1:])
+        return self.template % {'expression': sql[0], 'ordering': ordering}, params
+
+
+def get_assessment_history(queryset, bucket='day'):
+    """
+    Aggregate chosen assessments into `bucket` (day, week or month) wide buckets of their `date_assessed`,
+    in a single query. Return the series of every assessment, sorted by assessment id:
+    `{assessment id: [{'date', 'min', 'max', 'mean', 'last', 'count'}, ...]}`, the buckets sorted by date.
+    """
+    if bucket not in HISTORY_BUCKETS:
+        raise ValueError('Unknown history bucket: {}'.format(bucket))
+
+    value_field = queryset.model._meta.get_field('value')
+    rows = queryset \
+        .annotate(date=Trunc('date_assessed', bucket)) \
+        .order_by() \
+        .values('assessment_id', 'date') \
+        .annotate(min=Min('value'), max=Max('value'), mean=Avg('value'), count=Count('id'),
+                  last=Latest('value', 'date_assessed', 'id', output_field=value_field)) \
+        .order_by('assessment_id', 'date')
+
+    return {
+        assessment_id: [{key: row[key] for key in ('date', 'min', 'max', 'mean', 'last', 'count')} for row in group]
+        for assessment_id, group in groupby(rows, key=lambda row: row['assessment_id'])
+    }
+
+
+def _triangle_area(a, b, c):
+    return abs((a[0] - c[0]) * (b[1] - a[1]) - (a[0] - b[0]) * (c[1] - a[1])) / 2
+
+
+def largest_triangle_three_buckets(points, threshold, key):
+    """
+    Downsample `points` to `threshold` of them, keeping the shape of the series (Largest-Triangle-Three-Buckets).
+    `key(point)` is the `(x, y)` numbers of a point. The first and last points are always kept.
+    """
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+
+    coordinates = [key(point) for point in points]
+    sampled = [points[0]]
+    # The points between the first and last one are split into `threshold - 2` buckets
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        # Average point of the next bucket, the last point for the last bucket
+        next_bucket = coordinates[end:min(int((i + 2) * bucket_size) + 1, len(points) - 1)] or [coordinates[-1]]
+        average = (sum(x for x, _ in next_bucket) / len(next_bucket), sum(y for _, y in next_bucket) / len(next_bucket))
+
+        a = max(range(start, end), key=lambda j: _triangle_area(coordinates[a], coordinates[j], average))
+        sampled.append(points[a])
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def downsample_assessment_history(series, threshold):
+    """ Downsample the buckets of a series of `get_assessment_history` on their mean value """
+    return largest_triangle_three_buckets(series, threshold,
+                                          key=lambda point: (point['date'].timestamp(), float(point['mean'])))
@@ -0,0 +1,231 @@
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings as django_settings
+from django.db import connections
+
+from multidb_account.assessment.models import Assessed, ChosenAssessment
+from multidb_account.sport.models import ChosenSport
+from multidb_account.team.models import Team
+from multidb_account.user.models import Organisation
+
+REDUCTIONS = ('latest', 'max', 'min')
+
+COHORT_TEAM = 'team'
+COHORT_ORGANISATION = 'organisation'
+COHORT_SPORT = 'sport'
+
+_COLUMNS = ('id', 'user_id', 'value', 'date')
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+def reduce_values(columns, reduction='latest'):
+    """
+    Keep one value per athlete of the `columns` of an assessment: its latest one, or its greatest / smallest one.
+    Return the `(user ids, values)` arrays, sorted by user id.
+    """
+    if reduction == 'latest':
+        order = np.lexsort((columns['id'], columns['date'], columns['user_id']))
+    elif reduction == 'max':
+        order = np.lexsort((columns['value'], columns['user_id']))
+    elif reduction == 'min':
+        order = np.lexsort((-columns['value'], columns['user_id']))
+    else:
+        raise ValueError('Unknown reduction: {}'.format(reduction))
+
+    user_ids = columns['user_id'][order]
+    # Last row of every athlete
+    last = np.append(user_ids[1:] != user_ids[:-1], True) if len(user_ids) else np.empty(0, dtype=bool)
+    return user_ids[last], columns['value'][order][last]
+
+
+def get_percentile(sorted_values, value):
+    """ Percentage of the `sorted_values` below `value`, the equal ones counting for a half """
+    if value is None or not len(sorted_values):
+        return None
+    below = np.searchsorted(sorted_values, value, side='left')
+    not_above = np.searchsorted(sorted_values, value, side='right')
+    return float(100 * (below + not_above) / 2 / len(sorted_values))
+
+
+class AssessmentNorms(object):
+    """
+    Values of the chosen assessments of the athletes of a database, as NumPy arrays by assessment, to rank a value
+    among a cohort: every athlete, or the athletes of a team, organisation or sport.
+
+    Chosen assessments are loaded by increasing id: a refresh appends the new ones, the cohorts are reloaded. Ids are
+    allocated before the commit, so a refresh re-reads the `WATERMARK_WINDOW` ids below the `watermark` of the
+    previous snapshot for the ones committed late; older late ones, like the values updated or deleted since the last
+    full load, are only seen by the next one. The sorted values of the cohorts are computed on demand and kept with
+    the snapshot, which must not be modified otherwise: it is shared by every thread.
+    """
+
+    def __init__(self, database, previous=None):
+        self.database = database
+        self.columns = dict(previous.columns) if previous else {}
+        self.watermark = previous.watermark if previous else 0
+        self.loaded_at = previous.loaded_at if previous else time.monotonic()
+        self.checked_at = time.monotonic()
+
+        self._load_values()
+        self._load_cohorts()
+        self._reduced = {}
+        self._sorted = {}
+
+    def _get_loaded_ids(self, min_id):
+        return np.concatenate([columns['id'][columns['id'] > min_id] for columns in self.columns.values()] + [_EMPTY])
+
+    def _load_values(self):
+        min_id = max(self.watermark - _get_config().get('WATERMARK_WINDOW', 1000), 0) if self.watermark else 0
+        rows = ChosenAssessment.objects.using(self.database) \
+            .filter(id__gt=min_id, assessed__athlete__isnull=False) \
+            .order_by('id') \
+            .values_list('id', 'assessment_id', 'assessed__athlete_id', 'value', 'date_assessed')
+        rows = list(rows)
+        if min_id and rows:
+            loaded_ids = set(self._get_loaded_ids(min_id).tolist())
+            rows = [row for row in rows if row[0] not in loaded_ids]
+        if not rows:
+            return
+
+        ids, assessment_ids, user_ids, values, dates = zip(*rows)
+        assessment_ids = np.array(assessment_ids, dtype=np.int64)
+        new_columns = {
+            'id': np.array(ids, dtype=np.int64),
+            'user_id': np.array(user_ids, dtype=np.int64),
+            'value': np.array(values, dtype=np.float64),
+            'date': np.array([date.timestamp() for date in dates], dtype=np.float64),
+        }
+        for assessment_id in np.unique(assessment_ids):
+            mask = assessment_ids == assessment_id
+            current = self.columns.get(int(assessment_id))
+            self.columns[int(assessment_id)] = {
+                key: np.concatenate((current[key], new_columns[key][mask])) if current else new_columns[key][mask]
+                for key in _COLUMNS
+            }
+        self.watermark = max(self.watermark, ids[-1])
+
+    def _load_cohorts(self):
+        memberships = defaultdict(set)
+
+        athlete_ids = set(Assessed.objects.using(self.database)
+                          .filter(athlete__isnull=False)
+                          .values_list('athlete_id', flat=True))
+        for team_id, user_id, organisation_id in Team.athletes.through.objects.using(self.database) \
+                .values_list('team_id', 'athleteuser_id', 'team__organisation'):
+            memberships[COHORT_TEAM, team_id].add(user_id)
+            if organisation_id is not None:
+                memberships[COHORT_ORGANISATION, organisation_id].add(user_id)
+        for organisation_id, user_id in Organisation.members.through.objects.using(self.database) \
+                .filter(basecustomuser__in=athlete_ids) \
+                .values_list('organisation_id', 'basecustomuser_id'):
+            memberships[COHORT_ORGANISATION, organisation_id].add(user_id)
+        for sport_id, user_id in ChosenSport.objects.using(self.database) \
+                .filter(is_chosen=True, user_id__in=athlete_ids) \
+                .values_list('sport_id', 'user_id'):
+            memberships[COHORT_SPORT, sport_id].add(user_id)
+
+        self.cohorts = {cohort: np.array(sorted(user_ids), dtype=np.int64) for cohort, user_ids in memberships.items()}
+        self.user_cohorts = defaultdict(list)
+        for cohort, user_ids in sorted(memberships.items()):
+            for user_id in user_ids:
+                self.user_cohorts[user_id].append(cohort)
+
+    def _get_reduced(self, assessment_id, reduction):
+        key = assessment_id, reduction
+        if key not in self._reduced:
+            columns = self.columns.get(assessment_id)
+            if columns is None:
+                self._reduced[key] = _EMPTY, np.empty(0, dtype=np.float64)
+            else:
+                self._reduced[key] = reduce_values(columns, reduction)
+        return self._reduced[key]
+
+    def get_user_value(self, assessment_id, user_id, reduction='latest'):
+        """ Value of an athlete for an assessment, or None """
+        user_ids, values = self._get_reduced(assessment_id, reduction)
+        i = np.searchsorted(user_ids, user_id)
+        if i < len(user_ids) and user_ids[i] == user_id:
+            return float(values[i])
+        return None
+
+    def get_cohort_values(self, assessment_id, cohort=None, reduction='latest'):
+        """ Sorted values of the athletes of a cohort, `(type, id)` or None for every athlete """
+        key = assessment_id, cohort, reduction
+        if key not in self._sorted:
+            user_ids, values = self._get_reduced(assessment_id, reduction)
+            if cohort is not None:
+                values = values[np.isin(user_ids, self.cohorts.get(cohort, _EMPTY), assume_unique=True)]
+            self._sorted[key] = np.sort(values)
+        return self._sorted[key]
+
+    def get_percentile(self, assessment_id, value, cohort=None, reduction='latest'):
+        return get_percentile(self.get_cohort_values(assessment_id, cohort, reduction), value)
+
+
+_norms = {}
+_norms_lock = threading.Lock()
+# A database is loaded by a single thread at a time, without holding up the other databases
+_database_locks = defaultdict(threading.Lock)
+
+
+def _get_config():
+    return getattr(django_settings, 'ASSESSMENT_NORMS', {})
+
+
+def _get_database_lock(database):
+    with _norms_lock:
+        return _database_locks[database]
+
+
+def _refresh_assessment_norms(database, lock):
+    """ Run in a background thread holding the database lock """
+    try:
+        norms = _norms.get(database)
+        if norms is None or time.monotonic() >= norms.loaded_at + _get_config().get('REBUILD_INTERVAL', 3600):
+            norms = AssessmentNorms(database)
+        else:
+            norms = AssessmentNorms(database, previous=norms)
+        _norms[database] = norms
+    finally:
+        lock.release()
+        # The thread's own connections
+        for connection in connections.all():
+            connection.close()
+
+
+def get_assessment_norms(database):
+    """
+    Return the norms of a database. The new chosen assessments are loaded at most every
+    `settings.ASSESSMENT_NORMS['REFRESH_INTERVAL']` seconds, all of them every `REBUILD_INTERVAL` seconds, by a
+    background thread: requests keep being answered from the previous snapshot meanwhile. Only the first load of a
+    database by the process is done on the request path.
+    """
+    norms = _norms.get(database)
+    if norms is not None and time.monotonic() < norms.checked_at + _get_config().get('REFRESH_INTERVAL', 60):
+        return norms
+
+    lock = _get_database_lock(database)
+    if norms is not None:
+        # Already being refreshed otherwise
+        if lock.acquire(blocking=False):
+            threading.Thread(target=_refresh_assessment_norms, args=(database, lock),
+                             name='assessment-norms-{}'.format(database), daemon=True).start()
+        return norms
+
+    with lock:
+        norms = _norms.get(database)
+        if norms is None:
+            norms = _norms[database] = AssessmentNorms(database)
+        return norms
+
+
+def clear_assessment_norms(database=None):
+    """ Drop the norms of a database (of every database by default) held by this process """
+    with _norms_lock:
+        if database is None:
+            _norms.clear()
+        else:
+            _norms.pop(database, None)
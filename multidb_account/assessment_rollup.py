@@ -0,0 +1,88 @@
+from django.conf import settings as django_settings
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, Sum
+
+from multidb_account.assessment.models import ChosenAssessment, TeamAssessmentRollup
+
+
+def is_rollup_enabled():
+    """ Whether `TeamAssessmentRollup` is maintained, and used to compute the team averages """
+    return getattr(django_settings, 'TEAM_ASSESSMENT_ROLLUP', False)
+
+
+def get_team_assessment_averages(team_id, using=None):
+    """ Average value of the chosen assessments of a team, by assessment id """
+    if is_rollup_enabled():
+        rollups = TeamAssessmentRollup.objects.using(using) \
+            .filter(team_id=team_id, value_count__gt=0) \
+            .values_list('assessment_id', 'value_sum', 'value_count')
+        return {assessment_id: value_sum / value_count for assessment_id, value_sum, value_count in rollups}
+
+    averages = ChosenAssessment.objects.using(using) \
+        .filter(team_id=team_id) \
+        .order_by() \
+        .values('assessment_id') \
+        .annotate(average=Avg('value')) \
+        .values_list('assessment_id', 'average')
+    return dict(averages)
+
+
+def add_team_assessment_value(using, chosen_assessment):
+    """ Add a new chosen assessment to the rollup of its team """
+    with transaction.atomic(using=using):
+        rollup, _ = TeamAssessmentRollup.objects.using(using) \
+            .select_for_update() \
+            .get_or_create(team_id=chosen_assessment.team_id, assessment_id=chosen_assessment.assessment_id)
+        rollup.add_value(chosen_assessment.value, chosen_assessment.date_assessed)
+        rollup.save(using=using)
+
+
+def refresh_team_assessment_rollup(using, team_id, assessment_id):
+    """ Recompute the rollup of an assessment of a team, e.g. after a value was changed or deleted """
+    values = ChosenAssessment.objects.using(using).filter(team_id=team_id, assessment_id=assessment_id)
+
+    with transaction.atomic(using=using):
+        aggregates = values.aggregate(value_sum=Sum('value'), value_count=Count('id'),
+                                      value_min=Min('value'), value_max=Max('value'))
+        if not aggregates['value_count']:
+            TeamAssessmentRollup.objects.using(using).filter(team_id=team_id, assessment_id=assessment_id).delete()
+            return
+
+        latest = values.order_by('-date_assessed', '-id').values('value', 'date_assessed').first()
+        TeamAssessmentRollup.objects.using(using).update_or_create(
+            team_id=team_id, assessment_id=assessment_id,
+            defaults=dict(aggregates, latest_value=latest['value'], latest_date=latest['date_assessed']),
+        )
+
+
+def refresh_team_assessment_rollups(using, chosen_assessments):
+    """ Refresh the rollups of chosen assessments saved without signals, by `bulk_create` or `update` """
+    if not is_rollup_enabled():
+        return
+    pairs = {(ca.team_id, ca.assessment_id) for ca in chosen_assessments if ca.team_id is not None}
+    for team_id, assessment_id in sorted(pairs):
+        refresh_team_assessment_rollup(using, team_id, assessment_id)
+
+
+def rebuild_team_assessment_rollups(using):
+    """ Recompute the rollups of every team of a database """
+    aggregates = ChosenAssessment.objects.using(using) \
+        .filter(team__isnull=False) \
+        .order_by() \
+        .values('team_id', 'assessment_id') \
+        .annotate(value_sum=Sum('value'), value_count=Count('id'), value_min=Min('value'), value_max=Max('value'))
+    latest = ChosenAssessment.objects.using(using) \
+        .filter(team__isnull=False) \
+        .order_by('team_id', 'assessment_id', '-date_assessed', '-id') \
+        .distinct('team_id', 'assessment_id') \
+        .values_list('team_id', 'assessment_id', 'value', 'date_assessed')
+    latest = {(team_id, assessment_id): (value, date) for team_id, assessment_id, value, date in latest}
+
+    with transaction.atomic(using=using):
+        TeamAssessmentRollup.objects.using(using).all().delete()
+        TeamAssessmentRollup.objects.using(using).bulk_create([
+            TeamAssessmentRollup(latest_value=latest[row['team_id'], row['assessment_id']][0],
+                                 latest_date=latest[row['team_id'], row['assessment_id']][1],
+                                 **row)
+            for row in aggregates
+        ], batch_size=1000)
@@ -1,98 +1,172 @@
-from django.db import connections
-
-from multidb_account.utils import dictfetchall
-
-
-def _make_recursive_assessment_tree_cte():
-    """ Make recursive tree TopCategory->SubCategory->...->Assessment """
-    return '''
-    WITH RECURSIVE q AS (
-          -- Start of the recursion. Top level sub categories
-          SELECT sc_top.id AS sc_id,
-                 sc_top.id AS top_sc_id, 
-                 sc_top.parent_top_category_id AS tc_id, 
-                 o.id AS organisation_id,
-                 o.own_assessments_only,
-                 a.is_public_everywhere,
-                 a.is_private
-          FROM multidb_account_assessment_sub_category sc_top
-          LEFT JOIN multidb_account_assessment a ON a.parent_sub_category_id = sc_top.id
-          LEFT JOIN multidb_account_organisation_own_assessments oa ON oa.assessment_id = a.id
-          LEFT JOIN multidb_account_organisation o ON o.id = oa.organisation_id
-          WHERE sc_top.parent_top_category_id IS NOT NULL
-          
-        -- Every next child level of subcategories
-        UNION ALL
-          SELECT sc.id AS sc_id,
-                 q.top_sc_id, 
-                 q.tc_id, 
-                 o.id AS organisation_id,
-                 o.own_assessments_only,
-                 a.is_public_everywhere,
-                 a.is_private
-          FROM multidb_account_assessment_sub_category sc
-              JOIN q ON sc.parent_sub_category_id = q.sc_id
-          LEFT JOIN multidb_account_assessment a ON a.parent_sub_category_id = sc.id
-          LEFT JOIN multidb_account_organisation_own_assessments oa ON oa.assessment_id = a.id
-          LEFT JOIN multidb_account_organisation o ON o.id = oa.organisation_id
-        )
-        
-        -- Get sub categories from the tree that share the same top level sub category
-        SELECT DISTINCT *
-        FROM
-        (
-          SELECT
-            q_by_topcat.tc_id AS topcat_id,
-            q.sc_id AS subcat_id,
-            q_by_topcat.organisation_id,
-
-            -- How many org's private assessments does this sub category have
-            SUM(
-                CASE WHEN q_by_topcat.organisation_id IN %s AND q_by_topcat.own_assessments_only = TRUE
-                THEN 1
-                ELSE 0 END
-            ) OVER (PARTITION BY q.sc_id) AS our_own_assessments_only_count,
-            SUM(
-                CASE WHEN q_by_topcat.organisation_id IN %s 
-                THEN 1
-                ELSE 0 END
-            ) OVER (PARTITION BY q.sc_id) AS our_private_count,
-            SUM(
-                CASE WHEN q_by_topcat.organisation_id NOT IN %s 
-                THEN 1
-                ELSE 0 END
-            ) OVER (PARTITION BY q.sc_id) AS alien_private_count,
-            SUM(
-                CASE WHEN q.is_public_everywhere 
-                THEN 1
-                ELSE 0 END
-            ) OVER (PARTITION BY q.sc_id) AS public_everywhere_assessments_count,
-            SUM(
-                CASE 
-                WHEN q.is_private OR q.is_private IS NULL THEN 0
-                ELSE 1 END
-            ) OVER (PARTITION BY q.sc_id) AS public_assessments_count
-          FROM q
-          JOIN q AS q_by_topcat ON q_by_topcat.top_sc_id = q.top_sc_id
-        ) qTop
-    '''
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Case, Count, Exists, IntegerField, OuterRef, Q, When
+
+from multidb_account.assessment.models import Assessment, AssessmentTreeNode, AssessmentTreeOrganisationCount
+
+# The tree TopCategory->SubCategory->...->Assessment is materialized in two tables:
+#  - AssessmentTreeNode: every sub category attached to a top category, with the top level sub category
+#    it descends from and the number of public / public everywhere assessments right below it.
+#  - AssessmentTreeOrganisationCount: the number of assessments of every top level sub category's subtree
+#    owned by an organisation (`Organisation.own_assessments`).
+# Both are rebuilt one top level subtree at a time by the signals of multidb_account.signals.
+
+
+def _get_model(apps, name):
+    return apps.get_model('multidb_account', name)
+
+
+def _get_own_assessments_model(apps):
+    return _get_model(apps, 'Organisation')._meta.get_field('own_assessments').remote_field.through
+
+
+def _get_subtree_ids(apps, using, top_subcategory_id):
+    """ Ids of the sub categories of a subtree, its root included """
+    SubCategory = _get_model(apps, 'AssessmentSubCategory')
+    ids = [top_subcategory_id]
+    level = ids
+    while level:
+        level = [pk for pk in SubCategory.objects.using(using)
+                 .filter(parent_sub_category_id__in=level)
+                 .values_list('id', flat=True)
+                 if pk not in ids]
+        ids.extend(level)
+    return ids
+
+
+def rebuild_assessment_subtree(using, top_subcategory_id, apps=django_apps):
+    """ Recompute the nodes and organisation counters of a top level sub category's subtree """
+    SubCategory = _get_model(apps, 'AssessmentSubCategory')
+    AssessmentModel = _get_model(apps, 'Assessment')
+    Node = _get_model(apps, 'AssessmentTreeNode')
+    OrganisationCount = _get_model(apps, 'AssessmentTreeOrganisationCount')
+
+    with transaction.atomic(using=using):
+        Node.objects.using(using).filter(top_subcategory_id=top_subcategory_id).delete()
+        OrganisationCount.objects.using(using).filter(top_subcategory_id=top_subcategory_id).delete()
+
+        top_category_id = SubCategory.objects.using(using) \
+            .filter(id=top_subcategory_id, parent_top_category__isnull=False) \
+            .values_list('parent_top_category_id', flat=True) \
+            .first()
+        if top_category_id is None:
+            # Deleted or no more right below a top category
+            return
+
+        ids = _get_subtree_ids(apps, using, top_subcategory_id)
+        # Sub categories moved from another subtree
+        Node.objects.using(using).filter(subcategory_id__in=ids).delete()
+
+        counters = {
+            row['parent_sub_category_id']: row
+            for row in AssessmentModel.objects.using(using)
+            .filter(parent_sub_category_id__in=ids)
+            .order_by()
+            .values('parent_sub_category_id')
+            .annotate(public=Count(Case(When(is_private=False, then=1), output_field=IntegerField())),
+                      public_everywhere=Count(Case(When(is_public_everywhere=True, then=1),
+                                                   output_field=IntegerField())))
+        }
+        Node.objects.using(using).bulk_create([
+            Node(subcategory_id=pk,
+                 top_subcategory_id=top_subcategory_id,
+                 top_category_id=top_category_id,
+                 public_count=counters.get(pk, {}).get('public', 0),
+                 public_everywhere_count=counters.get(pk, {}).get('public_everywhere', 0))
+            for pk in ids
+        ])
+
+        organisation_counts = _get_own_assessments_model(apps).objects.using(using) \
+            .filter(assessment__parent_sub_category_id__in=ids) \
+            .order_by() \
+            .values('organisation_id') \
+            .annotate(count=Count('id'))
+        OrganisationCount.objects.using(using).bulk_create([
+            OrganisationCount(top_subcategory_id=top_subcategory_id,
+                              organisation_id=row['organisation_id'],
+                              count=row['count'])
+            for row in organisation_counts
+        ])
+
+
+def rebuild_assessment_tree(using, apps=django_apps):
+    """ Recompute the whole materialized tree of a database """
+    SubCategory = _get_model(apps, 'AssessmentSubCategory')
+
+    with transaction.atomic(using=using):
+        _get_model(apps, 'AssessmentTreeNode').objects.using(using).all().delete()
+        _get_model(apps, 'AssessmentTreeOrganisationCount').objects.using(using).all().delete()
+        for top_subcategory_id in SubCategory.objects.using(using) \
+                .filter(parent_top_category__isnull=False) \
+                .values_list('id', flat=True):
+            rebuild_assessment_subtree(using, top_subcategory_id, apps)
+
+
+def rebuild_assessment_subtrees(using, top_subcategory_ids):
+    for top_subcategory_id in {pk for pk in top_subcategory_ids if pk is not None}:
+        rebuild_assessment_subtree(using, top_subcategory_id)
+
+
+def get_top_subcategory_id(using, subcategory_id):
+    """ Top level sub category a sub category descends from, according to the materialized tree """
+    if subcategory_id is None:
+        return None
+    return AssessmentTreeNode.objects.using(using) \
+        .filter(subcategory_id=subcategory_id) \
+        .values_list('top_subcategory_id', flat=True) \
+        .first()
+
+
+def get_subcategory_top_subcategory_id(using, subcategory):
+    """ Top level sub category a (possibly moved) sub category descends from """
+    if subcategory.parent_top_category_id is not None:
+        return subcategory.pk
+    return get_top_subcategory_id(using, subcategory.parent_sub_category_id)
+
+
+def get_top_subcategory_ids(using, organisation_ids=None, assessment_ids=None):
+    """ Top level sub categories counting assessments of the organisations, or holding the assessments """
+    ids = set()
+    if organisation_ids:
+        ids.update(AssessmentTreeOrganisationCount.objects.using(using)
+                   .filter(organisation_id__in=organisation_ids)
+                   .values_list('top_subcategory_id', flat=True))
+    if assessment_ids:
+        subcategory_ids = Assessment.objects.using(using) \
+            .filter(id__in=assessment_ids) \
+            .values_list('parent_sub_category_id', flat=True)
+        ids.update(AssessmentTreeNode.objects.using(using)
+                   .filter(subcategory_id__in=subcategory_ids)
+                   .values_list('top_subcategory_id', flat=True))
+    return ids
 
 
 def get_assessment_tree_filtered_by_org_own_assessments(localized_db, own_assessments_only_org_ids, our_org_ids):
-    with connections[localized_db].cursor() as cursor:
-        cte = _make_recursive_assessment_tree_cte()
-
-        # Get only own_assessments_only org assessments
-        if own_assessments_only_org_ids:
-            sql = cte + 'WHERE our_own_assessments_only_count != 0 ' \
-                        'OR public_everywhere_assessments_count != 0;'
-            cursor.execute(sql, [tuple(own_assessments_only_org_ids or {0}), tuple(our_org_ids or {0}), (0,)])
-            return dictfetchall(cursor)
-
-        # Get only our private and not alien orgs private
-        sql = cte + 'WHERE alien_private_count = 0 ' \
-                    'OR our_private_count != 0 ' \
-                    'OR public_everywhere_assessments_count != 0 ' \
-                    'OR public_assessments_count != 0;'
-        cursor.execute(sql, [(0,), tuple(our_org_ids or {0}), tuple(our_org_ids or {0})])
-        return dictfetchall(cursor)
+    """
+    Return the `{'topcat_id', 'subcat_id'}` of the sub categories visible to the members of the organisations:
+    - members of an organisation showing its own assessments only: the subtrees holding assessments of such
+      organisations, and the sub categories with public everywhere assessments.
+    - otherwise: the subtrees without private assessments of other organisations or with private assessments
+      of our organisations, and the sub categories with public or public everywhere assessments.
+    """
+    organisation_counts = AssessmentTreeOrganisationCount.objects.using(localized_db) \
+        .filter(top_subcategory_id=OuterRef('top_subcategory_id'))
+    nodes = AssessmentTreeNode.objects.using(localized_db)
+
+    if own_assessments_only_org_ids:
+        nodes = nodes.annotate(
+            our_own_assessments_only=Exists(organisation_counts.filter(
+                organisation_id__in=own_assessments_only_org_ids, organisation__own_assessments_only=True)),
+        ).filter(Q(our_own_assessments_only=True) | Q(public_everywhere_count__gt=0))
+    else:
+        our_org_ids = our_org_ids or {0}
+        nodes = nodes.annotate(
+            our_private=Exists(organisation_counts.filter(organisation_id__in=our_org_ids)),
+            alien_private=Exists(organisation_counts.exclude(organisation_id__in=our_org_ids)),
+        ).filter(Q(alien_private=False) | Q(our_private=True) |
+                 Q(public_everywhere_count__gt=0) | Q(public_count__gt=0))
+
+    return [
+        {'topcat_id': topcat_id, 'subcat_id': subcat_id}
+        for topcat_id, subcat_id in nodes.values_list('top_category_id', 'subcategory_id')
+    ]
@@ -0,0 +1,136 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings as django_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+
+AUTH_USER_VERSION_KEY = 'auth_user:{}:{}:version'
+
+
+def is_shared_cache(alias):
+    """ Whether a cache of `CACHES` is seen by every worker, unlike the per-process local-memory one """
+    return not isinstance(caches[alias], LocMemCache)
+
+
+class AuthUserCache(object):
+    """
+    Per-process LRU/TTL cache of the user rows and account state needed by the JWT authentication.
+
+    Every entry is stamped with the user's version read from a cache shared by all the workers (if any).
+    Invalidating a user bumps that version, so a stale entry is dropped by every worker on its next lookup.
+    """
+
+    def __init__(self, max_entries=10000, timeout=300, shared_cache=None):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.shared_cache = caches[shared_cache] if shared_cache else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(shard, user_id):
+        return shard, int(user_id)
+
+    def get_version(self, shard, user_id):
+        if self.shared_cache is None:
+            return None
+        key = AUTH_USER_VERSION_KEY.format(shard, user_id)
+        version = self.shared_cache.get(key)
+        if version is None:
+            self.shared_cache.add(key, uuid.uuid4().hex, None)
+            version = self.shared_cache.get(key)
+        return version
+
+    def get(self, shard, user_id):
+        """ Return a `(user, state)` tuple or None """
+        key = self._key(shard, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires'] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+
+        if self.shared_cache is not None and entry['version'] != self.get_version(shard, user_id):
+            self.delete(shard, user_id)
+            return None
+
+        UserModel = get_user_model()
+        user = UserModel.from_db(shard, entry['field_names'], entry['values'])
+        return user, dict(entry['state'])
+
+    def set(self, shard, user_id, user, version, **state):
+        """ `version` must be read with `get_version()` before loading the user from the database """
+        field_names = [f.attname for f in user._meta.concrete_fields]
+        values = [getattr(user, name) for name in field_names]
+        entry = {
+            'field_names': field_names,
+            # File fields are cached by name, their FieldFile is bound to the instance
+            'values': [v.name if isinstance(v, FieldFile) else v for v in values],
+            'state': state,
+            'version': version,
+            'expires': time.monotonic() + self.timeout,
+        }
+        key = self._key(shard, user_id)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, shard, user_id):
+        with self._lock:
+            self._entries.pop(self._key(shard, user_id), None)
+
+    def invalidate(self, shard, user_id):
+        self.delete(shard, user_id)
+        if self.shared_cache is not None:
+            self.shared_cache.set(AUTH_USER_VERSION_KEY.format(shard, user_id), uuid.uuid4().hex, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_auth_user_cache = None
+
+
+def get_auth_user_cache():
+    """
+    Return the process-wide auth cache, or None if it's disabled.
+    Without a shared cache the invalidations can't reach the other workers, so the cache is only enabled
+    when `settings.AUTH_USER_CACHE['SHARED_CACHE']` is set or when explicitly allowed with `LOCAL_ONLY`.
+    """
+    global _auth_user_cache
+
+    if _auth_user_cache is None:
+        config = getattr(django_settings, 'AUTH_USER_CACHE', {})
+        if not config.get('ENABLED', True) or not (config.get('SHARED_CACHE') or config.get('LOCAL_ONLY')):
+            return None
+        _auth_user_cache = AuthUserCache(max_entries=config.get('MAX_ENTRIES', 10000),
+                                         timeout=config.get('TIMEOUT', 300),
+                                         shared_cache=config.get('SHARED_CACHE'))
+    return _auth_user_cache
+
+
+def invalidate_user_auth_state(shard, user_id):
+    cache = get_auth_user_cache()
+    if cache is not None and user_id is not None:
+        cache.invalidate(shard, user_id)
+
+
+def invalidate_user_auth_state_on_commit(shard, user_id):
+    """
+    Invalidate the user's auth state now, for the rest of the transaction, and again once it's committed: another
+    worker could cache the previous one (e.g. still active, old password, not logged out) until then.
+    """
+    invalidate_user_auth_state(shard, user_id)
+    transaction.on_commit(lambda: invalidate_user_auth_state(shard, user_id), using=shard)
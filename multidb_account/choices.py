@@ -2,7 +2,7 @@ from django.utils.translation import ugettext_lazy as _
 
 from .constants import INVITE_PENDING, INVITE_ACCEPTED, INVITE_CANCELED, USER_TYPE_COACH, USER_TYPE_ATHLETE, \
     MEASURING_METRIC, MEASURING_IMPERIAL, TEAM_STATUS_ACTIVE, TEAM_STATUS_ARCHIVED, VIDEO_YOUTUBE, VIDEO_VIMEO, \
-    USER_TYPE_ORG
+    USER_TYPE_ORG, CONNECTION_COACHING, CONNECTION_TEAM, CONNECTION_OWNER, CONNECTION_ORGANISATION
 
 USER_TYPES = (
     (USER_TYPE_COACH, _("Coach")),
@@ -20,6 +20,13 @@ TEAM_STATUSES = (
     (TEAM_STATUS_ARCHIVED, _("Archived")),
 )
 
+CONNECTION_LINKS = (
+    (CONNECTION_COACHING, _("Coaching")),
+    (CONNECTION_TEAM, _("Team")),
+    (CONNECTION_OWNER, _("Team owner")),
+    (CONNECTION_ORGANISATION, _("Organisation")),
+)
+
 INVITE_STATUSES = (
     (INVITE_PENDING, _("Pending")),
     (INVITE_ACCEPTED, _("Accepted")),
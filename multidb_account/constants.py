@@ -11,6 +11,11 @@ MEASURING_IMPERIAL = 'imperial'
 TEAM_STATUS_ACTIVE = 'active'
 TEAM_STATUS_ARCHIVED = 'archived'
 
+CONNECTION_COACHING = 'coaching'
+CONNECTION_TEAM = 'team'
+CONNECTION_OWNER = 'owner'
+CONNECTION_ORGANISATION = 'organisation'
+
 INVITE_PENDING = 'pending'
 INVITE_ACCEPTED = 'accepted'
 INVITE_CANCELED = 'canceled'
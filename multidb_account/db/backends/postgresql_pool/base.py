@@ -0,0 +1,45 @@
+"""
+PostgreSQL backend handing out connections from a per-process pool (see multidb_account.db.pool).
+
+The pool is configured with the 'POOL' entry of the database settings:
+
+    'ENGINE': 'multidb_account.db.backends.postgresql_pool',
+    'POOL': {'MAX_SIZE': 10, 'TIMEOUT': 10, 'MAX_IDLE': 300, 'CHECK_INTERVAL': 10},
+
+Closing the Django connection (end of request, CONN_MAX_AGE) gives the psycopg2 connection back to the pool.
+"""
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+
+from multidb_account.db.pool import get_pool
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+
+    def get_pool(self, conn_params):
+        options = self.settings_dict.get('POOL', {})
+        # The parameters are part of the key: e.g. the test database is another pool than the real one
+        key = (self.alias,) + tuple(sorted((name, str(value)) for name, value in conn_params.items()))
+        return get_pool(key, self.alias,
+                        max_size=options.get('MAX_SIZE', 10),
+                        timeout=options.get('TIMEOUT', 10),
+                        max_idle=options.get('MAX_IDLE', 300),
+                        check_interval=options.get('CHECK_INTERVAL', 10))
+
+    def get_new_connection(self, conn_params):
+        self._pool = self.get_pool(conn_params)
+        connection = self._pool.checkout(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+
+        # Set by the parent's get_new_connection() for new connections only
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Django keeps using the connection until the transaction is rolled back: don't share it
+                self._pool.discard(self.connection)
+            else:
+                self._pool.checkin(self.connection)
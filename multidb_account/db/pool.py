@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import deque
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+class PoolTimeoutError(Exception):
+    """ No connection was released to the pool in time """
+
+
+class ConnectionPool(object):
+    """
+    Thread-safe pool of psycopg2 connections to a database.
+
+    - `max_size` connections at most are open at once, a checkout waits up to `timeout` seconds for one.
+    - Connections idle for more than `check_interval` seconds are checked with a `SELECT 1` on checkout.
+    - Connections idle for more than `max_idle` seconds are closed.
+    """
+
+    def __init__(self, alias, max_size=10, timeout=10, max_idle=300, check_interval=10):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check_interval = check_interval
+        self.size = 0
+        self.stats = {'checkouts': 0, 'waits': 0, 'creations': 0, 'errors': 0, 'reaped': 0}
+        # (connection, released at) tuples, the most recently released last
+        self._idle = deque()
+        self._condition = threading.Condition()
+
+    def _reap_idle(self):
+        """ Must be called with the lock held """
+        deadline = time.monotonic() - self.max_idle
+        while self._idle and self._idle[0][1] < deadline:
+            connection, _ = self._idle.popleft()
+            self.size -= 1
+            self.stats['reaped'] += 1
+            self._close(connection)
+
+    def _is_usable(self, connection, released_at):
+        if connection.closed:
+            return False
+        if time.monotonic() - released_at < self.check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def checkout(self, connect):
+        """ Return an idle connection, or a new one made with `connect()` if the pool isn't full """
+        with self._condition:
+            self.stats['checkouts'] += 1
+
+        while True:
+            with self._condition:
+                self._reap_idle()
+                if not self._idle and self.size >= self.max_size:
+                    self.stats['waits'] += 1
+                    deadline = time.monotonic() + self.timeout
+                    while not self._idle and self.size >= self.max_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or not self._condition.wait(remaining):
+                            if not self._idle and self.size >= self.max_size:
+                                self.stats['errors'] += 1
+                                raise PoolTimeoutError('No connection available to database "{}"'.format(self.alias))
+                if self._idle:
+                    connection, released_at = self._idle.pop()
+                else:
+                    connection = released_at = None
+                    self.size += 1
+
+            if connection is None:
+                try:
+                    connection = connect()
+                except Exception:
+                    with self._condition:
+                        self.size -= 1
+                        self.stats['errors'] += 1
+                        self._condition.notify()
+                    raise
+                with self._condition:
+                    self.stats['creations'] += 1
+                return connection
+
+            if self._is_usable(connection, released_at):
+                return connection
+
+            # Broken connection (e.g. the server restarted): drop it and try again
+            self.discard(connection, error=True)
+
+    def checkin(self, connection):
+        """ Give a connection back to the pool, after rolling back any transaction left open """
+        try:
+            if not connection.closed and connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Exception:
+            pass
+
+        if connection.closed:
+            self.discard(connection, error=True)
+            return
+
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._reap_idle()
+            self._condition.notify()
+
+    def discard(self, connection, error=False):
+        """ Close a checked out connection instead of giving it back """
+        self._close(connection)
+        with self._condition:
+            self.size -= 1
+            if error:
+                self.stats['errors'] += 1
+            self._condition.notify()
+
+    def close_all(self):
+        with self._condition:
+            while self._idle:
+                connection, _ = self._idle.pop()
+                self.size -= 1
+                self._close(connection)
+
+    def get_stats(self):
+        with self._condition:
+            return dict(self.stats, size=self.size, idle=len(self._idle), max_size=self.max_size)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, alias, **options):
+    """ Pool of the connections made with the given parameters, `key` must identify them """
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(alias, **options)
+    return pool
+
+
+def get_pools_stats():
+    """ Statistics of every pool, by database alias """
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.alias: pool.get_stats() for pool in pools}
+
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
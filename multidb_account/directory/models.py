@@ -0,0 +1,64 @@
+from django.conf import settings as django_settings
+from django.db import models, transaction, IntegrityError
+from django.utils.translation import ugettext_lazy as _
+
+
+def get_user_directory_db():
+    """ Name of the database holding the global email -> localized database directory """
+    return getattr(django_settings, 'USER_DIRECTORY_DATABASE', 'default')
+
+
+def normalize_directory_email(email):
+    return (email or '').strip().lower()
+
+
+class UserDirectoryEntry(models.Model):
+    """
+    Global directory mapping a normalized user email to the localized database the user lives in.
+    It is only read/written on the `settings.USER_DIRECTORY_DATABASE` database.
+    """
+    email = models.CharField(verbose_name=_('normalized email address'), max_length=255, unique=True)
+    localized_db = models.CharField(verbose_name=_('localized database'), max_length=7)
+    user_id = models.IntegerField(verbose_name=_('user id'))
+
+    class Meta:
+        db_table = 'multidb_account_user_directory'
+        unique_together = (('localized_db', 'user_id'),)
+        verbose_name = _('user directory entry')
+        verbose_name_plural = _('user directory')
+
+    def __str__(self):
+        return '{} -> {}'.format(self.email, self.localized_db)
+
+    @classmethod
+    def get_localized_db(cls, email):
+        entry = cls.objects.using(get_user_directory_db()) \
+            .filter(email=normalize_directory_email(email)) \
+            .values_list('localized_db', flat=True) \
+            .first()
+        return entry
+
+    @classmethod
+    def register(cls, user, localized_db=None):
+        """ Create or update the directory entry of a user (e.g. after an email change) """
+        localized_db = localized_db or user._state.db or user.country
+        directory_db = get_user_directory_db()
+
+        email = normalize_directory_email(user.email)
+
+        try:
+            with transaction.atomic(using=directory_db):
+                updated = cls.objects.using(directory_db) \
+                    .filter(localized_db=localized_db, user_id=user.pk) \
+                    .update(email=email)
+                if not updated:
+                    cls.objects.using(directory_db).create(localized_db=localized_db, user_id=user.pk, email=email)
+        except IntegrityError:
+            # The email is already mapped to a user of another localized database.
+            # Keep the first registered one, like the sequential lookup used to do.
+            pass
+
+    @classmethod
+    def unregister(cls, user, localized_db=None):
+        localized_db = localized_db or user._state.db or user.country
+        cls.objects.using(get_user_directory_db()).filter(localized_db=localized_db, user_id=user.pk).delete()
@@ -0,0 +1,180 @@
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from django.conf import settings as django_settings
+from django.db import connections
+
+from multidb_account.shard_health import ShardUnavailableError, call_shard, get_circuit_breaker, is_shard_available
+from multidb_account.shards import get_shard_databases
+
+
+class ShardTimeoutError(Exception):
+    """ A database didn't answer within the fan-out timeout, which counts as a failure of its circuit breaker """
+
+    def __init__(self, database):
+        super().__init__('Database "{}" timed out'.format(database))
+        self.database = database
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_config():
+    return getattr(django_settings, 'SHARD_FANOUT', {})
+
+
+def _get_executor():
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_get_config().get('MAX_WORKERS', 8),
+                                               thread_name_prefix='shard-fanout')
+    return _executor
+
+
+def _close_connections():
+    # Every worker thread has its own connections: don't keep them open past CONN_MAX_AGE
+    for connection in connections.all():
+        connection.close_if_unusable_or_obsolete()
+
+
+def _call(func, database, timeout, abandoned):
+    try:
+        return call_shard(database, func, timeout, abandoned)
+    finally:
+        _close_connections()
+
+
+def _run_serially():
+    """
+    Work done from inside a transaction must stay in the caller's connections (and so in its transaction),
+    the worker threads would use their own ones.
+    """
+    if not _get_config().get('ENABLED', True):
+        return True
+    return any(connection.in_atomic_block for connection in connections.all())
+
+
+def _submit(databases, func, timeout):
+    """ Return `(future, abandoned event)` by database, see `_wait()` """
+    executor = _get_executor()
+    calls = OrderedDict()
+    for database in databases:
+        abandoned = threading.Event()
+        # Each call runs in a copy of the caller's context, e.g. to keep its current shard
+        future = executor.submit(contextvars.copy_context().run, _call, func, database, timeout, abandoned)
+        calls[database] = future, abandoned
+    return calls
+
+
+def _wait(database, call, deadline):
+    """ A call which doesn't end by the deadline is abandoned and counted as a failure of the database right away """
+    future, abandoned = call
+    try:
+        return future.result(timeout=max(deadline - time.monotonic(), 0) if deadline else None)
+    except FutureTimeoutError:
+        abandoned.set()
+        get_circuit_breaker(database).record_failure()
+        raise ShardTimeoutError(database)
+
+
+def _cancel(calls):
+    for future, _ in calls.values():
+        future.cancel()
+
+
+def _get_databases(databases, skip_unavailable):
+    """ Databases whose circuit breaker is open are skipped (see multidb_account.shard_health) """
+    databases = databases if databases is not None else get_shard_databases()
+    available = [database for database in databases if is_shard_available(database)]
+    if not skip_unavailable and len(available) < len(databases):
+        raise ShardUnavailableError(next(database for database in databases if database not in available))
+    return available
+
+
+def _get_timeout(timeout):
+    return timeout if timeout is not None else _get_config().get('TIMEOUT')
+
+
+def fan_out(func, databases=None, timeout=None, skip_unavailable=True):
+    """
+    Call `func(database)` for every database (all but the read replicas by default) on a bounded thread pool.
+    Returns an OrderedDict of the results, in the order of `databases`.
+    Unavailable databases, and the ones which didn't answer within `timeout` seconds
+    (`settings.SHARD_FANOUT['TIMEOUT']` by default), are left out of the results, unless `skip_unavailable` is False:
+    `ShardUnavailableError` (before calling `func` if their circuit breaker is already open) or `ShardTimeoutError`
+    is then raised. Raises the first exception raised by `func` otherwise.
+    """
+    databases = _get_databases(databases, skip_unavailable)
+    timeout = _get_timeout(timeout)
+    results = OrderedDict()
+
+    if len(databases) < 2 or _run_serially():
+        for database in databases:
+            try:
+                results[database] = call_shard(database, func, timeout)
+            except ShardUnavailableError:
+                if not skip_unavailable:
+                    raise
+        return results
+
+    deadline = time.monotonic() + timeout if timeout else None
+    calls = _submit(databases, func, timeout)
+    try:
+        for database, call in calls.items():
+            try:
+                results[database] = _wait(database, call, deadline)
+            except (ShardUnavailableError, ShardTimeoutError):
+                if not skip_unavailable:
+                    raise
+        return results
+    finally:
+        _cancel(calls)
+
+
+def fan_out_first(func, databases=None, timeout=None):
+    """
+    Like `fan_out()`, but return the first result which is not None, in the order of `databases`
+    (i.e. the one a sequential lookup would have found) without waiting for the following databases.
+    Unavailable databases, and the ones which time out, are skipped. If none of the others has a result, the
+    answer isn't known: the `ShardUnavailableError` or `ShardTimeoutError` of a skipped database is raised
+    rather than returning None, which callers would take for "doesn't exist".
+    """
+    databases = databases if databases is not None else get_shard_databases()
+    available = _get_databases(databases, skip_unavailable=True)
+    skipped = [ShardUnavailableError(database) for database in databases if database not in available]
+    timeout = _get_timeout(timeout)
+
+    if len(available) < 2 or _run_serially():
+        for database in available:
+            try:
+                result = call_shard(database, func, timeout)
+            except ShardUnavailableError as e:
+                skipped.append(e)
+                continue
+            if result is not None:
+                return result
+    else:
+        deadline = time.monotonic() + timeout if timeout else None
+        calls = _submit(available, func, timeout)
+        try:
+            for database, call in calls.items():
+                try:
+                    result = _wait(database, call, deadline)
+                except (ShardUnavailableError, ShardTimeoutError) as e:
+                    skipped.append(e)
+                    continue
+                if result is not None:
+                    return result
+        finally:
+            _cancel(calls)
+
+    if skipped:
+        raise skipped[0]
+    return None
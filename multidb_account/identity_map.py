@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import router
+
+# Users, profiles and teams loaded by the current request, by `(database, model, field, value)`: the helpers of the
+# models look them up here before querying. None outside of `identity_map()` (see `IdentityMapMiddleware`), where
+# every lookup queries the database as usual.
+_identity_map = ContextVar('identity_map', default=None)
+
+
+@contextmanager
+def identity_map():
+    """ Share the objects loaded by `get_object` within the block, e.g. a request or a task """
+    token = _identity_map.set({})
+    try:
+        yield
+    finally:
+        _identity_map.reset(token)
+
+
+def _get_key(model, database, field, value):
+    return database, model._meta.label_lower, field, str(value)
+
+
+def get_object(model, using=None, load=None, **lookup):
+    """
+    Return the object of `model` matching a single field `lookup` (e.g. `pk=1`, `athlete=2`), from the identity map
+    or loaded with `load()` when given (e.g. an accessor which caches it on an instance), with a `get()` otherwise.
+    Raise `model.DoesNotExist` like `get()`, misses aren't kept.
+    """
+    (field, value), = lookup.items()
+    objects = _identity_map.get()
+    if objects is None:
+        return load() if load is not None else model.objects.using(using).get(**lookup)
+
+    database = using or router.db_for_read(model)
+    key = _get_key(model, database, field, value)
+    if key not in objects:
+        obj = load() if load is not None else model.objects.using(database).get(**lookup)
+        objects[key] = objects.setdefault(_get_key(model, database, 'pk', obj.pk), obj)
+    return objects[key]
+
+
+def remember(obj):
+    """ Add an object loaded otherwise (e.g. the authenticated user) to the identity map, return the mapped one """
+    objects = _identity_map.get()
+    if objects is None or obj is None:
+        return obj
+    return objects.setdefault(_get_key(type(obj), obj._state.db, 'pk', obj.pk), obj)
+
+
+def forget(obj):
+    """ Drop an object saved or deleted during the request from the identity map """
+    objects = _identity_map.get()
+    if not objects:
+        return
+    for key, mapped in list(objects.items()):
+        if type(mapped) is type(obj) and mapped.pk == obj.pk:
+            del objects[key]
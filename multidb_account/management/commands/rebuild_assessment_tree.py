@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from multidb_account.assessment.models import AssessmentTreeNode
+from multidb_account.assessment_tree import rebuild_assessment_tree
+from multidb_account.shards import get_shard_databases
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized assessment tree of all databases.'
+
+    def handle(self, *args, **options):
+        for db in get_shard_databases():
+            rebuild_assessment_tree(db)
+            self.stdout.write('{}: {} sub categories'.format(db, AssessmentTreeNode.objects.using(db).count()))
+
+        self.stdout.write(self.style.SUCCESS('Assessment tree rebuilt.'))
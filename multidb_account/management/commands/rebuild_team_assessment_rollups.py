@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from multidb_account.assessment.models import TeamAssessmentRollup
+from multidb_account.assessment_rollup import rebuild_team_assessment_rollups
+from multidb_account.shards import get_shard_databases
+
+
+class Command(BaseCommand):
+    help = 'Recompute the team assessment rollups of all databases, before enabling settings.TEAM_ASSESSMENT_ROLLUP.'
+
+    def handle(self, *args, **options):
+        for db in get_shard_databases():
+            rebuild_team_assessment_rollups(db)
+            self.stdout.write('{}: {} rollups'.format(db, TeamAssessmentRollup.objects.using(db).count()))
+
+        self.stdout.write(self.style.SUCCESS('Team assessment rollups rebuilt.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from multidb_account.shards import get_shard_databases
+from multidb_account.user.models import UserConnection
+from multidb_account.user_connections import rebuild_user_connections
+
+
+class Command(BaseCommand):
+    help = 'Recompute the connection graph of all databases, before enabling settings.USER_CONNECTION_GRAPH.'
+
+    def handle(self, *args, **options):
+        for db in get_shard_databases():
+            rebuild_user_connections(db)
+            self.stdout.write('{}: {} connections'.format(db, UserConnection.objects.using(db).count()))
+
+        self.stdout.write(self.style.SUCCESS('User connections rebuilt.'))
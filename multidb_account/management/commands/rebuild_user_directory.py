@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from multidb_account.directory.models import UserDirectoryEntry, get_user_directory_db, normalize_directory_email
+from multidb_account.shards import get_shard_databases
+
+
+class Command(BaseCommand):
+    help = 'Repopulate the global email -> localized database user directory from all databases.'
+
+    def handle(self, *args, **options):
+        UserModel = get_user_model()
+        directory_db = get_user_directory_db()
+
+        entries = {}
+        for db in get_shard_databases():
+            users = UserModel.objects.using(db).values_list('id', 'email')
+            for user_id, email in users:
+                email = normalize_directory_email(email)
+                if email in entries:
+                    self.stderr.write('Duplicated email {} found in {} and {}, keeping the first one.'.format(
+                        email, entries[email].localized_db, db))
+                    continue
+                entries[email] = UserDirectoryEntry(email=email, localized_db=db, user_id=user_id)
+            self.stdout.write('{}: {} users'.format(db, len(users)))
+
+        with transaction.atomic(using=directory_db):
+            UserDirectoryEntry.objects.using(directory_db).all().delete()
+            UserDirectoryEntry.objects.using(directory_db).bulk_create(entries.values(), batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS('User directory rebuilt: {} entries.'.format(len(entries))))
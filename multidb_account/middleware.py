@@ -1,11 +1,34 @@
-import threading
+import contextvars
 
 from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware as DjangoSessionMiddleware
 
-# A class that represents thread-local data.
 from multidb_account.admin import get_localized_db_from_url
+from multidb_account.identity_map import identity_map
+from multidb_account.shards import set_admin_shard, set_current_shard
 
-thread_locals = threading.local()
+
+def is_sessionless_path(path):
+    return path.startswith(tuple(getattr(settings, 'SESSIONLESS_PATH_PREFIXES', ())))
+
+
+class SessionMiddleware(DjangoSessionMiddleware):
+    """
+    Django's session middleware, except for `settings.SESSIONLESS_PATH_PREFIXES` (the JWT authenticated API):
+    those requests get an empty session without a key, which is never loaded from nor saved to the session store,
+    even when the client sends an admin session cookie.
+    """
+
+    def process_request(self, request):
+        if is_sessionless_path(request.path):
+            request.session = self.SessionStore()
+        else:
+            super().process_request(request)
+
+    def process_response(self, request, response):
+        if is_sessionless_path(request.path):
+            return response
+        return super().process_response(request, response)
 
 
 class MultiDbMiddleware(object):
@@ -13,35 +36,57 @@ class MultiDbMiddleware(object):
         self.get_response = get_response
 
     def __call__(self, request):
-        response = self.get_response(request)
-        return response
+        # Run the request in its own copy of the context: the shard set while processing it
+        # is dropped with the copy and can't leak into the next request served by this worker.
+        return contextvars.copy_context().run(self.get_response, request)
 
     def process_view(self, request, view_func, view_args, view_kwargs):
-        """Inspect the request before it goes to the view. Check if the user is authenticated.
+        """Inspect the admin requests before they go to the view. Check if the user is authenticated.
         - If the user is authenticated, it adds a 'db_localized' parameter to the request object. 
         This 'db_localized' parameter is based on the user's country and will be used to define which database
         to use.
-        - Any other anonynmous request will be proceeded using the 'default' database. """
+        - Any other anonynmous admin request will be proceeded using the database of the admin site.
+        - Non admin requests (API) are proceeded using the 'default' database until the JWT authentication
+        sets the user's shard. """
 
         debug = getattr(settings, 'DEBUG', False)
 
+        in_admin = request.path.startswith('/admin/')
+        if not in_admin:
+            # The API is authenticated with JWTs and the shard is set from the token by the authentication class:
+            # neither the session nor the (session based) user are looked at here.
+            request.localized_db = 'default'
+            return
+
         if request.session.get('localized_db'):
-            thread_locals.localized_db = request.session.get('localized_db')
+            set_current_shard(request.session.get('localized_db'))
+
+        # The user is loaded from its session's database, before switching to the database shown in the admin
+        is_authenticated = request.user.is_authenticated()
 
-        thread_locals.in_admin = request.path.startswith('/admin/')
-        if thread_locals.in_admin:
-            thread_locals.admin_show_localized_db = get_localized_db_from_url(request.path)
+        admin_shard = get_localized_db_from_url(request.path)
+        set_admin_shard(admin_shard)
+        if admin_shard:
+            set_current_shard(admin_shard)
 
-        if request.user.is_authenticated():
+        if is_authenticated:
             request.localized_db = request.user.country
 
             if debug:
                 print('DEBUG: Custom middleware -- User authenticated')
         else:
-            if thread_locals.in_admin:
-                request.localized_db = thread_locals.admin_show_localized_db
-            else:
-                request.localized_db = 'default'
+            request.localized_db = admin_shard
 
             if debug:
                 print('DEBUG: Custom middleware -- User NOT authenticated')
+
+
+class IdentityMapMiddleware(object):
+    """ Share the users, profiles and teams loaded while processing a request (see multidb_account.identity_map) """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with identity_map():
+            return self.get_response(request)
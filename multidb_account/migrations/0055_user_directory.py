@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('multidb_account', '0054_org_own_assessments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDirectoryEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.CharField(max_length=255, unique=True, verbose_name='normalized email address')),
+                ('localized_db', models.CharField(max_length=7, verbose_name='localized database')),
+                ('user_id', models.IntegerField(verbose_name='user id')),
+            ],
+            options={
+                'db_table': 'multidb_account_user_directory',
+                'verbose_name': 'user directory entry',
+                'verbose_name_plural': 'user directory',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='userdirectoryentry',
+            unique_together=set([('localized_db', 'user_id')]),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def create_version_stamp(apps, schema_editor):
+    ReferenceDataVersion = apps.get_model('multidb_account', 'ReferenceDataVersion')
+    ReferenceDataVersion.objects.using(schema_editor.connection.alias).create(pk=1, version=1)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('multidb_account', '0055_user_directory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceDataVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=1, verbose_name='version')),
+            ],
+            options={
+                'db_table': 'multidb_account_reference_data_version',
+            },
+        ),
+        migrations.RunPython(create_version_stamp, migrations.RunPython.noop),
+    ]
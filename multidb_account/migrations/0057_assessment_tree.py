@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_assessment_tree(apps, schema_editor):
+    from multidb_account.assessment_tree import rebuild_assessment_tree
+
+    rebuild_assessment_tree(schema_editor.connection.alias, apps)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('multidb_account', '0056_reference_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssessmentTreeNode',
+            fields=[
+                ('subcategory', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True,
+                                                     related_name='tree_node', serialize=False,
+                                                     to='multidb_account.AssessmentSubCategory')),
+                ('public_count', models.IntegerField(default=0)),
+                ('public_everywhere_count', models.IntegerField(default=0)),
+                ('top_category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                                                   to='multidb_account.AssessmentTopCategory')),
+                ('top_subcategory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                                                      to='multidb_account.AssessmentSubCategory')),
+            ],
+            options={
+                'db_table': 'multidb_account_assessment_tree_node',
+            },
+        ),
+        migrations.CreateModel(
+            name='AssessmentTreeOrganisationCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('organisation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                                                   to='multidb_account.Organisation')),
+                ('top_subcategory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                                                      to='multidb_account.AssessmentSubCategory')),
+            ],
+            options={
+                'db_table': 'multidb_account_assessment_tree_organisation_count',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='assessmenttreeorganisationcount',
+            unique_together=set([('top_subcategory', 'organisation')]),
+        ),
+        migrations.RunPython(build_assessment_tree, migrations.RunPython.noop),
+    ]
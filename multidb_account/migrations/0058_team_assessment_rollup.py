@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('multidb_account', '0057_assessment_tree'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamAssessmentRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value_sum', models.DecimalField(decimal_places=6, default=0, max_digits=25)),
+                ('value_count', models.IntegerField(default=0)),
+                ('value_min', models.DecimalField(decimal_places=6, max_digits=15, null=True)),
+                ('value_max', models.DecimalField(decimal_places=6, max_digits=15, null=True)),
+                ('latest_value', models.DecimalField(decimal_places=6, max_digits=15, null=True)),
+                ('latest_date', models.DateTimeField(null=True)),
+                ('assessment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                                 to='multidb_account.Assessment')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='multidb_account.Team')),
+            ],
+            options={
+                'db_table': 'multidb_account_team_assessment_rollup',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='teamassessmentrollup',
+            unique_together=set([('team', 'assessment')]),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_top_category_permissions(apps, schema_editor):
+    """ One AssessmentAccess per pair of the former per top category rows, with the granted top categories """
+    db = schema_editor.connection.alias
+    AssessmentTopCategoryPermission = apps.get_model('multidb_account', 'AssessmentTopCategoryPermission')
+    AssessmentAccess = apps.get_model('multidb_account', 'AssessmentAccess')
+
+    granted = defaultdict(set)
+    for assessed_id, assessor_id, top_category_id, assessor_has_access in \
+            AssessmentTopCategoryPermission.objects.using(db) \
+            .values_list('assessed_id', 'assessor_id', 'assessment_top_category_id', 'assessor_has_access') \
+            .iterator():
+        top_category_ids = granted[assessed_id, assessor_id]
+        if assessor_has_access:
+            top_category_ids.add(top_category_id)
+
+    AssessmentAccess.objects.using(db).bulk_create([
+        AssessmentAccess(assessed_id=assessed_id, assessor_id=assessor_id, top_category_ids=sorted(top_category_ids))
+        for (assessed_id, assessor_id), top_category_ids in granted.items()
+    ], batch_size=1000)
+
+
+def copy_assessment_accesses(apps, schema_editor):
+    """ One AssessmentTopCategoryPermission per pair and top category """
+    db = schema_editor.connection.alias
+    AssessmentTopCategoryPermission = apps.get_model('multidb_account', 'AssessmentTopCategoryPermission')
+    AssessmentAccess = apps.get_model('multidb_account', 'AssessmentAccess')
+    top_category_ids = list(apps.get_model('multidb_account', 'AssessmentTopCategory').objects.using(db)
+                            .order_by('id').values_list('id', flat=True))
+    accesses = list(AssessmentAccess.objects.using(db).order_by('id'))
+
+    AssessmentTopCategoryPermission.objects.using(db).bulk_create([
+        AssessmentTopCategoryPermission(assessed_id=access.assessed_id, assessor_id=access.assessor_id,
+                                        assessment_top_category_id=top_category_id,
+                                        assessor_has_access=top_category_id in access.top_category_ids)
+        for top_category_id in top_category_ids
+        for access in accesses
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('multidb_account', '0058_team_assessment_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssessmentAccess',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('top_category_ids', django.contrib.postgres.fields.ArrayField(
+                    base_field=models.IntegerField(), blank=True, default=list, size=None,
+                    verbose_name='granted top categories')),
+                ('assessed', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                               to='multidb_account.Assessed')),
+                ('assessor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                               to='multidb_account.Assessor')),
+            ],
+            options={
+                'db_table': 'multidb_account_assessment_access',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='assessmentaccess',
+            unique_together=set([('assessed', 'assessor')]),
+        ),
+        migrations.RunPython(copy_top_category_permissions, copy_assessment_accesses),
+        migrations.DeleteModel(
+            name='AssessmentTopCategoryPermission',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('multidb_account', '0059_assessment_access'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserConnection',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('link', models.CharField(choices=[('coaching', 'Coaching'), ('team', 'Team'), ('owner', 'Team owner'),
+                                                   ('organisation', 'Organisation')],
+                                          max_length=30, verbose_name='link')),
+                ('other_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                                                 to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='connections',
+                                           to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'multidb_account_user_connection',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='userconnection',
+            index_together=set([('user', 'other_user')]),
+        ),
+    ]
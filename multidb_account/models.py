@@ -3,6 +3,8 @@ import os
 from .education.models import *
 from .promocode.models import *
 from .help_center.models import *
+from .directory.models import *
+from .reference_data.models import *
 
 
 def get_file_path(instance, filename, path=None):
@@ -1,6 +1,6 @@
 from django.contrib.auth import get_user_model
 
-from .middleware import thread_locals
+from .shards import get_current_shard
 from .utils import get_user_from_localized_databases
 
 # get the custom user model.
@@ -17,7 +17,7 @@ class MultidbAuthBackend(object):
         self.auth_database = 'default'
 
     def authenticate(self, request, email=None, password=None):
-        # localized_db = getattr(thread_locals, 'admin_show_localized_db', None)
+        # localized_db = get_admin_shard()
         # user = get_user_from_localized_databases(email, localized_db)
         user = get_user_from_localized_databases(email)
 
@@ -32,7 +32,7 @@ class MultidbAuthBackend(object):
 
     def get_user(self, user_id):
         try:
-            localized_db = getattr(thread_locals, 'localized_db', self.auth_database)
+            localized_db = get_current_shard() or self.auth_database
 
             return UserModel.objects.using(localized_db).get(pk=user_id)
         except UserModel.DoesNotExist:
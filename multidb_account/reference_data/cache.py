@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings as django_settings
+from django.db.models import prefetch_related_objects
+
+from multidb_account.achievements.models import Badge
+from multidb_account.assessment.models import AssessmentTopCategory, AssessmentSubCategory, AssessmentFormat, \
+    AssessmentRelationshipType, Assessment
+from multidb_account.note.models import ReturnToPlayType
+from multidb_account.sport.models import Sport
+from multidb_account.team.models import Team
+from multidb_account.user.models import Organisation
+from .models import ReferenceDataVersion
+from .taxonomy import AssessmentTaxonomy
+
+
+def _by_pk(queryset):
+    return OrderedDict((obj.pk, obj) for obj in queryset)
+
+
+def _set_related(obj, field_name, related):
+    """ Fill the forward foreign key cache so that `obj.<field_name>` doesn't query the database """
+    if related is not None:
+        setattr(obj, obj._meta.get_field(field_name).get_cache_name(), related)
+
+
+class ReferenceData(object):
+    """
+    Snapshot of the reference data of a database: sports, assessment taxonomy, metric formats, badges...
+    The objects are linked together (`assessment.format`, `assessment.relationship_types.all()`,
+    `sub_category.parent_sub_category`...) and are shared by every thread: they must not be modified.
+    `taxonomy` is a compact view of the assessment taxonomy with the visibility of the assessments.
+    `assessment_relationship_types` holds the relationship type names of every assessment.
+    """
+
+    def __init__(self, database, version):
+        self.database = database
+        self.version = version
+
+        self.sports = _by_pk(Sport.objects.using(database))
+        self.top_categories = _by_pk(AssessmentTopCategory.objects.using(database).order_by('id'))
+        self.sub_categories = _by_pk(AssessmentSubCategory.objects.using(database).order_by('id'))
+        self.formats = _by_pk(AssessmentFormat.objects.using(database).order_by('id'))
+        self.relationship_types = _by_pk(AssessmentRelationshipType.objects.using(database).order_by('id'))
+        self.assessments = _by_pk(Assessment.objects.using(database))
+        self.badges = _by_pk(Badge.objects.using(database))
+        self.return_to_play_types = _by_pk(ReturnToPlayType.objects.using(database))
+
+        self._link()
+
+        self.taxonomy = AssessmentTaxonomy(
+            self,
+            organisation_assessments=Organisation.own_assessments.through.objects.using(database)
+            .values_list('organisation_id', 'assessment_id'),
+            team_assessments=Team.assessments.through.objects.using(database).values_list('team_id', 'assessment_id'),
+        )
+
+    def _link(self):
+        for top_category in self.top_categories.values():
+            _set_related(top_category, 'sport', self.sports.get(top_category.sport_id))
+
+        for sub_category in self.sub_categories.values():
+            _set_related(sub_category, 'parent_top_category',
+                         self.top_categories.get(sub_category.parent_top_category_id))
+            _set_related(sub_category, 'parent_sub_category',
+                         self.sub_categories.get(sub_category.parent_sub_category_id))
+
+        assessments = list(self.assessments.values())
+        for assessment in assessments:
+            _set_related(assessment, 'parent_sub_category', self.sub_categories.get(assessment.parent_sub_category_id))
+            _set_related(assessment, 'format', self.formats.get(assessment.format_id))
+        prefetch_related_objects(assessments, 'relationship_types')
+        self.assessment_relationship_types = {
+            assessment.pk: frozenset(relationship_type.type for relationship_type in assessment.relationship_types.all())
+            for assessment in assessments
+        }
+
+    def get_available_sports(self):
+        return [sport for sport in self.sports.values() if sport.is_available]
+
+    def is_relationship_type_valid(self, assessment, relationship_type):
+        """ Same as `Assessment.has_relationship_type`, for an assessment of the snapshot or a fresh one """
+        relationship_types = self.assessment_relationship_types.get(assessment.pk)
+        if relationship_types is None:
+            return assessment.has_relationship_type(relationship_type)
+        return relationship_type in relationship_types
+
+    def get_assessment(self, assessment_id):
+        try:
+            return self.assessments.get(int(assessment_id))
+        except (TypeError, ValueError):
+            return None
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def _get_config():
+    return getattr(django_settings, 'REFERENCE_DATA', {})
+
+
+def get_reference_data(database):
+    """
+    Return the reference data snapshot of a database.
+    The version stamp of the database is checked at most every `settings.REFERENCE_DATA['CHECK_INTERVAL']` seconds,
+    the snapshot is rebuilt when it has changed.
+    """
+    config = _get_config()
+    now = time.monotonic()
+    entry = _snapshots.get(database)
+    if entry is not None and now < entry['checked_at'] + config.get('CHECK_INTERVAL', 5):
+        return entry['snapshot']
+
+    with _snapshots_lock:
+        entry = _snapshots.get(database)
+        if entry is not None and now < entry['checked_at'] + config.get('CHECK_INTERVAL', 5):
+            return entry['snapshot']
+
+        # The version is read first: data changed while loading the snapshot are reloaded on the next check
+        version = ReferenceDataVersion.get_version(database)
+        if entry is None or entry['snapshot'].version != version:
+            snapshot = ReferenceData(database, version)
+        else:
+            snapshot = entry['snapshot']
+        _snapshots[database] = {'snapshot': snapshot, 'checked_at': time.monotonic()}
+        return snapshot
+
+
+def clear_reference_data(database=None):
+    """ Drop the snapshot of a database (of every database by default) held by this process """
+    with _snapshots_lock:
+        if database is None:
+            _snapshots.clear()
+        else:
+            _snapshots.pop(database, None)
+
+
+def invalidate_reference_data(database):
+    """ Reference data of a database changed: make every worker reload them """
+    ReferenceDataVersion.bump(database)
+    clear_reference_data(database)
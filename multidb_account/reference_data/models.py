@@ -0,0 +1,29 @@
+from django.db import models, IntegrityError
+from django.db.models import F
+from django.utils.translation import ugettext_lazy as _
+
+
+class ReferenceDataVersion(models.Model):
+    """
+    Version stamp of the reference data (sports, assessment taxonomy, badges...) of a database.
+    Every database holds a single row, bumped whenever its reference data change.
+    """
+    version = models.BigIntegerField(verbose_name=_('version'), default=1)
+
+    class Meta:
+        db_table = 'multidb_account_reference_data_version'
+
+    STAMP_ID = 1
+
+    @classmethod
+    def get_version(cls, using):
+        return cls.objects.using(using).filter(pk=cls.STAMP_ID).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, using):
+        updated = cls.objects.using(using).filter(pk=cls.STAMP_ID).update(version=F('version') + 1)
+        if not updated:
+            try:
+                cls.objects.using(using).create(pk=cls.STAMP_ID, version=2)
+            except IntegrityError:
+                cls.objects.using(using).filter(pk=cls.STAMP_ID).update(version=F('version') + 1)
@@ -0,0 +1,107 @@
+from collections import defaultdict
+
+
+def _group(items, key, size):
+    """
+    Sort `items` by `key(item)` (an index below `size`, or -1 for none) and return the sorted items with the
+    `[start, end)` range of every key in them.
+    """
+    items = sorted((item for item in items if key(item) >= 0), key=key)
+    starts = [0] * (size + 1)
+    for item in items:
+        starts[key(item) + 1] += 1
+    for i in range(size):
+        starts[i + 1] += starts[i]
+    return items, starts
+
+
+class AssessmentTaxonomy(object):
+    """
+    Compact view of the assessment taxonomy of a database, part of its reference data snapshot.
+
+    Sub categories and assessments are referred to by their position:
+    - `subcategory_parent[i]` is the position of the parent sub category of the i-th sub category, or -1.
+    - the children of the i-th sub category are `subcategory_children[subcategory_child_starts[i]:...[i + 1]]`.
+    - its assessments are the positions `assessment_starts[i]` to `assessment_starts[i + 1]` of `assessments`,
+      sorted by name like `Assessment.Meta.ordering`.
+
+    A set of assessments is an int bitset whose bit i is the i-th assessment: the visibility of the public,
+    public everywhere, private, organisation's own and team's private assessments is precomputed as such masks.
+    """
+
+    def __init__(self, reference_data, organisation_assessments, team_assessments):
+        """ `organisation_assessments` and `team_assessments` are `(owner id, assessment id)` pairs """
+        self.top_categories = list(reference_data.top_categories.values())
+        self.sub_categories = list(reference_data.sub_categories.values())
+        self.subcategory_index = {sub_category.pk: i for i, sub_category in enumerate(self.sub_categories)}
+        self.subcategory_parent = [self.subcategory_index.get(sub_category.parent_sub_category_id, -1)
+                                   for sub_category in self.sub_categories]
+
+        # Sub categories right below a top category
+        top_category_index = {top_category.pk: i for i, top_category in enumerate(self.top_categories)}
+        self.top_category_children, self.top_category_child_starts = _group(
+            range(len(self.sub_categories)),
+            lambda i: top_category_index.get(self.sub_categories[i].parent_top_category_id, -1),
+            len(self.top_categories))
+        self.top_category_index = top_category_index
+
+        self.subcategory_children, self.subcategory_child_starts = _group(
+            range(len(self.sub_categories)), lambda i: self.subcategory_parent[i], len(self.sub_categories))
+
+        self.assessments, self.assessment_starts = _group(
+            sorted(reference_data.assessments.values(), key=lambda assessment: (assessment.name, assessment.pk)),
+            lambda assessment: self.subcategory_index.get(assessment.parent_sub_category_id, -1),
+            len(self.sub_categories))
+        self.assessment_index = {assessment.pk: i for i, assessment in enumerate(self.assessments)}
+
+        self.public_mask = self._get_mask(a.pk for a in self.assessments if not a.is_private)
+        self.private_mask = self._get_mask(a.pk for a in self.assessments if a.is_private)
+        self.public_everywhere_mask = self._get_mask(a.pk for a in self.assessments if a.is_public_everywhere)
+        self.organisation_masks = self._get_masks(organisation_assessments)
+        self.team_masks = self._get_masks(team_assessments)
+
+    def _get_mask(self, assessment_ids):
+        mask = 0
+        for assessment_id in assessment_ids:
+            position = self.assessment_index.get(assessment_id)
+            if position is not None:
+                mask |= 1 << position
+        return mask
+
+    def _get_masks(self, pairs):
+        assessment_ids = defaultdict(list)
+        for owner_id, assessment_id in pairs:
+            assessment_ids[owner_id].append(assessment_id)
+        return {owner_id: self._get_mask(ids) for owner_id, ids in assessment_ids.items()}
+
+    def get_visible_mask(self, organisation_ids=(), team_ids=(), own_assessments_only=False):
+        """
+        Assessments visible to a member of the organisations and teams: the public everywhere ones, the public ones
+        (unless an organisation restricts its members to its own assessments), the private ones of the teams
+        and the ones owned by the organisations.
+        """
+        mask = self.public_everywhere_mask
+        if not own_assessments_only:
+            mask |= self.public_mask
+        team_mask = 0
+        for team_id in team_ids:
+            team_mask |= self.team_masks.get(team_id, 0)
+        mask |= team_mask & self.private_mask
+        for organisation_id in organisation_ids:
+            mask |= self.organisation_masks.get(organisation_id, 0)
+        return mask
+
+    def get_top_category_children(self, top_category_id):
+        i = self.top_category_index.get(top_category_id)
+        if i is None:
+            return []
+        return self.top_category_children[self.top_category_child_starts[i]:self.top_category_child_starts[i + 1]]
+
+    def get_subcategory_children(self, i):
+        return self.subcategory_children[self.subcategory_child_starts[i]:self.subcategory_child_starts[i + 1]]
+
+    def get_assessment_positions(self, i):
+        return range(self.assessment_starts[i], self.assessment_starts[i + 1])
+
+    def has_assessments(self, i):
+        return self.assessment_starts[i] < self.assessment_starts[i + 1]
@@ -0,0 +1,109 @@
+from contextvars import ContextVar
+
+from django.conf import settings as django_settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+
+from multidb_account.auth_cache import is_shared_cache
+from multidb_account.shard_health import ShardUnavailableError, call_shard, is_shard_available
+
+REPLICA_STICKY_KEY = 'replica_sticky:{}:{}'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Whether the reads of the current request may be served by the read replicas
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def get_replica(database):
+    """ Read replica alias of a database (`settings.SHARD_REPLICAS`), or None """
+    replica = getattr(django_settings, 'SHARD_REPLICAS', {}).get(database)
+    if replica and is_shard_available(replica):
+        return replica
+    return None
+
+
+def get_primary(database):
+    """ Database a replica alias replicates, or the alias itself """
+    for primary, replica in getattr(django_settings, 'SHARD_REPLICAS', {}).items():
+        if replica == database:
+            return primary
+    return database
+
+
+def replica_reads_enabled():
+    return _replica_reads.get()
+
+
+def get_read_database(database):
+    """ Database to send the current request's raw SQL reads of `database` to """
+    if replica_reads_enabled():
+        return get_replica(database) or database
+    return database
+
+
+def _get_cache():
+    """
+    Cache of the sticky markers, or None. A write must be seen by the next read of the user on any worker, so it must
+    be shared by the workers (e.g. redis), unless explicitly allowed with `SHARD_REPLICA_CACHE_LOCAL_ONLY`.
+    """
+    alias = getattr(django_settings, 'SHARD_REPLICA_CACHE', None)
+    if not alias:
+        return None
+    if not is_shared_cache(alias) and not getattr(django_settings, 'SHARD_REPLICA_CACHE_LOCAL_ONLY', False):
+        return None
+    return caches[alias]
+
+
+def is_replica_sticky(database, user_id):
+    """ Whether the user wrote to the database recently enough for the replica to be lagging behind """
+    cache = _get_cache()
+    return cache is None or bool(cache.get(REPLICA_STICKY_KEY.format(database, user_id)))
+
+
+def set_replica_sticky(database, user_id):
+    cache = _get_cache()
+    if cache is not None:
+        timeout = getattr(django_settings, 'SHARD_REPLICA_STICKY_SECONDS', 10)
+        cache.set(REPLICA_STICKY_KEY.format(database, user_id), True, timeout)
+
+
+def route_request_reads(method, user):
+    """
+    Let the reads of a safe request go to the replica of the user's database, unless the user made an unsafe
+    request recently: read-your-writes for `settings.SHARD_REPLICA_STICKY_SECONDS`. Without a shared cache to
+    track the writes (see `_get_cache()`), every read stays on the primary.
+    Returns a token for `ContextVar.reset()`.
+    """
+    database = user._state.db
+    if not getattr(django_settings, 'SHARD_REPLICAS', {}).get(database):
+        return _replica_reads.set(False)
+
+    if method not in SAFE_METHODS:
+        set_replica_sticky(database, user.pk)
+        return _replica_reads.set(False)
+
+    return _replica_reads.set(not is_replica_sticky(database, user.pk))
+
+
+def _query_replica_lag(replica):
+    with connections[replica].cursor() as cursor:
+        cursor.execute('SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())')
+        lag = cursor.fetchone()[0]
+    return float(lag) if lag is not None else 0.0
+
+
+def get_replica_lag(replica):
+    """ Seconds the replica is behind its primary (postgres), None if unknown """
+    try:
+        # Through the replica's circuit breaker: reads fall back to the primary while it's open
+        return call_shard(replica, _query_replica_lag)
+    except (ShardUnavailableError, DatabaseError):
+        return None
+
+
+def get_replicas_lag():
+    return {
+        replica: get_replica_lag(replica)
+        for replica in getattr(django_settings, 'SHARD_REPLICAS', {}).values()
+    }
@@ -0,0 +1,51 @@
+from multidb_account.directory.models import UserDirectoryEntry, get_user_directory_db
+from multidb_account.replicas import get_primary, get_replica, replica_reads_enabled
+from multidb_account.shards import get_current_shard
+
+# Apps whose models live in every localized database
+SHARDED_APP_LABELS = ('multidb_account', 'payment_gateway', 'sport_engine')
+
+
+class ShardRouter(object):
+    """
+    Route the models of the sharded apps to the current shard (see `multidb_account.shards`).
+
+    - An instance keeps using the database it was loaded from / saved to.
+    - An explicit `.using()` / `save(using=...)` still wins over the router.
+    - Without a current shard (anonymous requests, scripts) Django falls back to the `default` database.
+    - Reads of safe requests go to the shard's read replica, if any (see `multidb_account.replicas`).
+      Writes, and reads made for writing (`select_for_update()`, `get_or_create()`...), always go to the primary.
+    """
+
+    def _db_for_model(self, model, **hints):
+        if model._meta.app_label not in SHARDED_APP_LABELS:
+            return None
+        if model is UserDirectoryEntry:
+            return get_user_directory_db()
+
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+
+        return get_current_shard()
+
+    def db_for_read(self, model, **hints):
+        db = self._db_for_model(model, **hints)
+        if db and replica_reads_enabled() and model is not UserDirectoryEntry:
+            return get_replica(db) or db
+        return db
+
+    def db_for_write(self, model, **hints):
+        db = self._db_for_model(model, **hints)
+        # Instances read from a replica are saved to its primary
+        return get_primary(db) if db else db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Rows of different localized databases can't reference each other
+        if obj1._state.db and obj2._state.db:
+            return get_primary(obj1._state.db) == get_primary(obj2._state.db)
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every database holds the whole schema, migrations are applied with `migrate --database=<alias>`
+        return None
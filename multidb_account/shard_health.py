@@ -0,0 +1,159 @@
+import threading
+import time
+
+from django.conf import settings as django_settings
+from django.db import InterfaceError, OperationalError
+
+# Errors telling that a database is down or too slow (statement timeouts are raised as OperationalError)
+SHARD_FAILURE_ERRORS = (OperationalError, InterfaceError)
+
+
+class ShardUnavailableError(Exception):
+    """ The database's circuit breaker is open, or too many calls to it are already in flight """
+
+    def __init__(self, database):
+        super().__init__('Database "{}" is unavailable'.format(database))
+        self.database = database
+
+
+class CircuitBreaker(object):
+    """
+    Per-database circuit breaker.
+
+    - closed: calls go through, `failure_threshold` consecutive failures open the breaker.
+    - open: calls are rejected until `reset_timeout` seconds have passed.
+    - half-open: a single probe call goes through, its success closes the breaker, its failure reopens it.
+
+    Calls beyond `max_in_flight` concurrent ones are rejected too, so that a slow database can't hold
+    every worker thread.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, database, failure_threshold=5, reset_timeout=30, max_in_flight=16):
+        self.database = database
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_in_flight = max_in_flight
+        self.failures = 0
+        self.in_flight = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def _get_state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._get_state()
+
+    def acquire(self):
+        """
+        Return the state the call was let through in, or None if it's rejected.
+        An accepted call must be followed by `release()`.
+        """
+        with self._lock:
+            state = self._get_state()
+            if state == self.OPEN or self.in_flight >= self.max_in_flight:
+                return None
+            if state == self.HALF_OPEN:
+                if self.probing:
+                    return None
+                self.probing = True
+            self.in_flight += 1
+            return state
+
+    def _fail(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release(self, state, success):
+        """ `success` is None if the outcome of the call was already counted (see `record_failure()`) """
+        with self._lock:
+            self.in_flight -= 1
+            if state == self.HALF_OPEN:
+                self.probing = False
+            if success is None:
+                return
+            if success:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self._fail()
+
+    def record_failure(self):
+        """ Count the failure of a call still in flight, e.g. one its caller stopped waiting for """
+        with self._lock:
+            self._fail()
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'state': self._get_state(),
+                'failures': self.failures,
+                'in_flight': self.in_flight,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(database):
+    breaker = _breakers.get(database)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(database)
+            if breaker is None:
+                config = getattr(django_settings, 'SHARD_HEALTH', {})
+                breaker = CircuitBreaker(database,
+                                         failure_threshold=config.get('FAILURE_THRESHOLD', 5),
+                                         reset_timeout=config.get('RESET_TIMEOUT', 30),
+                                         max_in_flight=config.get('MAX_IN_FLIGHT', 16))
+                _breakers[database] = breaker
+    return breaker
+
+
+def is_shard_available(database):
+    return get_circuit_breaker(database).state != CircuitBreaker.OPEN
+
+
+def call_shard(database, func, timeout=None, abandoned=None):
+    """
+    Call `func(database)` through the database's circuit breaker.
+    Database errors, and calls slower than `timeout` seconds, count as failures. `abandoned` is an optional
+    `threading.Event` set by a caller which stopped waiting for the call and counted its failure already.
+    Raises `ShardUnavailableError` without calling `func` if the breaker rejects the call.
+    """
+    breaker = get_circuit_breaker(database)
+    state = breaker.acquire()
+    if state is None:
+        raise ShardUnavailableError(database)
+
+    start = time.monotonic()
+    success = False
+    try:
+        result = func(database)
+        success = not timeout or time.monotonic() - start <= timeout
+        return result
+    except SHARD_FAILURE_ERRORS:
+        raise
+    except Exception:
+        # Not the database's fault (e.g. DoesNotExist)
+        success = True
+        raise
+    finally:
+        breaker.release(state, None if abandoned is not None and abandoned.is_set() else success)
+
+
+def get_shards_health():
+    """ State of the circuit breaker of every database """
+    return {database: get_circuit_breaker(database).as_dict() for database in django_settings.DATABASES}
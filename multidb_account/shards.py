@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings as django_settings
+
+# Localized database the current request (or task) works on. Set once per request by `MultiDbMiddleware`
+# (session/admin URL) and by the JWT authentication, then used by `multidb_account.routers.ShardRouter`.
+# Unlike `threading.local()` a context variable doesn't leak between requests served by the same thread,
+# and is isolated between coroutines of async workers.
+_current_shard = ContextVar('current_shard', default=None)
+
+# Localized database selected in the admin URL (e.g. /admin/ca/...), '' outside of it
+_admin_shard = ContextVar('admin_shard', default='')
+
+
+def get_current_shard():
+    return _current_shard.get()
+
+
+def set_current_shard(shard):
+    """ Return a token to give to `reset_current_shard()` """
+    return _current_shard.set(shard)
+
+
+def reset_current_shard(token):
+    _current_shard.reset(token)
+
+
+@contextmanager
+def use_shard(shard):
+    """ Route the ORM queries of the block to `shard`, e.g. in management commands and background tasks """
+    token = _current_shard.set(shard)
+    try:
+        yield shard
+    finally:
+        _current_shard.reset(token)
+
+
+def get_admin_shard():
+    return _admin_shard.get()
+
+
+def set_admin_shard(shard):
+    return _admin_shard.set(shard)
+
+
+def get_shard_databases():
+    """ Aliases of `settings.DATABASES` holding the data, i.e. without the read replicas """
+    replicas = set(getattr(django_settings, 'SHARD_REPLICAS', {}).values())
+    return [database for database in django_settings.DATABASES if database not in replicas]
@@ -0,0 +1,285 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from multidb_account.achievements.models import Badge
+from multidb_account.assessment.models import AssessmentTopCategory, AssessmentSubCategory, AssessmentFormat, \
+    AssessmentRelationshipType, Assessment, ChosenAssessment, Assessed, Assessor, AssessmentAccess
+from multidb_account.assessment_rollup import add_team_assessment_value, is_rollup_enabled, \
+    refresh_team_assessment_rollup
+from multidb_account.assessment_tree import get_subcategory_top_subcategory_id, get_top_subcategory_id, \
+    get_top_subcategory_ids, rebuild_assessment_subtrees
+from multidb_account.auth_cache import invalidate_user_auth_state_on_commit
+from multidb_account.directory.models import UserDirectoryEntry
+from multidb_account.identity_map import forget
+from multidb_account.note.models import ReturnToPlayType
+from multidb_account.reference_data.cache import invalidate_reference_data
+from multidb_account.sport.models import Sport
+from multidb_account.team.models import Team
+from multidb_account.user.models import BaseCustomUser, AthleteUser, CoachUser, Coaching, Organisation, \
+    is_connection_graph_enabled
+from multidb_account.user_access import get_user_access_cache, invalidate_user_access
+from multidb_account.user_connections import get_organisation_user_ids, get_team_user_ids, refresh_user_connections
+from multidb_account.utils import clear_user_directory_miss
+
+
+@receiver(post_save, sender=BaseCustomUser)
+def register_user_in_directory(sender, instance, using, created=False, update_fields=None, raw=False, **kwargs):
+    """ Keep the global user directory in sync on user creation and email change """
+    if raw or (not created and update_fields is not None and 'email' not in update_fields):
+        return
+    UserDirectoryEntry.register(instance, localized_db=using)
+    clear_user_directory_miss(instance.email)
+
+
+@receiver(post_delete, sender=BaseCustomUser)
+def unregister_user_from_directory(sender, instance, using, **kwargs):
+    UserDirectoryEntry.unregister(instance, localized_db=using)
+
+
+@receiver(post_save, sender=BaseCustomUser)
+@receiver(post_delete, sender=BaseCustomUser)
+def invalidate_user_auth_cache(sender, instance, using, **kwargs):
+    """ Logout, deactivation, password or profile change: drop the cached auth state on every worker """
+    invalidate_user_auth_state_on_commit(using, instance.pk)
+
+
+IDENTITY_MAP_MODELS = (BaseCustomUser, AthleteUser, CoachUser, Organisation, Assessed, Assessor, Team)
+
+
+def forget_mapped_object(sender, instance, **kwargs):
+    """ Saved or deleted during the request: the next lookup reloads it """
+    forget(instance)
+
+
+for model in IDENTITY_MAP_MODELS:
+    post_save.connect(forget_mapped_object, sender=model,
+                      dispatch_uid='forget_mapped_object_save_{}'.format(model.__name__))
+    post_delete.connect(forget_mapped_object, sender=model,
+                        dispatch_uid='forget_mapped_object_delete_{}'.format(model.__name__))
+
+
+REFERENCE_DATA_MODELS = (Sport, AssessmentTopCategory, AssessmentSubCategory, AssessmentFormat,
+                         AssessmentRelationshipType, Assessment, Badge, ReturnToPlayType)
+
+
+def invalidate_reference_data_cache(sender, using, **kwargs):
+    """ Reference data saved or deleted (e.g. synced to every database by the admin): bump the database version """
+    invalidate_reference_data(using)
+
+
+for model in REFERENCE_DATA_MODELS:
+    post_save.connect(invalidate_reference_data_cache, sender=model,
+                      dispatch_uid='invalidate_reference_data_cache_save_{}'.format(model.__name__))
+    post_delete.connect(invalidate_reference_data_cache, sender=model,
+                        dispatch_uid='invalidate_reference_data_cache_delete_{}'.format(model.__name__))
+
+
+@receiver(m2m_changed, sender=Assessment.relationship_types.through)
+@receiver(m2m_changed, sender=Organisation.own_assessments.through)
+@receiver(m2m_changed, sender=Team.assessments.through)
+def invalidate_assessment_visibility_cache(sender, using, action, **kwargs):
+    """ The relationship types and the visibility of the assessments are part of the reference data """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_reference_data(using)
+
+
+@receiver(pre_save, sender=AssessmentSubCategory)
+@receiver(pre_delete, sender=AssessmentSubCategory)
+def remember_subcategory_tree(sender, instance, using, **kwargs):
+    instance._tree_top_subcategory_id = get_top_subcategory_id(using, instance.pk)
+
+
+@receiver(post_save, sender=AssessmentSubCategory)
+@receiver(post_delete, sender=AssessmentSubCategory)
+def update_subcategory_tree(sender, instance, using, **kwargs):
+    """ Rebuild the materialized subtrees the sub category left and joined """
+    rebuild_assessment_subtrees(using, [getattr(instance, '_tree_top_subcategory_id', None),
+                                        get_subcategory_top_subcategory_id(using, instance)])
+
+
+@receiver(pre_save, sender=Assessment)
+def remember_assessment_tree(sender, instance, using, **kwargs):
+    instance._tree_top_subcategory_ids = get_top_subcategory_ids(using, assessment_ids=[instance.pk]) \
+        if instance.pk else set()
+
+
+@receiver(post_save, sender=Assessment)
+@receiver(post_delete, sender=Assessment)
+def update_assessment_tree(sender, instance, using, **kwargs):
+    """ Rebuild the materialized subtrees the assessment left and joined """
+    top_subcategory_ids = set(getattr(instance, '_tree_top_subcategory_ids', ()))
+    top_subcategory_ids.add(get_top_subcategory_id(using, instance.parent_sub_category_id))
+    rebuild_assessment_subtrees(using, top_subcategory_ids)
+
+
+@receiver(m2m_changed, sender=Organisation.own_assessments.through)
+def update_organisation_assessments_tree(sender, instance, using, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # `instance` is an assessment
+        top_subcategory_ids = get_top_subcategory_ids(using, assessment_ids=[instance.pk])
+    else:
+        top_subcategory_ids = get_top_subcategory_ids(using, organisation_ids=[instance.pk], assessment_ids=pk_set)
+    rebuild_assessment_subtrees(using, top_subcategory_ids)
+
+
+@receiver(pre_save, sender=ChosenAssessment)
+def remember_team_assessment_rollup(sender, instance, using, **kwargs):
+    """ The team and assessment can be changed (e.g. in the admin): the rollup the value leaves must be refreshed """
+    instance._rollup_key = ChosenAssessment.objects.using(using).filter(pk=instance.pk) \
+        .values_list('team_id', 'assessment_id').first() if instance.pk and is_rollup_enabled() else None
+
+
+@receiver(post_save, sender=ChosenAssessment)
+def update_team_assessment_rollup(sender, instance, using, created=False, **kwargs):
+    if not is_rollup_enabled():
+        return
+    previous_key = getattr(instance, '_rollup_key', None)
+    key = (instance.team_id, instance.assessment_id)
+    if previous_key is not None and previous_key != key and previous_key[0] is not None:
+        refresh_team_assessment_rollup(using, *previous_key)
+    if instance.team_id is None:
+        return
+    if created:
+        add_team_assessment_value(using, instance)
+    else:
+        refresh_team_assessment_rollup(using, instance.team_id, instance.assessment_id)
+
+
+@receiver(post_delete, sender=ChosenAssessment)
+def remove_from_team_assessment_rollup(sender, instance, using, **kwargs):
+    if instance.team_id is not None and is_rollup_enabled():
+        refresh_team_assessment_rollup(using, instance.team_id, instance.assessment_id)
+
+
+# Membership table: (column of the instance the relation is defined on, column of the related objects)
+CONNECTION_MEMBERSHIPS = {
+    Team.athletes.through: ('team_id', 'athleteuser_id'),
+    Team.coaches.through: ('team_id', 'coachuser_id'),
+    Organisation.login_users.through: ('organisation_id', 'basecustomuser_id'),
+}
+
+
+@receiver(post_save, sender=Coaching)
+@receiver(post_delete, sender=Coaching)
+def update_coaching_user_connections(sender, instance, using, **kwargs):
+    refresh_user_connections(using, [instance.athlete_id, instance.coach_id])
+
+
+@receiver(m2m_changed, sender=Team.athletes.through)
+@receiver(m2m_changed, sender=Team.coaches.through)
+@receiver(m2m_changed, sender=Organisation.login_users.through)
+def update_membership_user_connections(sender, instance, using, action, reverse, pk_set, **kwargs):
+    """ Team members or organisation login users added or removed: refresh the edges of the users concerned """
+    if not is_connection_graph_enabled():
+        return
+    if reverse:
+        # `instance` is a user
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            refresh_user_connections(using, [instance.pk])
+    elif action == 'pre_clear':
+        column, related_column = CONNECTION_MEMBERSHIPS[sender]
+        instance._cleared_user_ids = set(sender.objects.using(using)
+                                         .filter(**{column: instance.pk})
+                                         .values_list(related_column, flat=True))
+    elif action in ('post_add', 'post_remove'):
+        refresh_user_connections(using, pk_set)
+    elif action == 'post_clear':
+        refresh_user_connections(using, getattr(instance, '_cleared_user_ids', ()))
+
+
+@receiver(pre_save, sender=Team)
+def remember_team_connections(sender, instance, using, **kwargs):
+    instance._connection_owners = Team.objects.using(using) \
+        .filter(pk=instance.pk) \
+        .values_list('owner_id', 'organisation_id') \
+        .first() if instance.pk and is_connection_graph_enabled() else None
+
+
+@receiver(post_save, sender=Team)
+def update_team_user_connections(sender, instance, using, created=False, **kwargs):
+    """ Owner or organisation of a team changed: refresh the edges of the previous and new ones """
+    previous = getattr(instance, '_connection_owners', None)
+    if created or previous is None or previous == (instance.owner_id, instance.organisation_id):
+        return
+    refresh_user_connections(using, {previous[0], instance.owner_id} |
+                             get_organisation_user_ids(using, [previous[1], instance.organisation_id]))
+
+
+@receiver(pre_delete, sender=Team)
+def remember_team_user_ids(sender, instance, using, **kwargs):
+    instance._connection_user_ids = get_team_user_ids(using, [instance.pk]) if is_connection_graph_enabled() else ()
+
+
+@receiver(post_delete, sender=Team)
+def remove_team_user_connections(sender, instance, using, **kwargs):
+    refresh_user_connections(using, getattr(instance, '_connection_user_ids', ()))
+
+
+def invalidate_user_access_on_commit(using, user_ids):
+    """
+    Invalidate the access of the users now, for the rest of the transaction, and again once it's committed: another
+    worker could cache their previous access until then.
+    """
+    user_ids = set(user_ids)
+    invalidate_user_access(using, user_ids)
+    transaction.on_commit(lambda: invalidate_user_access(using, user_ids), using=using)
+
+
+@receiver(post_save, sender=Coaching)
+@receiver(post_delete, sender=Coaching)
+def invalidate_coaching_user_access(sender, instance, using, **kwargs):
+    invalidate_user_access_on_commit(using, [instance.athlete_id, instance.coach_id])
+
+
+def get_membership_user_ids(sender, instance, using, reverse, pk_set):
+    """ Users whose access changes with a team membership or an organisation login user, before the change """
+    if sender is Organisation.login_users.through:
+        if reverse:
+            return {instance.pk}
+        return set(pk_set) if pk_set is not None else get_organisation_user_ids(using, [instance.pk])
+    if reverse:
+        # `instance` is an athlete or a coach, connected to the other users of their teams
+        team_ids = pk_set if pk_set is not None else instance.team_membership.using(using).values_list('id', flat=True)
+        return get_team_user_ids(using, team_ids) | {instance.pk}
+    return get_team_user_ids(using, [instance.pk]) | set(pk_set or ())
+
+
+@receiver(m2m_changed, sender=Team.athletes.through)
+@receiver(m2m_changed, sender=Team.coaches.through)
+@receiver(m2m_changed, sender=Organisation.login_users.through)
+def invalidate_membership_user_access(sender, instance, using, action, reverse, pk_set, **kwargs):
+    if get_user_access_cache() is None:
+        return
+    if action in ('pre_add', 'pre_remove', 'pre_clear'):
+        instance._access_user_ids = get_membership_user_ids(sender, instance, using, reverse, pk_set)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_user_access_on_commit(using, getattr(instance, '_access_user_ids', ()))
+
+
+@receiver(pre_save, sender=Team)
+@receiver(pre_delete, sender=Team)
+def remember_team_user_access(sender, instance, using, **kwargs):
+    instance._access_user_ids = get_team_user_ids(using, [instance.pk]) \
+        if instance.pk and get_user_access_cache() is not None else set()
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+def invalidate_team_user_access(sender, instance, using, **kwargs):
+    """ Team saved (e.g. new owner or organisation) or deleted: its previous and current users """
+    if get_user_access_cache() is None:
+        return
+    user_ids = set(getattr(instance, '_access_user_ids', ())) | {instance.owner_id}
+    invalidate_user_access_on_commit(using, user_ids | get_organisation_user_ids(using, [instance.organisation_id]))
+
+
+@receiver(post_save, sender=AssessmentAccess)
+@receiver(post_delete, sender=AssessmentAccess)
+def invalidate_assessor_user_access(sender, instance, using, **kwargs):
+    if get_user_access_cache() is None:
+        return
+    user_ids = Assessor.objects.using(using).filter(pk=instance.assessor_id).values_list('athlete_id', 'coach_id')
+    invalidate_user_access_on_commit(using, [user_id for user_id_pair in user_ids for user_id in user_id_pair])
@@ -62,4 +62,5 @@ class Team(models.Model):
         return self.get_all_athletes() + self.get_all_coaches()
 
     def has_team_member(self, user: CoachUser or AthleteUser):
-        return user in self.get_all_members()
+        members = self.athletes if isinstance(user, AthleteUser) else self.coaches
+        return members.filter(pk=user.pk).exists()
@@ -1,3 +1,253 @@
-from django.test import TestCase
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from multidb_account.assessment.models import get_relationship_type
+from multidb_account.assessment_history import largest_triangle_three_buckets
+from multidb_account.assessment_norms import get_percentile, reduce_values
+from multidb_account.constants import USER_TYPE_ATHLETE, USER_TYPE_COACH
+from multidb_account.db.pool import ConnectionPool, PoolTimeoutError
+from multidb_account.fanout import ShardTimeoutError, fan_out, fan_out_first
+from multidb_account.reference_data.taxonomy import AssessmentTaxonomy
+from multidb_account.shard_health import ShardUnavailableError, get_circuit_breaker
+from multidb_account.shards import get_current_shard, use_shard
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.closed = 0
+
+    def get_transaction_status(self):
+        return TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def test_connections_are_reused(self):
+        pool = ConnectionPool('ca', max_size=2)
+        connection = pool.checkout(FakeConnection)
+        pool.checkin(connection)
+
+        self.assertIs(pool.checkout(FakeConnection), connection)
+        stats = pool.get_stats()
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['creations'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    def test_checkout_waits_for_a_connection(self):
+        pool = ConnectionPool('ca', max_size=1, timeout=0.01)
+        pool.checkout(FakeConnection)
+
+        with self.assertRaises(PoolTimeoutError):
+            pool.checkout(FakeConnection)
+        stats = pool.get_stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['errors'], 1)
+
+    def test_closed_and_idle_connections_are_dropped(self):
+        pool = ConnectionPool('ca', max_size=2, max_idle=-1)
+        connection = pool.checkout(FakeConnection)
+        pool.checkin(connection)
+
+        # Idle for longer than max_idle
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.get_stats()['reaped'], 1)
+
+        connection = pool.checkout(FakeConnection)
+        connection.close()
+        pool.checkin(connection)
+        self.assertEqual(pool.get_stats()['size'], 0)
+
+
+class FanOutTests(SimpleTestCase):
+    """ The thread pool path, which `fan_out()` only takes outside of a transaction """
+    shard_databases = ['ca', 'us', 'default']
+
+    def setUp(self):
+        patches = [mock.patch('multidb_account.fanout._run_serially', return_value=False),
+                   mock.patch.dict('multidb_account.shard_health._breakers', clear=True)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    @staticmethod
+    def delayed(results, delays):
+        def func(database):
+            time.sleep(delays.get(database, 0))
+            return results[database]
+        return func
+
+    def wait_for_calls(self, database):
+        breaker = get_circuit_breaker(database)
+        deadline = time.monotonic() + 1
+        while breaker.as_dict()['in_flight'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_results_are_in_database_order(self):
+        func = self.delayed({'ca': 1, 'us': 2, 'default': 3}, {'ca': 0.1, 'us': 0.05})
+        results = fan_out(func, databases=self.shard_databases)
+        self.assertEqual(list(results.items()), [('ca', 1), ('us', 2), ('default', 3)])
+
+    def test_first_result_in_database_order(self):
+        # 'default' answers first, but a sequential lookup would have found 'us'
+        func = self.delayed({'ca': None, 'us': 'us', 'default': 'default'}, {'ca': 0.05, 'us': 0.1})
+        self.assertEqual(fan_out_first(func, databases=self.shard_databases), 'us')
+
+        func = self.delayed({'ca': None, 'us': None, 'default': None}, {})
+        self.assertIsNone(fan_out_first(func, databases=self.shard_databases))
+
+    def test_timed_out_databases_are_skipped(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def func(database):
+            if database == 'us':
+                release.wait(1)
+            return database
+
+        self.assertEqual(list(fan_out(func, databases=self.shard_databases, timeout=0.05)), ['ca', 'default'])
+        # Counted as a failure right away, and only once when the call eventually ends
+        self.assertEqual(get_circuit_breaker('us').failures, 1)
+        release.set()
+        self.wait_for_calls('us')
+        self.assertEqual(get_circuit_breaker('us').as_dict(), {'state': 'closed', 'failures': 1, 'in_flight': 0})
+        self.assertEqual(get_circuit_breaker('ca').failures, 0)
+
+        release.clear()
+        with self.assertRaises(ShardTimeoutError) as context:
+            fan_out(func, databases=self.shard_databases, timeout=0.05, skip_unavailable=False)
+        self.assertEqual(context.exception.database, 'us')
+        release.set()
+        self.wait_for_calls('us')
+
+        # The first result after the ones which timed out
+        release.clear()
+        self.assertEqual(fan_out_first(func, databases=['us', 'default'], timeout=0.05), 'default')
+        self.assertEqual(get_circuit_breaker('us').failures, 3)
+
+        # Nothing found elsewhere: 'us' may have had it
+        release.clear()
+        with self.assertRaises(ShardTimeoutError):
+            fan_out_first(lambda database: func(database) if database == 'us' else None,
+                          databases=self.shard_databases, timeout=0.05)
+
+    def test_first_result_of_unavailable_databases_is_unknown(self):
+        get_circuit_breaker('us').opened_at = time.monotonic()
+        func = self.delayed({'ca': None, 'us': 'us', 'default': 'default'}, {})
+        self.assertEqual(fan_out_first(func, databases=self.shard_databases), 'default')
+        with self.assertRaises(ShardUnavailableError):
+            fan_out_first(func, databases=['ca', 'us'])
+
+    def test_workers_run_in_the_callers_context(self):
+        with use_shard('us'):
+            results = fan_out(lambda database: get_current_shard(), databases=self.shard_databases)
+        self.assertEqual(list(results.values()), ['us', 'us', 'us'])
+        self.assertIsNone(get_current_shard())
+
+
+def by_pk(*objects):
+    return OrderedDict((obj.pk, obj) for obj in objects)
+
+
+def partial_namespace(**defaults):
+    return lambda **kwargs: SimpleNamespace(**dict(defaults, **kwargs))
+
+
+class AssessmentTaxonomyTests(SimpleTestCase):
+
+    def setUp(self):
+        sub_category = partial_namespace(parent_top_category_id=None, parent_sub_category_id=None)
+        assessment = partial_namespace(is_private=False, is_public_everywhere=False)
+        self.reference_data = SimpleNamespace(
+            top_categories=by_pk(SimpleNamespace(pk=1)),
+            sub_categories=by_pk(sub_category(pk=10, parent_top_category_id=1),
+                                 sub_category(pk=11, parent_sub_category_id=10),
+                                 sub_category(pk=12, parent_sub_category_id=10)),
+            assessments=by_pk(assessment(pk=100, name='b', parent_sub_category_id=11),
+                              assessment(pk=101, name='a', parent_sub_category_id=11, is_private=True),
+                              assessment(pk=102, name='c', parent_sub_category_id=12, is_public_everywhere=True,
+                                         is_private=True)),
+        )
+        self.taxonomy = AssessmentTaxonomy(self.reference_data,
+                                           organisation_assessments=[(1000, 101)],
+                                           team_assessments=[(2000, 101), (2000, 100)])
+
+    def get_visible_ids(self, mask):
+        return {a.pk for i, a in enumerate(self.taxonomy.assessments) if mask >> i & 1}
+
+    def test_tree_structure(self):
+        taxonomy = self.taxonomy
+        self.assertEqual(taxonomy.get_top_category_children(1), [0])
+        self.assertEqual(taxonomy.get_subcategory_children(0), [1, 2])
+        self.assertFalse(taxonomy.has_assessments(0))
+        self.assertEqual([taxonomy.assessments[i].pk for i in taxonomy.get_assessment_positions(1)], [101, 100])
+
+    def test_visible_mask(self):
+        taxonomy = self.taxonomy
+        self.assertEqual(self.get_visible_ids(taxonomy.get_visible_mask()), {100, 102})
+        self.assertEqual(self.get_visible_ids(taxonomy.get_visible_mask(own_assessments_only=True)), {102})
+        self.assertEqual(self.get_visible_ids(taxonomy.get_visible_mask(team_ids=[2000])), {100, 101, 102})
+        self.assertEqual(self.get_visible_ids(taxonomy.get_visible_mask(organisation_ids=[1000],
+                                                                        own_assessments_only=True)), {101, 102})
+
+
+def assessor_or_assessed(pk, user_type):
+    return SimpleNamespace(id=pk, get_user_type=lambda: user_type)
+
+
+class RelationshipTypeTests(SimpleTestCase):
+
+    def test_relationship_type(self):
+        athlete = assessor_or_assessed(1, USER_TYPE_ATHLETE)
+        other_athlete = assessor_or_assessed(2, USER_TYPE_ATHLETE)
+        coach = assessor_or_assessed(3, USER_TYPE_COACH)
+
+        self.assertEqual(get_relationship_type(assessed=athlete, assessor=coach), 'coach_athlete')
+        self.assertEqual(get_relationship_type(assessed=coach, assessor=athlete), 'athlete_coach')
+        self.assertEqual(get_relationship_type(assessed=athlete, assessor=athlete), 'self')
+        self.assertIsNone(get_relationship_type(assessed=other_athlete, assessor=athlete))
+
+
+class LargestTriangleThreeBucketsTests(SimpleTestCase):
+
+    def test_downsampling_keeps_the_peaks(self):
+        points = [(0, 0), (1, 1), (2, 0), (3, 0), (4, 10), (5, 0), (6, 0), (7, 1)]
+
+        self.assertEqual(largest_triangle_three_buckets(points, 8, key=lambda point: point), points)
+        self.assertEqual(largest_triangle_three_buckets(points, 3, key=lambda point: point), [(0, 0), (4, 10), (7, 1)])
+        sampled = largest_triangle_three_buckets(points, 4, key=lambda point: point)
+        self.assertEqual(len(sampled), 4)
+        self.assertIn((4, 10), sampled)
+
+
+class AssessmentNormsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.columns = {
+            'id': np.array([1, 2, 3, 4, 5]),
+            'user_id': np.array([20, 10, 20, 10, 30]),
+            'value': np.array([5., 1., 3., 2., 4.]),
+            'date': np.array([10., 10., 20., 5., 0.]),
+        }
+
+    def test_reduce_values(self):
+        for reduction, expected_values in (('latest', [1, 3, 4]), ('max', [2, 5, 4]), ('min', [1, 3, 4])):
+            user_ids, values = reduce_values(self.columns, reduction)
+            self.assertEqual(user_ids.tolist(), [10, 20, 30])
+            self.assertEqual(values.tolist(), expected_values)
+
+    def test_percentile(self):
+        sorted_values = np.array([1., 2., 2., 3.])
+        self.assertEqual(get_percentile(sorted_values, 2.), 50)
+        self.assertEqual(get_percentile(sorted_values, 4.), 100)
+        self.assertEqual(get_percentile(sorted_values, 0.), 0)
+        self.assertIsNone(get_percentile(sorted_values[:0], 1.))
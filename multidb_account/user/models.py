@@ -14,14 +14,20 @@ from django.utils.translation import ugettext_lazy as _
 from imagekit.models import ProcessedImageField
 from pilkit.processors import SmartResize, Transpose
 
-from multidb_account.choices import MEASURING, USER_TYPES, ORG_SIZES
+from multidb_account.choices import MEASURING, USER_TYPES, ORG_SIZES, CONNECTION_LINKS
 from multidb_account.constants import PROFILE_PICTURE_WIDTH, PROFILE_PICTURE_HEIGHT, USER_CONFIRM_ACCOUNT_SALT, \
-    USER_TYPE_ORG
+    USER_TYPE_ORG, CONNECTION_COACHING, CONNECTION_TEAM, CONNECTION_OWNER
 from multidb_account.constants import USER_TYPE_ATHLETE, USER_TYPE_COACH
+from multidb_account.identity_map import get_object
 from multidb_account.managers import CustomUserManager
 from multidb_account.models import get_file_path
 
 
+def is_connection_graph_enabled():
+    """ Whether `UserConnection` is maintained, and used to check the connections between users """
+    return getattr(django_settings, 'USER_CONNECTION_GRAPH', False)
+
+
 class BaseCustomUser(AbstractBaseUser, PermissionsMixin):
     # Required fields
     email = models.EmailField(verbose_name=_('email address'), max_length=255, unique=True)
@@ -118,9 +124,9 @@ class BaseCustomUser(AbstractBaseUser, PermissionsMixin):
         """ Returns typed instance of the user """
 
         if self.user_type == USER_TYPE_ATHLETE:
-            return self.athleteuser
+            return get_object(AthleteUser, using=self._state.db, load=lambda: self.athleteuser, pk=self.pk)
         if self.user_type == USER_TYPE_COACH:
-            return self.coachuser
+            return get_object(CoachUser, using=self._state.db, load=lambda: self.coachuser, pk=self.pk)
         if self.user_type == USER_TYPE_ORG:
             return self.organisation
 
@@ -138,20 +144,24 @@ class BaseCustomUser(AbstractBaseUser, PermissionsMixin):
     def get_assessor(self):
         """ Get the user's assessor profile extension """
 
-        return self.typeduser.assessor
+        return self.typeduser.get_assessor()
 
     def get_assessed(self):
         """ Get the user's assessed profile extension """
 
-        return self.typeduser.assessed
+        return self.typeduser.get_assessed()
 
     def is_connected_to(self, other_user_id):
+        if is_connection_graph_enabled():
+            return UserConnection.objects.using(self._state.db) \
+                .filter(user_id=self.id, other_user_id=other_user_id) \
+                .exists()
 
         if self.user_type == USER_TYPE_ATHLETE:
             # Check if athlete is directly connected (Coaching) or connected through teams (Team)
             return self.athleteuser.coaching_set.filter(coach_id=other_user_id).exists() or \
                    self.athleteuser.team_membership.filter(coaches__user__id=other_user_id).exists() or \
-                   self.athleteuser.team_membership.filter(owner_id=other_user_id)
+                   self.athleteuser.team_membership.filter(owner_id=other_user_id).exists()
 
         if self.user_type == USER_TYPE_COACH:
             # Check if coach is directly connected (Coaching) or connected through teams (Team)
@@ -212,6 +222,16 @@ class BaseCustomUser(AbstractBaseUser, PermissionsMixin):
         send_mail(subject, msg_plain, django_settings.DEFAULT_FROM_EMAIL, [self.email], html_message=msg_html)
 
     def get_linked_users(self):
+        if is_connection_graph_enabled() and self.user_type in (USER_TYPE_ATHLETE, USER_TYPE_COACH):
+            # Coaches of an athlete, athletes of a coach, directly or through teams
+            links = (CONNECTION_COACHING, CONNECTION_TEAM) if self.user_type == USER_TYPE_ATHLETE else \
+                (CONNECTION_COACHING, CONNECTION_TEAM, CONNECTION_OWNER)
+            other_user_ids = UserConnection.objects.using(self._state.db) \
+                .filter(user_id=self.id, link__in=links) \
+                .values('other_user_id')
+            model = CoachUser if self.user_type == USER_TYPE_ATHLETE else AthleteUser
+            return set(model.objects.using(self._state.db).filter(user_id__in=other_user_ids))
+
         if self.user_type == USER_TYPE_ATHLETE:
             coaches = []
             # one to one connections
@@ -239,11 +259,21 @@ class AthleteCoachBase(models.Model):
     class Meta:
         abstract = True
 
+    def get_profile(self, name):
+        """ `assessor` or `assessed` profile extension, shared by the request """
+        related_field = self._meta.get_field(name).field
+        return get_object(related_field.model, using=self._state.db, load=lambda: getattr(self, name),
+                          **{related_field.name: self.pk})
+
     def get_assessor(self):
-        return self.assessor
+        return self.get_profile('assessor')
 
     def get_assessed(self):
-        return self.assessed
+        return self.get_profile('assessed')
+
+    def get_user(self):
+        """ User of the profile, shared by the request """
+        return get_object(BaseCustomUser, using=self._state.db, load=lambda: self.user, pk=self.user_id)
 
     def __str__(self):
         return str(self.id)
@@ -313,3 +343,18 @@ class Organisation(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class UserConnection(models.Model):
+    """
+    Edge of the connection graph (see multidb_account.user_connections): `user` is connected to `other_user`
+    through `link`. A pair has an edge by link, the graph is not symmetric: the login users of an organisation are
+    connected to the members of its teams, not the other way round.
+    """
+    class Meta:
+        db_table = 'multidb_account_user_connection'
+        index_together = (('user', 'other_user'),)
+
+    user = models.ForeignKey(BaseCustomUser, on_delete=models.CASCADE, related_name='connections')
+    other_user = models.ForeignKey(BaseCustomUser, on_delete=models.CASCADE, related_name='+')
+    link = models.CharField(verbose_name=_('link'), choices=CONNECTION_LINKS, max_length=30)
@@ -0,0 +1,199 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings as django_settings
+from django.core.cache import caches
+from django.db.models import Q
+
+from multidb_account.assessment.models import AssessmentAccess
+from multidb_account.team.models import Team
+from multidb_account.user.models import Organisation, UserConnection, is_connection_graph_enabled
+from multidb_account.user_connections import get_user_connections
+
+USER_ACCESS_VERSION_KEY = 'user_access:{}:{}:version'
+
+
+class UserAccess(object):
+    """
+    What a user can access, loaded at once: the teams they are an athlete, coach, owner or organisation login user
+    of, the users they are connected to (see `BaseCustomUser.is_connected_to`), and their assessment top category
+    permissions by assessed. Shared by the threads of a process: it must not be modified.
+    """
+
+    def __init__(self, database, user_id):
+        self.database = database
+        self.user_id = int(user_id)
+
+        self.athlete_team_ids = frozenset(Team.athletes.through.objects.using(database)
+                                          .filter(athleteuser_id=user_id)
+                                          .values_list('team_id', flat=True))
+        self.coach_team_ids = frozenset(Team.coaches.through.objects.using(database)
+                                        .filter(coachuser_id=user_id)
+                                        .values_list('team_id', flat=True))
+
+        organisation_ids = set(Organisation.login_users.through.objects.using(database)
+                               .filter(basecustomuser_id=user_id)
+                               .values_list('organisation_id', flat=True))
+        owned_team_ids = set()
+        organisation_team_ids = set()
+        for team_id, owner_id, organisation_id in Team.objects.using(database) \
+                .filter(Q(owner_id=user_id) | Q(organisation_id__in=organisation_ids)) \
+                .values_list('id', 'owner_id', 'organisation_id'):
+            if owner_id == self.user_id:
+                owned_team_ids.add(team_id)
+            if organisation_id in organisation_ids:
+                organisation_team_ids.add(team_id)
+        self.owned_team_ids = frozenset(owned_team_ids)
+        self.organisation_team_ids = frozenset(organisation_team_ids)
+
+        if is_connection_graph_enabled():
+            self.connected_user_ids = frozenset(UserConnection.objects.using(database)
+                                                .filter(user_id=user_id)
+                                                .values_list('other_user_id', flat=True))
+        else:
+            self.connected_user_ids = frozenset(other_user_id for from_user_id, other_user_id, _
+                                                in get_user_connections(database, [self.user_id])
+                                                if from_user_id == self.user_id)
+
+        accesses = AssessmentAccess.objects.using(database) \
+            .filter(Q(assessor__athlete=user_id) | Q(assessor__coach=user_id)) \
+            .values_list('assessed_id', 'top_category_ids')
+        self.top_category_ids = {assessed_id: frozenset(top_category_ids) for assessed_id, top_category_ids in accesses}
+
+    def is_team_member(self, team_id):
+        """ Athlete, coach, owner or organisation login user of the team """
+        team_id = int(team_id)
+        return team_id in self.athlete_team_ids or self.is_team_coach(team_id)
+
+    def is_team_coach(self, team_id):
+        """ Coach, owner or organisation login user of the team """
+        team_id = int(team_id)
+        return team_id in self.coach_team_ids or team_id in self.owned_team_ids or \
+            team_id in self.organisation_team_ids
+
+    def is_connected_to(self, user_id):
+        return int(user_id) in self.connected_user_ids
+
+    def has_top_category_access(self, assessed_id, top_category_id):
+        """ Whether the user, as an assessor, has access to a top category of an assessed """
+        return top_category_id in self.top_category_ids.get(assessed_id, ())
+
+
+class UserAccessCache(object):
+    """
+    Per-process LRU/TTL cache of `UserAccess`, invalidated like `multidb_account.auth_cache.AuthUserCache`:
+    every entry is stamped with the user's version read from a cache shared by all the workers (if any).
+    """
+
+    def __init__(self, max_entries=10000, timeout=300, shared_cache=None):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.shared_cache = caches[shared_cache] if shared_cache else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(shard, user_id):
+        return shard, int(user_id)
+
+    def get_version(self, shard, user_id):
+        if self.shared_cache is None:
+            return None
+        key = USER_ACCESS_VERSION_KEY.format(shard, user_id)
+        version = self.shared_cache.get(key)
+        if version is None:
+            self.shared_cache.add(key, uuid.uuid4().hex, None)
+            version = self.shared_cache.get(key)
+        return version
+
+    def get(self, shard, user_id):
+        key = self._key(shard, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires'] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+
+        if self.shared_cache is not None and entry['version'] != self.get_version(shard, user_id):
+            self.delete(shard, user_id)
+            return None
+        return entry['access']
+
+    def set(self, access, version):
+        """ `version` must be read with `get_version()` before loading the access from the database """
+        key = self._key(access.database, access.user_id)
+        with self._lock:
+            self._entries[key] = {'access': access, 'version': version, 'expires': time.monotonic() + self.timeout}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, shard, user_id):
+        with self._lock:
+            self._entries.pop(self._key(shard, user_id), None)
+
+    def invalidate(self, shard, user_id):
+        self.delete(shard, user_id)
+        if self.shared_cache is not None:
+            self.shared_cache.set(USER_ACCESS_VERSION_KEY.format(shard, user_id), uuid.uuid4().hex, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_user_access_cache = None
+
+
+def get_user_access_cache():
+    """ Return the process-wide access cache, or None if it's disabled (see `get_auth_user_cache`) """
+    global _user_access_cache
+
+    if _user_access_cache is None:
+        config = getattr(django_settings, 'USER_ACCESS_CACHE', {})
+        if not config.get('ENABLED', True) or not (config.get('SHARED_CACHE') or config.get('LOCAL_ONLY')):
+            return None
+        _user_access_cache = UserAccessCache(max_entries=config.get('MAX_ENTRIES', 10000),
+                                             timeout=config.get('TIMEOUT', 300),
+                                             shared_cache=config.get('SHARED_CACHE'))
+    return _user_access_cache
+
+
+def get_user_access(user):
+    """ Access of a user, computed once per request (kept on the user instance) and cached by the process """
+    access = getattr(user, '_user_access', None)
+    if access is not None:
+        return access
+
+    database = user._state.db
+    cache = get_user_access_cache()
+    access = cache.get(database, user.pk) if cache else None
+    if access is None:
+        version = cache.get_version(database, user.pk) if cache else None
+        access = UserAccess(database, user.pk)
+        if cache:
+            cache.set(access, version)
+    user._user_access = access
+    return access
+
+
+def invalidate_user_access(shard, user_ids):
+    """ Teams, connections or permissions of users changed: drop their cached access on every worker """
+    cache = get_user_access_cache()
+    if cache is None:
+        return
+    for user_id in set(user_ids):
+        if user_id is not None:
+            cache.invalidate(shard, user_id)
+
+
+def clear_user_access():
+    """ Drop the access cached by this process """
+    cache = get_user_access_cache()
+    if cache is not None:
+        cache.clear()
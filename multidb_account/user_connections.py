@@ -0,0 +1,121 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from multidb_account.constants import CONNECTION_COACHING, CONNECTION_TEAM, CONNECTION_OWNER, CONNECTION_ORGANISATION
+from multidb_account.team.models import Team
+from multidb_account.user.models import Coaching, Organisation, UserConnection, is_connection_graph_enabled
+
+
+def get_user_connections(using, user_ids=None):
+    """
+    `(user id, other user id, link)` edges of the connection graph, the same connections as the ones checked by
+    `BaseCustomUser.is_connected_to`. Only the edges of `user_ids`, from or to them, when given.
+    """
+    coachings = Coaching.objects.using(using)
+    teams = Team.objects.using(using)
+    if user_ids is not None:
+        user_ids = set(user_ids)
+        coachings = coachings.filter(Q(athlete_id__in=user_ids) | Q(coach_id__in=user_ids))
+        user_organisation_ids = Organisation.login_users.through.objects.using(using) \
+            .filter(basecustomuser_id__in=user_ids) \
+            .values('organisation_id')
+        teams = teams.filter(Q(athletes__in=user_ids) | Q(coaches__in=user_ids) | Q(owner_id__in=user_ids) |
+                             Q(organisation_id__in=user_organisation_ids))
+    teams = {team_id: (owner_id, organisation_id)
+             for team_id, owner_id, organisation_id in teams.values_list('id', 'owner_id', 'organisation_id')}
+    team_ids = list(teams)
+    organisation_ids = {organisation_id for _, organisation_id in teams.values() if organisation_id is not None}
+
+    athletes = defaultdict(list)
+    for team_id, user_id in Team.athletes.through.objects.using(using) \
+            .filter(team_id__in=team_ids) \
+            .values_list('team_id', 'athleteuser_id'):
+        athletes[team_id].append(user_id)
+    coaches = defaultdict(list)
+    for team_id, user_id in Team.coaches.through.objects.using(using) \
+            .filter(team_id__in=team_ids) \
+            .values_list('team_id', 'coachuser_id'):
+        coaches[team_id].append(user_id)
+    login_users = defaultdict(list)
+    for organisation_id, user_id in Organisation.login_users.through.objects.using(using) \
+            .filter(organisation_id__in=organisation_ids) \
+            .values_list('organisation_id', 'basecustomuser_id'):
+        login_users[organisation_id].append(user_id)
+
+    connections = set()
+    for athlete_id, coach_id in coachings.values_list('athlete_id', 'coach_id'):
+        connections.add((athlete_id, coach_id, CONNECTION_COACHING))
+        connections.add((coach_id, athlete_id, CONNECTION_COACHING))
+    for team_id, (owner_id, organisation_id) in teams.items():
+        for athlete_id in athletes[team_id]:
+            for coach_id in coaches[team_id]:
+                connections.add((athlete_id, coach_id, CONNECTION_TEAM))
+                connections.add((coach_id, athlete_id, CONNECTION_TEAM))
+            if athlete_id != owner_id:
+                connections.add((athlete_id, owner_id, CONNECTION_OWNER))
+                connections.add((owner_id, athlete_id, CONNECTION_OWNER))
+        for user_id in login_users[organisation_id]:
+            for member_id in athletes[team_id] + coaches[team_id]:
+                connections.add((user_id, member_id, CONNECTION_ORGANISATION))
+
+    if user_ids is not None:
+        connections = {edge for edge in connections if edge[0] in user_ids or edge[1] in user_ids}
+    return connections
+
+
+def refresh_user_connections(using, user_ids):
+    """ Recompute the edges of users whose coachings, teams or organisations changed """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids or not is_connection_graph_enabled():
+        return
+
+    with transaction.atomic(using=using):
+        UserConnection.objects.using(using) \
+            .filter(Q(user_id__in=user_ids) | Q(other_user_id__in=user_ids)) \
+            .delete()
+        UserConnection.objects.using(using).bulk_create([
+            UserConnection(user_id=user_id, other_user_id=other_user_id, link=link)
+            for user_id, other_user_id, link in sorted(get_user_connections(using, user_ids))
+        ], batch_size=1000)
+
+
+def get_team_user_ids(using, team_ids):
+    """ Users with edges through teams: their athletes, coaches, owners and the login users of their organisations """
+    team_ids = set(team_ids)
+    if not team_ids:
+        return set()
+
+    user_ids = set(Team.athletes.through.objects.using(using)
+                   .filter(team_id__in=team_ids)
+                   .values_list('athleteuser_id', flat=True))
+    user_ids.update(Team.coaches.through.objects.using(using)
+                    .filter(team_id__in=team_ids)
+                    .values_list('coachuser_id', flat=True))
+    owners = list(Team.objects.using(using).filter(id__in=team_ids).values_list('owner_id', 'organisation_id'))
+    user_ids.update(owner_id for owner_id, _ in owners)
+    user_ids.update(get_organisation_user_ids(using, [organisation_id for _, organisation_id in owners]))
+    return user_ids
+
+
+def get_organisation_user_ids(using, organisation_ids):
+    """ Login users of organisations """
+    organisation_ids = {organisation_id for organisation_id in organisation_ids if organisation_id is not None}
+    if not organisation_ids:
+        return set()
+    return set(Organisation.login_users.through.objects.using(using)
+               .filter(organisation_id__in=organisation_ids)
+               .values_list('basecustomuser_id', flat=True))
+
+
+def rebuild_user_connections(using):
+    """ Recompute the connection graph of a database """
+    connections = get_user_connections(using)
+
+    with transaction.atomic(using=using):
+        UserConnection.objects.using(using).all().delete()
+        UserConnection.objects.using(using).bulk_create([
+            UserConnection(user_id=user_id, other_user_id=other_user_id, link=link)
+            for user_id, other_user_id, link in sorted(connections)
+        ], batch_size=1000)
@@ -1,37 +1,110 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
+
+from multidb_account.auth_cache import is_shared_cache
+from multidb_account.directory.models import UserDirectoryEntry, normalize_directory_email
+from multidb_account.fanout import fan_out_first
+from multidb_account.shards import get_shard_databases
+
+USER_DIRECTORY_MISS_KEY = 'user_directory:miss:{}'
+
+
+def _get_user_directory_cache():
+    """
+    Cache of the unknown emails, or None. A user created on one worker must clear the miss seen by all of them, so
+    it must be shared by the workers, unless explicitly allowed with `USER_DIRECTORY_CACHE_LOCAL_ONLY`.
+    """
+    alias = getattr(settings, 'USER_DIRECTORY_CACHE', None)
+    if not alias or not getattr(settings, 'USER_DIRECTORY_NEGATIVE_CACHE_TIMEOUT', None):
+        return None
+    if not is_shared_cache(alias) and not getattr(settings, 'USER_DIRECTORY_CACHE_LOCAL_ONLY', False):
+        return None
+    return caches[alias]
+
+
+def is_user_directory_miss(username):
+    """ Whether the email has recently been looked up and was not found in any localized database """
+    cache = _get_user_directory_cache()
+    if cache is None:
+        return False
+    return bool(cache.get(USER_DIRECTORY_MISS_KEY.format(normalize_directory_email(username))))
+
+
+def set_user_directory_miss(username):
+    cache = _get_user_directory_cache()
+    if cache is not None:
+        cache.set(USER_DIRECTORY_MISS_KEY.format(normalize_directory_email(username)), True,
+                  settings.USER_DIRECTORY_NEGATIVE_CACHE_TIMEOUT)
+
+
+def clear_user_directory_miss(username):
+    cache = _get_user_directory_cache()
+    if cache is not None:
+        cache.delete(USER_DIRECTORY_MISS_KEY.format(normalize_directory_email(username)))
+
+
+def _get_user_from_database(username, database):
+    UserModel = get_user_model()
+    filters = {'{}__{}'.format(UserModel.USERNAME_FIELD, 'iexact'): username}
+    try:
+        return UserModel.objects.using(database).get(**filters)
+    except UserModel.DoesNotExist:
+        return None
+
+
+def _scan_localized_databases(username, localized_databases):
+    """ Look up the user in every given database in parallel, the first database in order wins. """
+    debug = getattr(settings, 'DEBUG', False)
+
+    user = fan_out_first(lambda database: _get_user_from_database(username, database), localized_databases)
+    if debug:
+        if user:
+            print("DEBUG: multidb_auth_backend -- User found in database: " + user._state.db)
+        else:
+            print("DEBUG: multidb_auth_backend -- User NOT found in databases: " + ', '.join(localized_databases))
+    return user
 
 
 def get_user_from_localized_databases(username, localized_db=None):
     """
     This function get a user object from localized databases.
+    The user's database is resolved through the global user directory, so only one database is queried.
+    Databases are only scanned one after another for emails the directory doesn't know about yet.
+    Raises `ShardUnavailableError`/`ShardTimeoutError` if the scan had to skip a database (see `fan_out_first()`).
     :param username:
     :param localized_db:
     :return user:
     """
-    debug = getattr(settings, 'DEBUG', False)
+    if not username:
+        return None
 
-    localized_databases = [localized_db] if localized_db else getattr(settings, 'DATABASES', None)
-    UserModel = get_user_model()
-    user = None
+    if localized_db:
+        return _get_user_from_database(username, localized_db)
 
-    for database in localized_databases:
-        try:
-            filters = {'{}__{}'.format(UserModel.USERNAME_FIELD, 'iexact'): username}
-            user = UserModel.objects.using(database).get(**filters)
+    if is_user_directory_miss(username):
+        return None
 
-        except UserModel.DoesNotExist:
-            if debug:
-                print("DEBUG: multidb_auth_backend -- User NOT found in database: " + database)
-            user = None
+    directory_db = UserDirectoryEntry.get_localized_db(username)
+    if directory_db:
+        user = _get_user_from_database(username, directory_db)
         if user:
-            if debug:
-                print("DEBUG: multidb_auth_backend -- User found in database: " + database)
-            break
+            return user
+
+    if getattr(settings, 'USER_DIRECTORY_AUTHORITATIVE', False) and not directory_db:
+        set_user_directory_miss(username)
+        return None
 
+    # Unknown or stale directory entry: fall back to the sequential scan and repair the directory
+    user = _scan_localized_databases(username, get_shard_databases())
     if user:
+        UserDirectoryEntry.register(user)
         return user
 
+    # Only reached when every database answered: a scan which skipped one raised instead of remembering a user
+    # who may well exist there as unknown
+    set_user_directory_miss(username)
+
 
 def get_localized_database(username):
     '''
@@ -39,21 +112,13 @@ def get_localized_database(username):
     :param username:
     :return user:
     '''
-    debug = getattr(settings, 'DEBUG', False)
     localized_databases = getattr(settings, 'LOCALIZED_DATABASES', None)
-    UserModel = get_user_model()
-    for database in localized_databases:
-        try:
-            user = UserModel.objects.using(database).get(**{UserModel.USERNAME_FIELD: username})
-        except UserModel.DoesNotExist:
-            if debug:
-                print("DEBUG: multidb_auth_backend -- User NOT found in database: " + database)
-            user = None
-        if user:
-            if debug:
-                print("DEBUG: multidb_auth_backend -- User found in database: " + database)
-            break
 
+    directory_db = UserDirectoryEntry.get_localized_db(username)
+    if directory_db in localized_databases:
+        return directory_db
+
+    user = _scan_localized_databases(username, localized_databases)
     if user:
         return user.country
     else:
@@ -67,14 +132,3 @@ def dictfetchall(cursor):
         dict(zip(columns, row))
         for row in cursor.fetchall()
     ]
-
-
-
-
-
-
-
-
-
-
-
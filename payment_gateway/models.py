@@ -1,9 +1,12 @@
 from datetime import timedelta
-from django.conf import settings as django_settings
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 from django.utils import timezone
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from multidb_account.auth_cache import invalidate_user_auth_state_on_commit
+from multidb_account.fanout import fan_out
+from multidb_account.shards import get_shard_databases
 from multidb_account.user.models import AthleteUser
 from .settings import PLANS_CHOICES
 from .choices import PAYMENT_STATUS
@@ -149,11 +152,19 @@ class Customer(StripeObject):
 
     @classmethod
     def disable_expired(cls):
-        for db in django_settings.DATABASES:
-            cls.objects.using(db) \
-                .filter(grace_period_end__lt=timezone.now()) \
-                .exclude(payment_status='locked_out') \
-                .update(payment_status='locked_out')
+        now = timezone.now()
+
+        def disable_expired_in_database(db):
+            expired = cls.objects.using(db) \
+                .filter(grace_period_end__lt=now) \
+                .exclude(payment_status='locked_out')
+            athlete_ids = list(expired.values_list('athlete_id', flat=True))
+            expired.filter(athlete_id__in=athlete_ids).update(payment_status='locked_out')
+
+            for athlete_id in athlete_ids:
+                invalidate_user_auth_state_on_commit(db, athlete_id)
+
+        fan_out(disable_expired_in_database, get_shard_databases())
 
     def post_add_update_plan(self, had_card, payment_status='up_to_date'):
         if not had_card:
@@ -215,6 +226,13 @@ class Customer(StripeObject):
         return True
 
 
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_customer_auth_cache(sender, instance, using, **kwargs):
+    """ The lockout flag is part of the cached auth state """
+    invalidate_user_auth_state_on_commit(using, instance.athlete_id)
+
+
 class Event(StripeObject):
     customer = models.ForeignKey("Customer", null=True)
     type = models.CharField(verbose_name=_('stripe event type '), max_length=250, default="")
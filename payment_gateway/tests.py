@@ -1,3 +1,4 @@
+import time
 from datetime import timedelta
 
 from django.conf import settings as django_settings
@@ -7,6 +8,8 @@ from django.utils import timezone
 from rest_framework import status
 
 from multidb_account.constants import USER_TYPE_ATHLETE
+from multidb_account.shard_health import get_circuit_breaker
+from payment_gateway.models import Customer
 from rest_api.tests import ApiTests
 
 UserModel = get_user_model()
@@ -75,6 +78,50 @@ class PaymentTests(ApiTests):
         self.assertEqual(customer2.payment_status, 'locked_out')
         self.assertEqual(customer3.payment_status, 'grace_period')
 
+    def test_locked_out_user_is_rejected_after_auth_cache_hit(self):
+        user = self.create_random_user(country=self.athlete_ca.country, user_type=USER_TYPE_ATHLETE)
+        customer = user.athleteuser.customer
+        auth = 'JWT {}'.format(user.token)
+        url = reverse_lazy('rest_api:user-detail', kwargs={'uid': user.id})
+
+        # Twice, so that the second request is served from the auth cache
+        for _ in range(2):
+            response = self.client.get(url, format='json', HTTP_AUTHORIZATION=auth)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        customer.payment_status = 'grace_period'
+        customer.grace_period_end = timezone.now() - timedelta(days=1)
+        customer.save(update_fields=('grace_period_end', 'payment_status'))
+        Customer.disable_expired()
+
+        response = self.client.get(url, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_disable_users_skips_unavailable_database(self):
+        customer_ca = self.athlete_ca.athleteuser.customer
+        customer_us = self.athlete_us.athleteuser.customer
+        for customer in (customer_ca, customer_us):
+            customer.payment_status = 'grace_period'
+            customer.grace_period_end = timezone.now() - timedelta(days=1)
+            customer.save(update_fields=('grace_period_end', 'payment_status'))
+
+        # Open the circuit breaker of the 'us' database
+        breaker = get_circuit_breaker('us')
+        breaker.opened_at = time.monotonic()
+        self.addCleanup(setattr, breaker, 'opened_at', None)
+
+        response = self.client.get(reverse_lazy('rest_api:health'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['databases']['us']['state'], 'open')
+        self.assertEqual(response.data['databases']['ca']['state'], 'closed')
+
+        Customer.disable_expired()
+
+        customer_ca.refresh_from_db()
+        customer_us.refresh_from_db()
+        self.assertEqual(customer_ca.payment_status, 'locked_out')
+        self.assertEqual(customer_us.payment_status, 'grace_period')
+
     def test_payment_not_needed(self):
         customer = self.athlete_ca.athleteuser.customer
         auth = 'JWT {}'.format(self.athlete_ca.token)
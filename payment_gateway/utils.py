@@ -1,55 +1,35 @@
 from django.conf import settings
+from multidb_account.fanout import fan_out_first
 from payment_gateway.models import Customer, Event
 
 
-def get_customer_from_localized_databases(customer_stripe_id):
-    # This function locates and returns a customer object if exists in a localized database.
-    customer_found = False
-    global customer
-
+def _get_from_localized_databases(model, stripe_id):
+    # This function locates and returns an object if exists in a localized database.
+    # Databases are queried in parallel, the first one in LOCALIZED_DATABASES order wins.
     debug = getattr(settings, 'DEBUG', False)
     localized_databases = getattr(settings, 'LOCALIZED_DATABASES', None)
-    for database in localized_databases:
+
+    def get_from_database(database):
         try:
-            customer = Customer.objects.using(database).get(stripe_id=customer_stripe_id)
-            customer_found = True
-        except Customer.DoesNotExist:
-            if debug:
-                print("DEBUG: multidb_auth_backend -- Customer NOT found in database: " + database)
-            customer = None
+            return model.objects.using(database).get(stripe_id=stripe_id)
+        except model.DoesNotExist:
+            return None
 
-        if customer_found:
-            if debug:
-                print("DEBUG: multidb_auth_backend -- Customer found in database: " + database)
-            break
+    obj = fan_out_first(get_from_database, localized_databases)
+    if debug:
+        if obj:
+            print("DEBUG: multidb_auth_backend -- {} found in database: {}".format(model.__name__, obj._state.db))
+        else:
+            print("DEBUG: multidb_auth_backend -- {} NOT found in databases: {}".format(
+                model.__name__, ', '.join(localized_databases)))
+    return obj
 
-    if customer_found:
-        return customer
-    else:
-        return None
+
+def get_customer_from_localized_databases(customer_stripe_id):
+    # This function locates and returns a customer object if exists in a localized database.
+    return _get_from_localized_databases(Customer, customer_stripe_id)
 
 
 def get_event_from_localized_databases(event_id):
     # This function locates and returns an event object if exists in a localized database.
-    event_found = False
-    global event
-
-    debug = getattr(settings, 'DEBUG', False)
-    localized_databases = getattr(settings, 'LOCALIZED_DATABASES', None)
-    for database in localized_databases:
-        try:
-            event = Event.objects.using(database).get(stripe_id=event_id)
-            event_found = True
-        except Event.DoesNotExist:
-            if debug:
-                print("DEBUG: multidb_auth_backend -- Event NOT found in database: " + database)
-
-        if event_found:
-            if debug:
-                print("DEBUG: multidb_auth_backend -- Event found in database: " + database)
-            break
-
-    if event_found:
-        return event
-    else:
-        return None
+    return _get_from_localized_databases(Event, event_id)
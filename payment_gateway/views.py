@@ -24,7 +24,7 @@ class StripeView(APIView):
 
     def get_customer(self):
         try:
-            return Customer.objects.using(self.request.user.country). \
+            return Customer.objects. \
                 get(athlete_id=self.request.user.athleteuser.customer.athlete_id)
         except Customer.DoesNotExist:
             return None
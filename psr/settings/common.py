@@ -60,11 +60,12 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'multidb_account.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'multidb_account.middleware.MultiDbMiddleware',
+    'multidb_account.middleware.IdentityMapMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -72,6 +73,11 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'psr.urls'
 
+# Route the sharded apps' queries to the database of the current request's user (see multidb_account.shards)
+DATABASE_ROUTERS = [
+    'multidb_account.routers.ShardRouter',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -137,6 +143,8 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.MultiPartRenderer',  # For image uploading
     ),
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
+    # Lookups which skipped an unavailable localized database answer 503
+    'EXCEPTION_HANDLER': 'rest_api.exceptions.shard_exception_handler',
 }
 
 #  JWT token configuration
@@ -156,6 +164,95 @@ USER_INVITE_TIMEOUT = int(86400)
 # 30 days = 2592000 seconds
 ATHLETE_COACH_ASSESSMENT_TIMEOUT = int(2592000)
 
+# Global user directory: maps a user's email to the localized database he lives in
+USER_DIRECTORY_DATABASE = 'default'
+# Seconds an unknown email is remembered as unknown in the USER_DIRECTORY_CACHE alias of CACHES (0 disables the
+# negative cache). It must be shared by the workers: a local-memory cache is only used with
+# USER_DIRECTORY_CACHE_LOCAL_ONLY (single-process deployments), otherwise misses aren't cached.
+USER_DIRECTORY_CACHE = None
+USER_DIRECTORY_CACHE_LOCAL_ONLY = False
+USER_DIRECTORY_NEGATIVE_CACHE_TIMEOUT = 60
+# Once `manage.py rebuild_user_directory` has been run, emails missing from the directory are unknown
+# and the localized databases are no longer scanned for them.
+USER_DIRECTORY_AUTHORITATIVE = False
+
+# Per-process cache of the authenticated users' state (see multidb_account.auth_cache).
+# Invalidations are broadcast to the other workers through the `SHARED_CACHE` alias of `CACHES` (e.g. redis).
+# Without it, the cache is only safe for single-process deployments and must be allowed with `LOCAL_ONLY`.
+AUTH_USER_CACHE = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': 300,
+    'SHARED_CACHE': None,
+    'LOCAL_ONLY': False,
+}
+
+# Per-process cache of the teams, connections and assessment permissions of the users, checked by the permission
+# classes (see multidb_account.user_access). Invalidated like the auth cache, with the same constraints.
+USER_ACCESS_CACHE = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': 300,
+    'SHARED_CACHE': None,
+    'LOCAL_ONLY': False,
+}
+
+# Thread pool running the queries which visit every database (see multidb_account.fanout).
+# TIMEOUT is the number of seconds every database has to answer. Work done inside a transaction is never fanned out.
+SHARD_FANOUT = {
+    'ENABLED': True,
+    'MAX_WORKERS': 8,
+    'TIMEOUT': 30,
+}
+
+# Circuit breaker of every database (see multidb_account.shard_health): FAILURE_THRESHOLD consecutive failures
+# open it for RESET_TIMEOUT seconds, and calls beyond MAX_IN_FLIGHT concurrent ones to a database are shed.
+SHARD_HEALTH = {
+    'FAILURE_THRESHOLD': 5,
+    'RESET_TIMEOUT': 30,
+    'MAX_IN_FLIGHT': 16,
+}
+
+# Read replica alias of the localized databases, e.g. {'ca': 'ca_replica'}. Replicas are declared in DATABASES
+# with 'TEST': {'MIRROR': <primary>}. Safe API requests read from them, except for SHARD_REPLICA_STICKY_SECONDS
+# after an unsafe request of the same user, tracked in the SHARD_REPLICA_CACHE alias of CACHES. It must be shared by
+# the workers (e.g. redis): without it, or with a local-memory cache not allowed with SHARD_REPLICA_CACHE_LOCAL_ONLY
+# (single-process deployments), every read goes to the primaries.
+SHARD_REPLICAS = {}
+SHARD_REPLICA_STICKY_SECONDS = 10
+SHARD_REPLICA_CACHE = None
+SHARD_REPLICA_CACHE_LOCAL_ONLY = False
+
+# Per-process snapshot of the reference data (sports, assessment taxonomy, badges...) of every database
+# (see multidb_account.reference_data). Their version stamp is checked at most every CHECK_INTERVAL seconds.
+REFERENCE_DATA = {
+    'CHECK_INTERVAL': 5,
+}
+
+# Maintain per team and assessment aggregates of the chosen assessments (see multidb_account.assessment_rollup)
+# and compute the team averages from them. Run the rebuild_team_assessment_rollups command before enabling it.
+TEAM_ASSESSMENT_ROLLUP = False
+
+# Maintain the graph of the connections between users (see multidb_account.user_connections) and check the
+# connections against it. Run the rebuild_user_connections command before enabling it.
+USER_CONNECTION_GRAPH = False
+
+# Per-process NumPy snapshot of the assessment values of every database, to rank them among cohorts
+# (see multidb_account.assessment_norms). The new values are loaded at most every REFRESH_INTERVAL seconds,
+# all of them every REBUILD_INTERVAL seconds, in the background. A refresh re-reads the WATERMARK_WINDOW ids below
+# the last loaded one, for the values committed after a greater id.
+ASSESSMENT_NORMS = {
+    'REFRESH_INTERVAL': 60,
+    'REBUILD_INTERVAL': 3600,
+    'WATERMARK_WINDOW': 1000,
+}
+
+# Sessions are only used by the admin, the API authenticates with JWTs.
+# Requests to these paths get an empty session that is never loaded from nor saved to the session store.
+SESSIONLESS_PATH_PREFIXES = ('/api/',)
+# The 'signed_cookies' or 'cache' backends avoid the session table queries on the `default` database
+SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
 # EMAIL TEMPLATES
 RESET_PASSWORD_EMAIL_TEMPLATE = 'multidb_account/reset_password'
 RESET_PASSWORD_CONFIRM_EMAIL_TEMPLATE = 'multidb_account/reset_password_confirm'
@@ -37,6 +37,14 @@ DATABASES = {
     }
 }
 
+# Single process: the per-process caches (auth, replica reads, user directory) don't need a shared cache
+AUTH_USER_CACHE['LOCAL_ONLY'] = True
+USER_ACCESS_CACHE['LOCAL_ONLY'] = True
+SHARD_REPLICA_CACHE = 'default'
+SHARD_REPLICA_CACHE_LOCAL_ONLY = True
+USER_DIRECTORY_CACHE = 'default'
+USER_DIRECTORY_CACHE_LOCAL_ONLY = True
+
 STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 
@@ -63,6 +63,43 @@ DATABASES = {
     }
 }
 
+# Every database hands out connections from a per-process pool (see multidb_account.db.pool), sized with e.g.
+# DB_POOL_MAX_SIZE (default) or CA_DB_POOL_MAX_SIZE (ca). CONN_MAX_AGE = 0 gives the connection back to the pool
+# at the end of every request, so that the threads share them.
+for alias, database in DATABASES.items():
+    prefix = '' if alias == 'default' else '{}_'.format(alias.upper())
+    database.update({
+        'ENGINE': 'multidb_account.db.backends.postgresql_pool',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('{}DB_POOL_MAX_SIZE'.format(prefix), 10)),
+            'TIMEOUT': int(os.environ.get('{}DB_POOL_TIMEOUT'.format(prefix), 10)),
+            'MAX_IDLE': int(os.environ.get('{}DB_POOL_MAX_IDLE'.format(prefix), 300)),
+            'CHECK_INTERVAL': int(os.environ.get('{}DB_POOL_CHECK_INTERVAL'.format(prefix), 10)),
+        },
+    })
+
+# Milliseconds a query may run before postgres cancels it, so that a degraded database fails fast and opens its
+# circuit breaker (see multidb_account.shard_health). Set it to 0 for long running commands, e.g. migrations.
+DATABASE_STATEMENT_TIMEOUT = int(os.environ.get('DATABASE_STATEMENT_TIMEOUT', 30000))
+if DATABASE_STATEMENT_TIMEOUT:
+    for database in DATABASES.values():
+        database.setdefault('OPTIONS', {})['options'] = '-c statement_timeout={}'.format(DATABASE_STATEMENT_TIMEOUT)
+
+# Seconds to wait for a connection to a database, so that an unreachable one doesn't hold a (fan-out) thread
+DATABASE_CONNECT_TIMEOUT = int(os.environ.get('DATABASE_CONNECT_TIMEOUT', 5))
+if DATABASE_CONNECT_TIMEOUT:
+    for database in DATABASES.values():
+        database.setdefault('OPTIONS', {})['connect_timeout'] = DATABASE_CONNECT_TIMEOUT
+
+# Optional read replica of every localized database, e.g. CA_REPLICA_DB_HOST
+for localized_db in LOCALIZED_DATABASES:
+    replica_host = os.environ.get('{}_REPLICA_DB_HOST'.format(localized_db.upper()))
+    if replica_host:
+        replica = '{}_replica'.format(localized_db)
+        DATABASES[replica] = dict(DATABASES[localized_db], HOST=replica_host, TEST={'MIRROR': localized_db})
+        SHARD_REPLICAS[localized_db] = replica
+
 
 # STORAGE
 STATICFILES_STORAGE = 'psr.custom_storages.S3StaticStorage'
@@ -117,6 +154,15 @@ JWT_AUTH = {
     'JWT_ALLOW_REFRESH': True
 }
 
+AUTH_USER_CACHE['SHARED_CACHE'] = os.environ.get('AUTH_USER_CACHE_SHARED_CACHE') or None
+USER_ACCESS_CACHE['SHARED_CACHE'] = AUTH_USER_CACHE['SHARED_CACHE']
+SHARD_REPLICA_CACHE = AUTH_USER_CACHE['SHARED_CACHE']
+USER_DIRECTORY_CACHE = AUTH_USER_CACHE['SHARED_CACHE']
+
+USER_DIRECTORY_AUTHORITATIVE = os.environ.get('USER_DIRECTORY_AUTHORITATIVE', '') in ('True', 'true')
+
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', SESSION_ENGINE)
+
 # 30min = 1800 seconds
 PASSWORD_RESET_TOKEN_EXPIRES = int(os.environ.get('PASSWORD_RESET_TOKEN_EXPIRES', 1800))
 # 7 days = 604800 seconds
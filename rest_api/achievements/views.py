@@ -1,7 +1,10 @@
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
 from multidb_account.achievements.models import Achievement, Badge
+from multidb_account.reference_data.cache import get_reference_data
+from rest_api.pagination import LinkHeaderCursorPagination
 from .permissions import IsAchievementOwner
 from .serializers import AchievementSerializer, BadgeSerializer
 
@@ -13,10 +16,11 @@ class AchievementViewSet(ModelViewSet):
 
     permission_classes = (IsAuthenticated, IsAchievementOwner,)
     serializer_class = AchievementSerializer
+    pagination_class = LinkHeaderCursorPagination
     lookup_url_kwarg = 'aid'
 
     def get_queryset(self):
-        return Achievement.objects.using(self.request.user.country).filter(created_by=self.kwargs['uid'])
+        return Achievement.objects.filter(created_by=self.kwargs['uid'])
 
 
 class BadgeViewSet(ReadOnlyModelViewSet):
@@ -27,3 +31,8 @@ class BadgeViewSet(ReadOnlyModelViewSet):
     serializer_class = BadgeSerializer
     queryset = Badge.objects.all()
     lookup_url_kwarg = 'bid'
+
+    def list(self, request, *args, **kwargs):
+        badges = get_reference_data(request.user.country).badges.values()
+        serializer = self.get_serializer(list(badges), many=True)
+        return Response(serializer.data)
@@ -1,6 +1,8 @@
 from rest_framework import permissions
 from rest_framework.compat import is_authenticated
 
+from multidb_account.user_access import get_user_access
+
 
 class IsAuthenticatedAndHasOwnAssessmentPermission(permissions.BasePermission):
     """
@@ -18,7 +20,8 @@ class IsAuthenticatedAndConnected(permissions.BasePermission):
 
     def has_permission(self, request, view):
         return is_authenticated(request.user) and \
-               (request.user.id == int(view.kwargs.get('uid')) or request.user.is_connected_to(view.kwargs.get('uid')))
+               (request.user.id == int(view.kwargs.get('uid')) or
+                get_user_access(request.user).is_connected_to(view.kwargs.get('uid')))
 
 
 class IsTeamMember(permissions.BasePermission):
@@ -31,7 +34,4 @@ class IsTeamMember(permissions.BasePermission):
 
     def has_object_permission(self, request, view, team):
         # check if user is a team member
-        return team.athletes.filter(pk=request.user.id).exists() \
-               or team.coaches.filter(pk=request.user.id).exists() \
-               or request.user.id == team.owner.id \
-               or (team.organisation and team.organisation.login_users.filter(id=request.user.id).exists())
+        return get_user_access(request.user).is_team_member(team.id)
@@ -1,18 +1,28 @@
 import re
+import weakref
 from datetime import timedelta
-from statistics import mean
+from itertools import groupby
+from operator import attrgetter
 
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import Case, Value, When
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 from django.conf import settings as django_settings
 from rest_framework import serializers
 
-from multidb_account.constants import USER_TYPE_ATHLETE, USER_TYPE_COACH
+from multidb_account.assessment_history import HISTORY_BUCKETS
+from multidb_account.assessment_norms import REDUCTIONS
+from multidb_account.assessment_rollup import refresh_team_assessment_rollups
+from multidb_account.constants import USER_TYPE_ATHLETE
+from multidb_account.reference_data.cache import get_reference_data
 from multidb_account.team.models import Team
-from multidb_account.assessment.models import AssessmentTopCategory, AssessmentSubCategory, \
-    ChosenAssessment, Assessed, Assessment, AssessmentTopCategoryPermission, AssessmentRelationshipType
+from multidb_account.user_access import get_user_access
+from multidb_account.assessment.models import AssessmentTopCategory, \
+    ChosenAssessment, Assessed, Assessment, AssessmentAccess, AssessmentRelationshipType, \
+    get_relationship_type
 
 UserModel = get_user_model()
 
@@ -53,116 +63,126 @@ class AssessedListSerializer(serializers.ModelSerializer):
 # ---------------------Assessment-------------------------
 
 
-class AssessmentsTreeListSerializer(serializers.ModelSerializer):
-    childs = serializers.SerializerMethodField()
-    is_flat = serializers.SerializerMethodField()
+class AssessmentsTreeListSerializer(serializers.BaseSerializer):
+    """
+    Render the assessments tree of a top category from the taxonomy of the reference data
+    (see multidb_account.reference_data.taxonomy), without querying the database.
+    Only the sub categories of `context['subcat_ids']` and the assessments of the `context['visible_mask']`
+    bitset are rendered.
+    """
 
-    class Meta:
-        model = AssessmentSubCategory
-        fields = ('id', 'name', 'description', 'childs', 'is_flat')
-
-    def get_childs(self, obj):
-        if isinstance(obj, AssessmentTopCategory):
-            # it's a top category without assessments objects
-            return AssessmentsTreeListSerializer(
-                self._filter_subcats(obj.assessmentsubcategory_set.all()), many=True, context=self.context).data
-
-        if isinstance(obj, AssessmentSubCategory):
-            if obj.assessment_set.exists():
-                # it's a sub category with assessments objects
-                return AssessmentSerializer(
-                    self._filter_assessments(obj.assessment_set.all()), many=True, context=self.context).data
-            else:
-                # it's a category without assessments objects
-                return AssessmentsTreeListSerializer(
-                    self._filter_subcats(obj.assessmentsubcategory_set.all()), many=True, context=self.context).data
-
-    def get_is_flat(self, obj):
-        # render is_flat = True only for sub_categories with assessments objects and right below a top category
-        if isinstance(obj, AssessmentSubCategory) and obj.parent_top_category_id is not None:
-            if obj.assessment_set.all():
-                return True
-        return False
-
-    def _filter_subcats(self, qs):
-        """ Filter subcategories based on org privacy """
+    def to_representation(self, top_category):
+        taxonomy = self.context['taxonomy']
+        return {
+            'id': top_category.id,
+            'name': top_category.name,
+            'description': top_category.description,
+            'childs': self._get_subcategories(taxonomy.get_top_category_children(top_category.id)),
+            'is_flat': False,
+        }
+
+    def _get_subcategories(self, positions):
+        taxonomy = self.context['taxonomy']
         subcat_ids = self.context['subcat_ids']
-        return qs.filter(id__in=subcat_ids)
-
-    def _filter_assessments(self, qs):
-        """ Filter subcategory's assessments based on org/team privacy """
-        user = self.context['request'].user
-        user_from_own_assessments_only_org = self.context['user_from_own_assessments_only_org']
-        my_org_private = Q(organisations__members=user) | Q(organisations__login_users=user)
-        public = Q(is_public_everywhere=True)
-        public = public | (Q() if user_from_own_assessments_only_org else Q(is_private=False))
-
-        if user.user_type == USER_TYPE_ATHLETE:
-            my_team_private = Q(is_private=True, teams__athletes=user.athleteuser)
-            my_org_private = my_org_private | Q(organisations__teams__athletes=user.athleteuser)
-        elif user.user_type == USER_TYPE_COACH:
-            my_team_private = Q(is_private=True) & (Q(teams__coaches=user.coachuser) | Q(teams__owner=user))
-            my_org_private = my_org_private | Q(organisations__teams__coaches=user.coachuser)
+        return [self._get_subcategory(i) for i in positions if taxonomy.sub_categories[i].id in subcat_ids]
+
+    def _get_subcategory(self, i):
+        taxonomy = self.context['taxonomy']
+        sub_category = taxonomy.sub_categories[i]
+
+        if taxonomy.has_assessments(i):
+            # it's a sub category with assessments objects
+            visible_mask = self.context['visible_mask']
+            childs = [self._get_assessment(position) for position in taxonomy.get_assessment_positions(i)
+                      if visible_mask >> position & 1]
         else:
-            my_team_private = Q()
+            # it's a category without assessments objects
+            childs = self._get_subcategories(taxonomy.get_subcategory_children(i))
+
+        return {
+            'id': sub_category.id,
+            'name': sub_category.name,
+            'description': sub_category.description,
+            'childs': childs,
+            # render is_flat = True only for sub_categories with assessments objects and right below a top category
+            'is_flat': taxonomy.has_assessments(i) and sub_category.parent_top_category_id is not None,
+        }
+
+    def _get_assessment(self, position):
+        # The taxonomy is immutable: render every assessment once
+        taxonomy = self.context['taxonomy']
+        representations = _assessment_representations.setdefault(taxonomy, {})
+        data = representations.get(position)
+        if data is None:
+            data = representations[position] = AssessmentSerializer(taxonomy.assessments[position]).data
+        return data
+
 
-        return qs.filter(public | my_team_private | my_org_private).distinct()
+_assessment_representations = weakref.WeakKeyDictionary()
 
 
-class ChosenAssessmentTreeListSerializer(serializers.ModelSerializer):
+class ChosenAssessmentTreeListSerializer(serializers.BaseSerializer):
     """
     Serializer to list assessed's assessments rendered through the assessment reference tree.
+    The tree of a top category is assembled from `context['taxonomy']` (see multidb_account.reference_data.taxonomy)
+    and `context['queryset']` (of ChosenAssessment) is fetched in a single query, shared by every top category.
+    If `context['averages']` (average value by assessment id) is given, the averages are rendered instead.
     """
-    childs = serializers.SerializerMethodField()
-    is_flat = serializers.SerializerMethodField()
-
-    class Meta:
-        model = AssessmentSubCategory
-        fields = ('id', 'name', 'description', 'childs', 'is_flat')
 
-    def get_childs(self, obj):
+    def to_representation(self, top_category):
+        taxonomy = self.context['taxonomy']
+        return {
+            'id': top_category.id,
+            'name': top_category.name,
+            'description': top_category.description,
+            'childs': [self._get_subcategory(i) for i in taxonomy.get_top_category_children(top_category.id)],
+            'is_flat': False,
+        }
+
+    @cached_property
+    def chosen_assessments(self):
+        """ The ChosenAssessment of the queryset, by assessment id """
+        queryset = self.context['queryset'].order_by('assessment_id', 'id')
+        return {assessment_id: list(values)
+                for assessment_id, values in groupby(queryset, key=attrgetter('assessment_id'))}
+
+    def _get_subcategory(self, i):
         # Here we generate the Assessed's assessments tree based on the assessments global tree
-        queryset = self.context['queryset']  # of ChosenAssessment
-        get_averages = self.context.get('get_averages')
-
-        if isinstance(obj, AssessmentTopCategory):
-            return ChosenAssessmentTreeListSerializer(obj.assessmentsubcategory_set.all(), many=True,
-                                                      context=self.context).data
-        if isinstance(obj, AssessmentSubCategory):
-            if obj.assessment_set.all():
-                # it's a sub category with assessments objects
-                assessments = obj.assessment_set.all().order_by('id')
-                chosen_assessments = []
-                for assessment in assessments:
-                    values = queryset.filter(assessment_id=assessment.id)
-                    if values:
-                        if get_averages:
-                            values = self._get_average(values)
-                            data = ChosenAssessmentAveragesSerializer(values, many=True).data
-                        else:
-                            data = ChosenAssessmentListSerializer(values, many=True).data
-                        chosen_assessments.append(data)
-                return chosen_assessments
-            else:
-                # it's a category without assessments objects
-                return ChosenAssessmentTreeListSerializer(obj.assessmentsubcategory_set.all(), many=True,
-                                                          context={'queryset': queryset}).data
-
-    @staticmethod
-    def _get_average(values):
-        avg = mean([v.value for v in values])
-        return [ChosenAssessment(
-            assessment=values[0].assessment,
-            team=values[0].team,
-            value=avg,
-        )]
-
-    def get_is_flat(self, obj):
-        # render is_flat = True only for sub_categories with assessments objects and right below a top category
-        if isinstance(obj, AssessmentSubCategory) and obj.parent_top_category_id is not None:
-            if obj.assessment_set.all():
-                return True
-        return False
+        taxonomy = self.context['taxonomy']
+        sub_category = taxonomy.sub_categories[i]
+
+        if taxonomy.has_assessments(i):
+            # it's a sub category with assessments objects
+            assessments = sorted((taxonomy.assessments[position] for position in taxonomy.get_assessment_positions(i)),
+                                 key=attrgetter('id'))
+            childs = []
+            for assessment in assessments:
+                data = self._get_values(assessment.id)
+                if data:
+                    childs.append(data)
+        else:
+            # it's a category without assessments objects
+            childs = [self._get_subcategory(child) for child in taxonomy.get_subcategory_children(i)]
+
+        return {
+            'id': sub_category.id,
+            'name': sub_category.name,
+            'description': sub_category.description,
+            'childs': childs,
+            # render is_flat = True only for sub_categories with assessments objects and right below a top category
+            'is_flat': taxonomy.has_assessments(i) and sub_category.parent_top_category_id is not None,
+        }
+
+    def _get_values(self, assessment_id):
+        averages = self.context.get('averages')
+        if averages is not None:
+            if assessment_id not in averages:
+                return None
+            average = ChosenAssessment(assessment_id=assessment_id, value=averages[assessment_id])
+            return ChosenAssessmentAveragesSerializer([average], many=True).data
+
+        values = self.chosen_assessments.get(assessment_id)
+        return ChosenAssessmentListSerializer(values, many=True).data if values else None
 
 
 class AssessmentRelationshipTypeSerializer(serializers.ModelSerializer):
@@ -187,6 +207,11 @@ class AssessmentSerializer(serializers.ModelSerializer):
         model = Assessment
         fields = ('id', 'name', 'description', 'relationship_types', 'format_description', 'unit', 'is_private')
 
+    def to_representation(self, instance):
+        # Use the cached assessment: its format and relationship types are resolved without a query
+        cached = get_reference_data(instance._state.db).assessments.get(instance.pk)
+        return super().to_representation(cached or instance)
+
 
 # ---------------------ChosenAssessment-------------------------
 
@@ -207,9 +232,207 @@ class ChosenAssessmentAveragesSerializer(serializers.ModelSerializer):
         fields = ('assessment_id', 'value')
 
 
+class ChosenAssessmentHistoryQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the assessed's assessments history: the width of the buckets, and the maximum number
+    of points of every series.
+    """
+    bucket = serializers.ChoiceField(choices=HISTORY_BUCKETS, default='day')
+    points = serializers.IntegerField(min_value=3, required=False)
+
+
+class ChosenAssessmentPercentilesQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the assessed's assessment percentiles: the assessment, and which value of every athlete
+    is ranked.
+    """
+    assessment_id = serializers.IntegerField()
+    reduction = serializers.ChoiceField(choices=REDUCTIONS, default='latest')
+
+
+class ChosenAssessmentHistoryPointSerializer(serializers.Serializer):
+    date = serializers.DateTimeField()
+    min = serializers.DecimalField(max_digits=15, decimal_places=6)
+    max = serializers.DecimalField(max_digits=15, decimal_places=6)
+    mean = serializers.DecimalField(max_digits=15, decimal_places=6)
+    last = serializers.DecimalField(max_digits=15, decimal_places=6)
+    count = serializers.IntegerField()
+
+
+class ChosenAssessmentHistorySerializer(serializers.Serializer):
+    """
+    Serializer to list the history of an assessed's assessment, as `(assessment id, points)`.
+    """
+    assessment_id = serializers.SerializerMethodField()
+    name = serializers.SerializerMethodField()
+    unit = serializers.SerializerMethodField()
+    points = serializers.SerializerMethodField()
+
+    def get_assessment(self, obj):
+        return get_reference_data(self.context['country']).get_assessment(obj[0])
+
+    def get_assessment_id(self, obj):
+        return obj[0]
+
+    def get_name(self, obj):
+        assessment = self.get_assessment(obj)
+        return assessment.name if assessment else None
+
+    def get_unit(self, obj):
+        assessment = self.get_assessment(obj)
+        return assessment.format.unit if assessment else None
+
+    def get_points(self, obj):
+        return ChosenAssessmentHistoryPointSerializer(obj[1], many=True).data
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_ids(values):
+    return {pk for pk in map(_to_int, values) if pk is not None}
+
+
+class ChosenAssessmentBatch(object):
+    """
+    What is needed to validate chosen assessments submitted at once by `user`: the assessed, teams, chosen assessments
+    referenced by the items, each fetched lazily in one `IN` query, and the access of the assessor.
+    `assessed_id` and `team_id` override the ones of the items, like the `context` of the serializers.
+    """
+
+    def __init__(self, user, localized_db, items, assessed_id=None, team_id=None):
+        self.user = user
+        self.localized_db = localized_db
+        self.assessor = user.get_assessor()
+        self.reference_data = get_reference_data(localized_db)
+
+        items = [item for item in items if isinstance(item, dict)]
+        self.assessed_ids = _get_ids([assessed_id] if assessed_id else [item.get('assessed_id') for item in items])
+        self.team_ids = _get_ids([team_id] if team_id else [item.get('team_id') for item in items])
+        self.chosen_assessment_ids = _get_ids(item.get('id') for item in items)
+        self.relationship_types = {}
+
+    @cached_property
+    def assessed(self):
+        return Assessed.objects.using(self.localized_db) \
+            .filter(id__in=self.assessed_ids) \
+            .select_related('athlete__user', 'coach__user') \
+            .in_bulk()
+
+    @cached_property
+    def existing_team_ids(self):
+        if not self.team_ids:
+            return set()
+        return set(Team.objects.using(self.localized_db).filter(id__in=self.team_ids).values_list('id', flat=True))
+
+    @cached_property
+    def chosen_assessments(self):
+        if not self.chosen_assessment_ids:
+            return {}
+        return ChosenAssessment.objects.using(self.localized_db).in_bulk(self.chosen_assessment_ids)
+
+    @cached_property
+    def access(self):
+        """ Connections and assessment permissions of the assessor """
+        return get_user_access(self.user)
+
+    @cached_property
+    def recently_assessed_ids(self):
+        """ Assessed with a chosen assessment within `settings.ATHLETE_COACH_ASSESSMENT_TIMEOUT` """
+        timeout_dt = timezone.now() - timedelta(seconds=django_settings.ATHLETE_COACH_ASSESSMENT_TIMEOUT)
+        return set(ChosenAssessment.objects.using(self.localized_db)
+                   .filter(assessed_id__in=self.assessed_ids, date_assessed__gte=timeout_dt)
+                   .values_list('assessed_id', flat=True)
+                   .distinct())
+
+    def get_assessed(self, assessed_id):
+        return self.assessed.get(_to_int(assessed_id))
+
+    def get_chosen_assessment(self, chosen_assessment_id):
+        return self.chosen_assessments.get(_to_int(chosen_assessment_id))
+
+    def has_team(self, team_id):
+        return _to_int(team_id) in self.existing_team_ids
+
+    def is_connected_to(self, assessed):
+        return self.access.is_connected_to(assessed.get_user_id())
+
+    def has_assessment_access(self, assessed, top_category):
+        """ Same as `Assessor.has_assessment_access` """
+        if self.assessor.id == assessed.id:
+            return True
+        return top_category is not None and self.access.has_top_category_access(assessed.id, top_category.id)
+
+    def was_assessed_recently(self, assessed):
+        return assessed.id in self.recently_assessed_ids
+
+    def is_relationship_type_valid(self, assessment, assessed):
+        """ Same as `Assessment.is_relationship_type_valid`, the relationship type of every assessed computed once """
+        if assessed.id not in self.relationship_types:
+            self.relationship_types[assessed.id] = get_relationship_type(assessed, self.assessor)
+        relationship_type = self.relationship_types[assessed.id]
+        return relationship_type is not None and \
+            self.reference_data.is_relationship_type_valid(assessment, relationship_type)
+
+
+class ChosenAssessmentBulkCreateSerializer(serializers.ListSerializer):
+    """
+    Insert a list of assessed's assessments at once.
+    """
+
+    def create(self, validated_data):
+        localized_db = self.context['country']
+        assessor = self.context['user'].get_assessor()
+        chosen_assessments = [ChosenAssessment(assessor_id=assessor.id,
+                                               assessed_id=data.get('assessed_id'),
+                                               team_id=data.get('team_id'),
+                                               assessment_id=data.get('assessment_id'),
+                                               value=data.get('value'))
+                              for data in validated_data]
+
+        # bulk_create doesn't send post_save: the team assessment rollups are refreshed here
+        with transaction.atomic(using=localized_db):
+            ChosenAssessment.objects.using(localized_db).bulk_create(chosen_assessments)
+            refresh_team_assessment_rollups(localized_db, chosen_assessments)
+        return chosen_assessments
+
+
+class ChosenAssessmentBulkUpdateSerializer(serializers.ListSerializer):
+    """
+    Update the values of a list of assessed's assessments in a single query.
+    """
+
+    def create(self, validated_data):
+        localized_db = self.context['country']
+        batch = self.context.get('batch') or ChosenAssessmentBatch(self.context['user'], localized_db, validated_data,
+                                                                   assessed_id=self.context['assessed_id'])
+        instances = []
+        for data in validated_data:
+            instance = batch.get_chosen_assessment(data.get('id'))
+            instance.value = data.get('value', instance.value)
+            instances.append(instance)
+        if not instances:
+            return instances
+
+        # An assessment listed twice takes its last value, like when saved one by one
+        values = {instance.id: instance.value for instance in instances}
+        with transaction.atomic(using=localized_db):
+            ChosenAssessment.objects.using(localized_db) \
+                .filter(id__in=values) \
+                .update(value=Case(*[When(id=pk, then=Value(value)) for pk, value in values.items()],
+                                   output_field=models.DecimalField(max_digits=15, decimal_places=6)))
+            refresh_team_assessment_rollups(localized_db, instances)
+        return instances
+
+
 class ChosenAssessmentCreateSerializer(serializers.ModelSerializer):
     """
     Serializer to create assessed's assessments.
+    Items validated together share the `context['batch']`, a `ChosenAssessmentBatch` of all the items.
     """
     assessment_id = serializers.IntegerField(required=False)
     value = serializers.DecimalField(max_digits=15, decimal_places=6, required=False)
@@ -223,6 +446,7 @@ class ChosenAssessmentCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChosenAssessment
         fields = ('id', 'team_id', 'assessed_id', 'assessor_id', 'assessment_id', 'value', 'date_assessed')
+        list_serializer_class = ChosenAssessmentBulkCreateSerializer
 
     def create(self, validated_data):
         chosen_assessment = ChosenAssessment(assessor_id=self.assessor.id,
@@ -231,7 +455,9 @@ class ChosenAssessmentCreateSerializer(serializers.ModelSerializer):
                                              assessment_id=validated_data.get('assessment_id'),
                                              value=validated_data.get('value'))
 
-        chosen_assessment.save(using=self.localized_db)
+        # Along with the team assessment rollup, see multidb_account.assessment_rollup
+        with transaction.atomic(using=self.localized_db):
+            chosen_assessment.save(using=self.localized_db)
         return chosen_assessment
 
     def validate(self, data):
@@ -241,54 +467,46 @@ class ChosenAssessmentCreateSerializer(serializers.ModelSerializer):
 
         data['assessed_id'] = self.context['assessed_id'] if self.context['assessed_id'] else data.get('assessed_id')
         data['team_id'] = self.context['team_id'] if self.context['team_id'] else data.get('team_id')
+        batch = self.context.get('batch') or ChosenAssessmentBatch(self.context['user'], self.localized_db, [data])
 
-        try:
-            assessed = Assessed.objects.using(self.localized_db).get(id=data.get('assessed_id'))
-            data['assessed_id'] = assessed.id
-        except Assessed.DoesNotExist:
+        assessed = batch.get_assessed(data.get('assessed_id'))
+        if assessed is None:
             raise serializers.ValidationError(_("Invalid"))
+        data['assessed_id'] = assessed.id
 
         # validate if the athlete is able to assess the coach according to `settings.ATHLETE_COACH_ASSESSMENT_TIMEOUT`
         if self.assessor.get_user_type() == USER_TYPE_ATHLETE and \
                 self.assessor.get_user_id() != assessed.get_user_id() and \
                 assessed.coach is not None:
 
-            timeout_dt = timezone.now() - timedelta(seconds=django_settings.ATHLETE_COACH_ASSESSMENT_TIMEOUT)
-            too_soon = assessed.assessments.using(self.localized_db) \
-                .filter(chosenassessment__date_assessed__gte=timeout_dt).exists()
-
-            if too_soon:
+            if batch.was_assessed_recently(assessed):
                 raise serializers.ValidationError(
                     {"assessed_id": _("You can only assess a coach's leadership skills once every month")})
 
             if self.context.get('dry_run'):
                 return data
 
-        try:
-            assessment = Assessment.objects.using(self.localized_db).get(id=data.get('assessment_id'))
-        except Assessment.DoesNotExist:
+        assessment = batch.reference_data.get_assessment(data.get('assessment_id'))
+        if assessment is None:
             raise serializers.ValidationError(_("Invalid"))
 
         if data['team_id']:
-            try:
-                data['team_id'] = Team.objects.using(self.localized_db).get(id=data.get('team_id')).id
-            except Team.DoesNotExist:
+            if not batch.has_team(data['team_id']):
                 raise serializers.ValidationError({"team_id": _("Unknown team")})
         else:
             data['team_id'] = None
 
         # validate if assessed and assessor are connected.
         # self.context['user'] is the assessor
-        if self.assessor.get_user_id() != assessed.get_user_id() and not \
-                self.context['user'].is_connected_to(assessed.get_user_id()):
+        if self.assessor.get_user_id() != assessed.get_user_id() and not batch.is_connected_to(assessed):
             raise serializers.ValidationError({"error": _("Users are not connected")})
 
         # validate if an assessor can access this assessment.
-        if not self.assessor.has_assessment_access(assessed, assessment.get_top_category()):
+        if not batch.has_assessment_access(assessed, assessment.get_top_category()):
             raise serializers.ValidationError({"assessment_id": _("Assessor is not allowed to access this assessment")})
 
         # validate if the assessment relationship type is valid.
-        if not assessment.is_relationship_type_valid(assessed, self.assessor):
+        if not batch.is_relationship_type_valid(assessment, assessed):
             raise serializers.ValidationError({"error": _("Relationship can't be accessed by the current assessor")})
 
         # validate the value format
@@ -301,6 +519,7 @@ class ChosenAssessmentCreateSerializer(serializers.ModelSerializer):
 class ChosenAssessmentUpdateSerializer(serializers.Serializer):
     """
     Serializer to update assessed's assessments.
+    Items validated together share the `context['batch']`, a `ChosenAssessmentBatch` of all the items.
     """
     id = serializers.IntegerField(required=True)
     value = serializers.DecimalField(max_digits=15, decimal_places=6, required=True)
@@ -311,6 +530,9 @@ class ChosenAssessmentUpdateSerializer(serializers.Serializer):
     assessed_id = serializers.IntegerField(read_only=True)
     date_assessed = serializers.DateTimeField(read_only=True)
 
+    class Meta:
+        list_serializer_class = ChosenAssessmentBulkUpdateSerializer
+
     def create(self, validated_data):
         # create is called here because we don't pass an instance but a list of instances, that the only way for now
         # to update a list of instances at the same time
@@ -318,42 +540,45 @@ class ChosenAssessmentUpdateSerializer(serializers.Serializer):
 
         instance = ChosenAssessment.objects.using(self.localized_db).get(id=validated_data.get('id'))
         instance.value = validated_data.get('value', instance.value)
-        instance.save()
+        # Along with the team assessment rollup, see multidb_account.assessment_rollup
+        with transaction.atomic(using=self.localized_db):
+            instance.save()
         return instance
 
     def validate(self, data):
         self.assessor = self.context['user'].get_assessor()
         self.localized_db = self.context['country']
         assessed_id = self.context['assessed_id']
+        batch = self.context.get('batch') or ChosenAssessmentBatch(self.context['user'], self.localized_db, [data],
+                                                                   assessed_id=assessed_id)
 
-        try:
-            self.assessed = Assessed.objects.using(self.localized_db).get(id=assessed_id)
-        except Assessed.DoesNotExist:
+        self.assessed = batch.get_assessed(assessed_id)
+        if self.assessed is None:
             raise serializers.ValidationError(_("Invalid"))
 
-        try:
-            chosen_assessment = ChosenAssessment.objects.using(self.localized_db).get(id=data.get('id'))
-        except ChosenAssessment.DoesNotExist:
+        chosen_assessment = batch.get_chosen_assessment(data.get('id'))
+        if chosen_assessment is None:
             raise serializers.ValidationError(_("Invalid"))
+        assessment = batch.reference_data.get_assessment(chosen_assessment.assessment_id) or \
+            chosen_assessment.assessment
 
         # validate if assessed and assessor are connected.
         # self.context['user'] is the assessor
-        if self.assessor.get_user_id() != self.assessed.get_user_id() and not \
-                self.context['user'].is_connected_to(self.assessed.get_user_id()):
+        if self.assessor.get_user_id() != self.assessed.get_user_id() and not batch.is_connected_to(self.assessed):
             raise serializers.ValidationError({"error": _("Users are not connected")})
 
         # validate if an assessor can access this assessment.
-        if not self.assessor.has_assessment_access(self.assessed, chosen_assessment.assessment.get_top_category()):
+        if not batch.has_assessment_access(self.assessed, assessment.get_top_category()):
             raise serializers.ValidationError({"error": _("Assessor is not allowed to access this assessment")})
 
         # validate if the assessment relationship type is valid.
-        if not chosen_assessment.assessment.is_relationship_type_valid(self.assessed, self.assessor):
+        if not batch.is_relationship_type_valid(assessment, self.assessed):
             raise serializers.ValidationError({"error": _("Relationship can't be accessed by the current assessor")})
 
         # validate the value format
-        if not bool(re.match(chosen_assessment.assessment.format.validation_regex, str(data.get('value')))):
+        if not bool(re.match(assessment.format.validation_regex, str(data.get('value')))):
             raise serializers.ValidationError({"error": _("Wrong value format. {}").
-                                              format(chosen_assessment.assessment.format.description)})
+                                              format(assessment.format.description)})
 
         return data
 
@@ -385,19 +610,18 @@ class TeamChosenAssessmentListSerializer(serializers.ModelSerializer):
 # ------------------------------AssessmentTopCategoryPermission-----------------------------------------------
 
 
-class AssessmentTopCategoryPermissionListSerializer(serializers.ModelSerializer):
+class AssessmentTopCategoryPermissionListSerializer(serializers.Serializer):
     """
-    Serializer to list assessed's assessment permissions.
+    Serializer to list assessed's assessment permissions, as built by `AssessmentAccess.get_permissions`.
     """
-    assessment_top_category_name = serializers.CharField(source='assessment_top_category.name', read_only=True)
-
-    class Meta:
-        model = AssessmentTopCategoryPermission
-        fields = ('id', 'assessed_id', 'assessor_id', 'assessment_top_category_id', 'assessment_top_category_name',
-                  'assessor_has_access')
+    assessed_id = serializers.IntegerField(read_only=True)
+    assessor_id = serializers.IntegerField(read_only=True)
+    assessment_top_category_id = serializers.IntegerField(read_only=True)
+    assessment_top_category_name = serializers.CharField(read_only=True)
+    assessor_has_access = serializers.BooleanField(read_only=True)
 
 
-class AssessmentTopCategoryPermissionUpdateSerializer(serializers.ModelSerializer):
+class AssessmentTopCategoryPermissionUpdateSerializer(serializers.Serializer):
     """
     Serializer to update assessed's assessment permissions.
     """
@@ -406,12 +630,7 @@ class AssessmentTopCategoryPermissionUpdateSerializer(serializers.ModelSerialize
     assessor_has_access = serializers.BooleanField(required=True)
 
     assessed_id = serializers.IntegerField(read_only=True)
-    assessment_top_category_name = serializers.CharField(source='assessment_top_category.name', read_only=True)
-
-    class Meta:
-        model = AssessmentTopCategoryPermission
-        fields = ('id', 'assessed_id', 'assessor_id', 'assessment_top_category_id', 'assessment_top_category_name',
-                  'assessor_has_access')
+    assessment_top_category_name = serializers.CharField(read_only=True)
 
     def create(self, validated_data):
         # create is called here because we don't pass an instance but a list of instances, that the only way for now
@@ -419,16 +638,15 @@ class AssessmentTopCategoryPermissionUpdateSerializer(serializers.ModelSerialize
         # TODO: This should be refactored in the futur
 
         self.localized_db = self.context['country']
-        assessed_id = self.context['assessed_id']
+        assessed_id = int(self.context['assessed_id'])
+        top_category = self.get_top_category(validated_data.get('assessment_top_category_id'))
 
-        instance = AssessmentTopCategoryPermission.objects. \
-            using(self.localized_db).get(assessed_id=assessed_id,
-                                         assessor_id=validated_data.get('assessor_id'),
-                                         assessment_top_category_id=validated_data.get('assessment_top_category_id'))
+        AssessmentAccess.set_access(self.localized_db, assessed_id, validated_data.get('assessor_id'),
+                                    top_category.id, validated_data.get('assessor_has_access'))
+        return dict(validated_data, assessed_id=assessed_id, assessment_top_category_name=top_category.name)
 
-        instance.assessor_has_access = validated_data.get('assessor_has_access', instance.assessor_has_access)
-        instance.save()
-        return instance
+    def get_top_category(self, top_category_id):
+        return get_reference_data(self.localized_db).top_categories.get(top_category_id)
 
     def validate(self, data):
         self.localized_db = self.context['country']
@@ -440,12 +658,10 @@ class AssessmentTopCategoryPermissionUpdateSerializer(serializers.ModelSerialize
             raise serializers.ValidationError({"assessor_id": _("Unknown assessor id: {}".
                                                                 format(data.get('assessor_id')))})
 
-        try:
-            AssessmentTopCategoryPermission.objects. \
-                using(self.localized_db).get(assessed_id=assessed_id,
-                                             assessor_id=data.get('assessor_id'),
-                                             assessment_top_category_id=data.get('assessment_top_category_id'))
-        except AssessmentTopCategoryPermission.DoesNotExist:
+        has_access_pair = AssessmentAccess.objects.using(self.localized_db) \
+            .filter(assessed_id=assessed_id, assessor_id=data.get('assessor_id')) \
+            .exists()
+        if not has_access_pair or self.get_top_category(data.get('assessment_top_category_id')) is None:
             raise serializers.ValidationError({"assessment_top_category_id":
                                                    _("Unknown Assessment Top Category Permission id: {}".
                                                      format(data.get('assessment_top_category_id')))})
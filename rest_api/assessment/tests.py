@@ -3,10 +3,15 @@ from unittest import mock
 
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
 from django.core.urlresolvers import reverse_lazy
 from rest_framework import status
 
-from multidb_account.assessment.models import AssessmentTopCategory, ChosenAssessment, Assessment
+from multidb_account.assessment.models import AssessmentTopCategory, ChosenAssessment, Assessment, \
+    AssessmentTreeOrganisationCount, AssessmentAccess
+from multidb_account.assessment_norms import AssessmentNorms
+from multidb_account.assessment_tree import get_top_subcategory_id
 from multidb_account.constants import USER_TYPE_ORG, USER_TYPE_ATHLETE
 from multidb_account.team.models import Team
 from rest_api.tests import ApiTests
@@ -47,6 +52,30 @@ class AssessmentTests(ApiTests):
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertEqual(response.data.get('assessor_has_access'), True)
 
+    def test_new_top_category_is_denied_without_new_permissions(self):
+        auth = 'JWT {}'.format(self.athlete_ca.token)
+        localized_db = self.athlete_ca.country
+
+        self.invite_and_confirm(self.athlete_ca, self.coach_ca)
+        accesses = AssessmentAccess.objects.using(localized_db).filter(assessed_id=self.athlete_ca.id)
+        self.assertEqual(accesses.count(), 1)
+
+        top_category = AssessmentTopCategory.objects.using(localized_db).create(name='New top category')
+        self.assertEqual(accesses.count(), 1)
+
+        url = reverse_lazy('rest_api:assessment-permissions', kwargs={'uid': self.athlete_ca.id})
+        response = self.client.get(url, {'assessor_id': self.coach_ca.id, 'top_category_ids': top_category.id},
+                                   format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0].get('assessor_has_access'), False)
+
+        response = self.client.put(url, {'assessor_id': self.coach_ca.id,
+                                         'assessment_top_category_id': top_category.id,
+                                         'assessor_has_access': True}, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(top_category.id, accesses.get().top_category_ids)
+
     def test_create_list_athlete_self_assessments(self):
         auth = 'JWT {}'.format(self.athlete_ca.token)
         url = reverse_lazy('rest_api:chosen-assessments', kwargs={'uid': self.athlete_ca.id})
@@ -87,6 +116,115 @@ class AssessmentTests(ApiTests):
             self.assertEqual(int(float(assessment.get('value'))), int(float(data[inc].get('value'))))
             inc += 1
 
+    def test_athlete_assessments_tree_query_count_is_flat(self):
+        auth = 'JWT {}'.format(self.athlete_ca.token)
+        url = reverse_lazy('rest_api:chosen-assessments', kwargs={'uid': self.athlete_ca.id})
+
+        def get_tree():
+            with CaptureQueriesContext(connections[self.athlete_ca.country]) as queries:
+                response = self.client.get(url, {'rendering': 'tree'}, format='json', HTTP_AUTHORIZATION=auth)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return self._get_chosen_assessments_from_tree(response.data), len(queries)
+
+        # Load the reference data
+        get_tree()
+
+        data = [{"assessment_id": 88, "value": 2}]
+        response = self.client.post(url, data, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        chosen_assessments, query_count = get_tree()
+        self.assertEqual([x['assessment_id'] for x in chosen_assessments], [88])
+
+        data = [{"assessment_id": 133, "value": 1}, {"assessment_id": 17, "value": 3}, {"assessment_id": 88, "value": 4}]
+        response = self.client.post(url, data, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        chosen_assessments, more_query_count = get_tree()
+        self.assertEqual(sorted(x['assessment_id'] for x in chosen_assessments), [17, 88, 88, 133])
+        self.assertEqual(more_query_count, query_count)
+
+    def _get_chosen_assessments_from_tree(self, data):
+        chosen_assessments = []
+        for item in data:
+            if isinstance(item, list):
+                chosen_assessments.extend(item)
+            else:
+                chosen_assessments.extend(self._get_chosen_assessments_from_tree(item['childs']))
+        return chosen_assessments
+
+    def test_athlete_assessments_history(self):
+        localized_db = self.athlete_ca.country
+        auth = 'JWT {}'.format(self.athlete_ca.token)
+        url = reverse_lazy('rest_api:chosen-assessments-history', kwargs={'uid': self.athlete_ca.id})
+
+        now = timezone.now().replace(hour=12)
+        for days, value in ((2, 1), (2, 3), (1, 5), (0, 2), (0, 4)):
+            ChosenAssessment.objects.using(localized_db).create(
+                assessed_id=self.athlete_ca.id, assessor_id=self.athlete_ca.id, assessment_id=88, value=value,
+                date_assessed=now - timedelta(days=days, minutes=value))
+
+        response = self.client.get(url, {'bucket': 'day'}, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([x['assessment_id'] for x in response.data], [88])
+        points = response.data[0]['points']
+        self.assertEqual([(p['count'], float(p['min']), float(p['max']), float(p['mean']), float(p['last']))
+                          for p in points],
+                         [(2, 1, 3, 2, 1), (1, 5, 5, 5, 5), (2, 2, 4, 3, 2)])
+
+        # The filters of the assessments list still apply
+        response = self.client.get(url, {'assessment_id': 17}, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.data, [])
+
+        response = self.client.get(url, {'points': 2}, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(url, {'points': 3, 'bucket': 'week'}, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sum(p['count'] for p in response.data[0]['points']), 5)
+
+    def test_athlete_assessment_percentiles(self):
+        localized_db = self.athlete_ca.country
+        response = self.create_team(self.coach_ca)
+        team = Team.objects.using(localized_db).get(id=response.data['id'])
+
+        athletes = [self.athlete_ca] + [self.create_random_user(country=localized_db, user_type=USER_TYPE_ATHLETE)
+                                        for _ in range(3)]
+        for athlete, values in zip(athletes, ((4, 2), (1,), (3,), (5,))):
+            if athlete != athletes[-1]:
+                team.athletes.add(athlete.athleteuser)
+            for value in values:
+                ChosenAssessment.objects.using(localized_db).create(
+                    assessed_id=athlete.id, assessor_id=athlete.id, assessment_id=88, value=value)
+
+        auth = 'JWT {}'.format(self.athlete_ca.token)
+        url = reverse_lazy('rest_api:chosen-assessments-percentiles', kwargs={'uid': self.athlete_ca.id})
+        response = self.client.get(url, {'assessment_id': 88}, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['value'], 2)
+        cohorts = {(x['type'], x['id']): x for x in response.data['cohorts']}
+        # Latest values: 2 among 1, 3 (and 5 for every athlete)
+        self.assertEqual((cohorts['all', None]['size'], cohorts['all', None]['percentile']), (4, 37.5))
+        self.assertEqual((cohorts['team', team.id]['size'], cohorts['team', team.id]['percentile']), (3, 50))
+
+        response = self.client.get(url, {'assessment_id': 88, 'reduction': 'max'}, format='json',
+                                   HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.data['value'], 4)
+
+    def test_assessment_norms_refresh_reads_late_commits(self):
+        localized_db = self.athlete_ca.country
+        ChosenAssessment.objects.using(localized_db).create(
+            assessed_id=self.athlete_ca.id, assessor_id=self.athlete_ca.id, assessment_id=88, value=1)
+        norms = AssessmentNorms(localized_db)
+        self.assertEqual(len(norms.get_cohort_values(88)), 1)
+
+        # Committed after a greater id was loaded
+        athlete = self.create_random_user(country=localized_db, user_type=USER_TYPE_ATHLETE)
+        late = ChosenAssessment.objects.using(localized_db).create(
+            assessed_id=athlete.id, assessor_id=athlete.id, assessment_id=88, value=2)
+        norms.watermark = late.id + 1
+        norms = AssessmentNorms(localized_db, previous=norms)
+        self.assertEqual(norms.get_cohort_values(88).tolist(), [1, 2])
+        self.assertEqual(len(norms.columns[88]['id']), 2)
+
     def test_create_update_athlete_self_assessments(self):
         auth = 'JWT {}'.format(self.athlete_ca.token)
         url = reverse_lazy('rest_api:chosen-assessments', kwargs={'uid': self.athlete_ca.id})
@@ -567,6 +705,17 @@ class PrivateAssessmentTests(ApiTests):
         got_public_assessment_ids = {x['id'] for x in got_assessments if not x['is_private']}
         self.assertLess(got_public_assessment_ids, got_assessment_ids)
 
+    def test_assessment_tree_follows_org_own_assessments(self):
+        org = self._create_org(own_assessments_only=False)
+        private_assessment = self._make_private_assessment(org)
+        org_counts = AssessmentTreeOrganisationCount.objects.using('us').filter(
+            top_subcategory_id=get_top_subcategory_id('us', private_assessment.parent_sub_category_id),
+            organisation=org)
+        self.assertEqual(org_counts.get().count, 1)
+
+        org.own_assessments.remove(private_assessment)
+        self.assertFalse(org_counts.exists())
+
     @staticmethod
     def _make_private_assessment(owner, localized_db='us'):
         """ `owner` can be either `Team` obj or `Organisation` """
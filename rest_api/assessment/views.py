@@ -1,23 +1,34 @@
 from django.contrib.auth import get_user_model
+from django.db.models import BooleanField, Q
 from django.http import Http404
 from django.utils.dateparse import parse_date
+from django.utils.functional import cached_property
 from rest_framework import status
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from multidb_account.assessment.models import Assessed, AssessmentTopCategory, ChosenAssessment, AssessmentSubCategory
+from multidb_account.assessment.models import Assessed, ChosenAssessment
+from multidb_account.constants import USER_TYPE_ATHLETE, USER_TYPE_COACH
+from multidb_account.assessment_history import downsample_assessment_history, get_assessment_history
+from multidb_account.assessment_norms import get_assessment_norms
+from multidb_account.assessment_rollup import get_team_assessment_averages
 from multidb_account.assessment_tree import get_assessment_tree_filtered_by_org_own_assessments
+from multidb_account.identity_map import get_object
+from multidb_account.reference_data.cache import get_reference_data
+from multidb_account.replicas import get_read_database
 from multidb_account.team.models import Team
 from multidb_account.user.models import Organisation
+from rest_api.pagination import PaginationMixin
 from rest_api.team.permissions import IsCoachTeamMember
 from .permissions import IsAuthenticatedAndConnected, IsAuthenticatedAndHasOwnAssessmentPermission, IsTeamMember
-from .serializers import AssessmentsTreeListSerializer, \
+from .serializers import AssessmentsTreeListSerializer, ChosenAssessmentBatch, \
     ChosenAssessmentCreateSerializer, ChosenAssessmentTreeListSerializer, \
     ChosenAssessmentListSerializer, AssessmentTopCategoryPermissionUpdateSerializer, \
     AssessmentTopCategoryPermissionListSerializer, ChosenAssessmentUpdateSerializer, \
-    TeamChosenAssessmentListSerializer, AssessedListSerializer
+    TeamChosenAssessmentListSerializer, AssessedListSerializer, ChosenAssessmentHistoryQuerySerializer, \
+    ChosenAssessmentHistorySerializer, ChosenAssessmentPercentilesQuerySerializer
 
 UserModel = get_user_model()
 
@@ -30,29 +41,50 @@ class AssessmentList(ListAPIView):
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
-        qs = AssessmentTopCategory.objects.using(self.request.user.country).all().order_by('id')
+        """ Top categories of the tree, from the reference data """
+        top_category_ids = {x['topcat_id'] for x in self.tree}
 
-        top_category_ids = self.request.query_params.get('top_category_ids', None)
-        if top_category_ids is not None:
-            top_category_ids = [int(x) for x in top_category_ids.split(',')]
-            qs = qs.filter(pk__in=top_category_ids)
+        requested_top_category_ids = self.request.query_params.get('top_category_ids', None)
+        if requested_top_category_ids is not None:
+            top_category_ids &= {int(x) for x in requested_top_category_ids.split(',')}
+
+        top_categories = get_reference_data(self.request.user.country).top_categories
+        return [top_categories[pk] for pk in sorted(top_category_ids) if pk in top_categories]
 
-        return self._filter_by_own_assessments_only_organisations(qs)
+    @cached_property
+    def tree(self):
+        return self._filter_by_own_assessments_only_organisations()
 
-    def _filter_by_own_assessments_only_organisations(self, qs):
+    def _filter_by_own_assessments_only_organisations(self):
         """
         If the user belongs to an Organisation with `.own_assessments_only = True`,
-        filter the QuerySet by `Organisation.own_assessments`
+        filter the tree by `Organisation.own_assessments`
         """
         user = self.request.user
 
         private_org_ids, our_org_ids = self._get_org_ids()
-        tree = get_assessment_tree_filtered_by_org_own_assessments(user.country, private_org_ids, our_org_ids)
+        return get_assessment_tree_filtered_by_org_own_assessments(get_read_database(user.country),
+                                                                   private_org_ids, our_org_ids)
+
+    def _get_visible_mask(self, taxonomy, user_from_own_assessments_only_org):
+        """ Bitset of the assessments visible to the user, see `AssessmentTaxonomy.get_visible_mask()` """
+        user = self.request.user
+
+        organisations = Q(members=user) | Q(login_users=user)
+        if user.user_type == USER_TYPE_ATHLETE:
+            organisations |= Q(teams__athletes=user.athleteuser)
+            teams = Team.objects.filter(athletes=user.athleteuser)
+        elif user.user_type == USER_TYPE_COACH:
+            organisations |= Q(teams__coaches=user.coachuser)
+            teams = Team.objects.filter(Q(coaches=user.coachuser) | Q(owner=user))
+        else:
+            teams = Team.objects.none()
 
-        top_ass_ids = {x['topcat_id'] for x in tree}
-        qs = qs.filter(id__in=top_ass_ids)
-        qs._cached_tree = tree
-        return qs
+        return taxonomy.get_visible_mask(
+            organisation_ids=set(Organisation.objects.filter(organisations).values_list('id', flat=True)),
+            team_ids=set(teams.values_list('id', flat=True)),
+            own_assessments_only=user_from_own_assessments_only_org,
+        )
 
     def _get_org_ids(self):
         """ Get list of user's orgs """
@@ -89,30 +121,27 @@ class AssessmentList(ListAPIView):
                 hasattr(request.user.typeduser, 'team_membership')
                 and request.user.typeduser.team_membership.filter(organisation__own_assessments_only=True).exists()
         )
-        qs = self.get_queryset()
-        tree = qs._cached_tree
-        subcat_ids = {x['subcat_id'] for x in tree}
-        extra_subcat_ids = AssessmentSubCategory.objects.using(request.user.country).filter(id__in=subcat_ids)
-        subcat_ids.update({x.parent_sub_category_id for x in extra_subcat_ids})
+        reference_data = get_reference_data(request.user.country)
+        subcat_ids = {x['subcat_id'] for x in self.tree}
+        sub_categories = reference_data.sub_categories
+        subcat_ids.update({sub_categories[x].parent_sub_category_id for x in subcat_ids if x in sub_categories})
         ctx = {
             'request': request,
-            'user_from_own_assessments_only_org': user_from_own_assessments_only_org,
+            'taxonomy': reference_data.taxonomy,
             'subcat_ids': subcat_ids,
+            'visible_mask': self._get_visible_mask(reference_data.taxonomy, user_from_own_assessments_only_org),
         }
-        serializer = AssessmentsTreeListSerializer(qs, many=True, context=ctx)
+        serializer = AssessmentsTreeListSerializer(self.get_queryset(), many=True, context=ctx)
         return Response(serializer.data)
 
 
-class ChosenAssessmentListUpdateCreate(APIView):
+class ChosenAssessmentQuerysetMixin(object):
     """
-    Add one or multiple assessment(s) to an assessed.
-    List assessed's assessments.
+    Assessed's assessments, filtered by the query parameters.
     """
 
-    permission_classes = (IsAuthenticatedAndConnected,)
-
     def get_queryset(self):
-        assessed = Assessed.objects.using(self.request.user.country).filter(id=self.kwargs['uid']).last()
+        assessed = Assessed.objects.filter(id=self.kwargs['uid']).last()
         if assessed is None:
             return ChosenAssessment.objects.none()
         queryset = assessed.chosenassessment_set.all().order_by('id')
@@ -143,14 +172,23 @@ class ChosenAssessmentListUpdateCreate(APIView):
 
         return queryset
 
+
+class ChosenAssessmentListUpdateCreate(ChosenAssessmentQuerysetMixin, PaginationMixin, APIView):
+    """
+    Add one or multiple assessment(s) to an assessed.
+    List assessed's assessments.
+    """
+
+    permission_classes = (IsAuthenticatedAndConnected,)
+
     def get_top_categories(self):
-        top_categories = AssessmentTopCategory.objects.using(self.request.user.country).all().order_by('id')
+        top_categories = get_reference_data(self.request.user.country).top_categories.values()
 
         top_category_ids = self.request.query_params.get('top_category_ids', None)
         if top_category_ids is not None:
-            top_category_ids = [int(x) for x in top_category_ids.split(',')]
-            top_categories = top_categories.filter(pk__in=top_category_ids)
-        return top_categories
+            top_category_ids = {int(x) for x in top_category_ids.split(',')}
+            top_categories = [top_category for top_category in top_categories if top_category.id in top_category_ids]
+        return list(top_categories)
 
     def get(self, request, uid, format=None):
         """
@@ -160,14 +198,19 @@ class ChosenAssessmentListUpdateCreate(APIView):
 
         rendering = self.request.query_params.get('rendering', None)
         if rendering == "flat":
-            return Response(ChosenAssessmentListSerializer(queryset, many=True,
-                                                           context={'assessed_id': uid,
-                                                                    'country': request.user.country,
-                                                                    'user': request.user}).data)
+            # A page of the assessments at a time, the tree rendering nests all of them
+            chosen_assessments = self.paginate_queryset(queryset)
+            return self.get_paginated_response(ChosenAssessmentListSerializer(chosen_assessments, many=True,
+                                                                              context={'assessed_id': uid,
+                                                                                       'country': request.user.country,
+                                                                                       'user': request.user}).data)
         if rendering == "tree" or rendering is None:
             top_categories = self.get_top_categories()
-            return Response(ChosenAssessmentTreeListSerializer(top_categories, many=True,
-                                                               context={'queryset': queryset}).data)
+            ctx = {
+                'queryset': queryset,
+                'taxonomy': get_reference_data(request.user.country).taxonomy,
+            }
+            return Response(ChosenAssessmentTreeListSerializer(top_categories, many=True, context=ctx).data)
 
     def post(self, request, uid):
         """
@@ -184,6 +227,7 @@ class ChosenAssessmentListUpdateCreate(APIView):
             'country': request.user.country,
             'user': request.user,
             'dry_run': dry_run,
+            'batch': ChosenAssessmentBatch(request.user, request.user.country, request.data, assessed_id=uid),
         }
 
         for assessment in request.data:
@@ -227,11 +271,16 @@ class ChosenAssessmentListUpdateCreate(APIView):
         valid_data = []
         rejected_data = []
         error_found = False
+
+        context = {
+            'assessed_id': uid,
+            'country': request.user.country,
+            'user': request.user,
+            'batch': ChosenAssessmentBatch(request.user, request.user.country, request.data, assessed_id=uid),
+        }
+
         for assessment in request.data:
-            validation_serializer = ChosenAssessmentUpdateSerializer(data=assessment,
-                                                                     context={'assessed_id': uid,
-                                                                              'country': request.user.country,
-                                                                              'user': request.user})
+            validation_serializer = ChosenAssessmentUpdateSerializer(data=assessment, context=context)
             if validation_serializer.is_valid():
                 valid_data.append(validation_serializer.data)
             else:
@@ -249,68 +298,128 @@ class ChosenAssessmentListUpdateCreate(APIView):
             return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
         else:
             serializer = ChosenAssessmentUpdateSerializer(data=valid_data, many=isinstance(valid_data, list),
-                                                          context={'assessed_id': uid,
-                                                                   'country': request.user.country,
-                                                                   'user': request.user})
+                                                          context=context)
             if serializer.is_valid():
                 serializer.save()
             return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class ChosenAssessmentHistory(ChosenAssessmentQuerysetMixin, APIView):
+    """
+    List the history of assessed's assessments, aggregated by day, week or month.
+    """
+
+    permission_classes = (IsAuthenticatedAndConnected,)
+
+    def get(self, request, uid, format=None):
+        """
+        List user's assessments history: the min, max, mean, last value and count of every bucket of every assessment,
+        downsampled to `points` buckets when given.
+        """
+        query_serializer = ChosenAssessmentHistoryQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        points = query_serializer.validated_data.get('points')
+
+        history = get_assessment_history(self.get_queryset(), query_serializer.validated_data['bucket'])
+        if points is not None:
+            history = {assessment_id: downsample_assessment_history(series, points)
+                       for assessment_id, series in history.items()}
+
+        return Response(ChosenAssessmentHistorySerializer(sorted(history.items()), many=True,
+                                                          context={'country': request.user.country}).data)
+
+
+class ChosenAssessmentPercentiles(APIView):
+    """
+    Rank an assessed's assessment value among every athlete, and the athletes of its teams, organisations and sports.
+    """
+
+    permission_classes = (IsAuthenticatedAndConnected,)
+
+    def get(self, request, uid, format=None):
+        query_serializer = ChosenAssessmentPercentilesQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        assessment_id = query_serializer.validated_data['assessment_id']
+        reduction = query_serializer.validated_data['reduction']
+
+        norms = get_assessment_norms(request.user.country)
+        value = norms.get_user_value(assessment_id, int(uid), reduction)
+        cohorts = []
+        for cohort_type, cohort_id in [(None, None)] + norms.user_cohorts.get(int(uid), []):
+            cohort = (cohort_type, cohort_id) if cohort_type else None
+            cohorts.append({
+                'type': cohort_type or 'all',
+                'id': cohort_id,
+                'size': len(norms.get_cohort_values(assessment_id, cohort, reduction)),
+                'percentile': norms.get_percentile(assessment_id, value, cohort, reduction),
+            })
+
+        return Response({'assessment_id': assessment_id, 'value': value, 'cohorts': cohorts})
+
+
 class TeamAssessmentsAverage(APIView):
     """ List team assessments average values per team """
 
     permission_classes = (IsCoachTeamMember,)
 
-    def get_queryset(self):
-        return ChosenAssessment.objects.using(self.request.user.country) \
-            .filter(team_id=self.kwargs['tid']) \
-            .order_by('id')
-
     def get_top_categories(self):
-        return AssessmentTopCategory.objects.using(self.request.user.country).all().order_by('id')
+        return list(get_reference_data(self.request.user.country).top_categories.values())
 
     def get(self, request, tid, format=None):
         top_categories = self.get_top_categories()
         ctx = {
-            'queryset': self.get_queryset(),
-            'get_averages': True,
+            'taxonomy': get_reference_data(request.user.country).taxonomy,
+            'averages': get_team_assessment_averages(tid),
         }
         return Response(ChosenAssessmentTreeListSerializer(top_categories, many=True, context=ctx).data)
 
 
-class AssessmentTopCategoryPermission(APIView):
+class AssessmentTopCategoryPermission(PaginationMixin, APIView):
     """
     Update/List assessed's assessment permissions
     """
 
     permission_classes = (IsAuthenticatedAndHasOwnAssessmentPermission,)
+    pagination_ordering = 'assessor_id'
 
-    def get_queryset(self):
-        assessed = self.request.user.get_assessed()
-        queryset = assessed.assessmenttopcategorypermission_set.all().order_by('id')
+    @cached_property
+    def top_categories(self):
+        top_categories = get_reference_data(self.request.user.country).top_categories.values()
 
         top_category_ids = self.request.query_params.get('top_category_ids', None)
         if top_category_ids is not None:
-            top_category_ids = [int(x) for x in top_category_ids.split(',')]
-            queryset = queryset.filter(assessment_top_category_id__in=top_category_ids)
+            top_category_ids = {int(x) for x in top_category_ids.split(',')}
+            top_categories = [top_category for top_category in top_categories if top_category.id in top_category_ids]
+        return list(top_categories)
+
+    @cached_property
+    def assessor_has_access(self):
+        assessor_has_access = self.request.query_params.get('assessor_has_access', None)
+        return BooleanField().to_python(assessor_has_access) if assessor_has_access is not None else None
+
+    def get_queryset(self):
+        """ `AssessmentAccess` of the assessors having at least one of the permissions listed """
+        accesses = self.request.user.get_assessed().assessmentaccess_set.all()
 
         assessor_id = self.request.query_params.get('assessor_id', None)
         if assessor_id is not None:
-            queryset = queryset.filter(assessor_id=assessor_id)
-
-        assessor_has_access = self.request.query_params.get('assessor_has_access', None)
-        if assessor_has_access is not None:
-            queryset = queryset.filter(assessor_has_access=assessor_has_access)
+            accesses = accesses.filter(assessor_id=assessor_id)
 
-        return queryset
+        top_category_ids = [top_category.id for top_category in self.top_categories]
+        if self.assessor_has_access is True:
+            accesses = accesses.filter(top_category_ids__overlap=top_category_ids)
+        elif self.assessor_has_access is False:
+            accesses = accesses.exclude(top_category_ids__contains=top_category_ids)
+        return accesses
 
     def get(self, request, uid, format=None):
         """
-        List assessed's assessment permission.
+        List assessed's assessment permission, one by assessor and top category, the assessors a page at a time.
         """
-        queryset = self.get_queryset()
-        return Response(AssessmentTopCategoryPermissionListSerializer(queryset, many=True).data)
+        accesses = self.paginate_queryset(self.get_queryset())
+        permissions = [permission for access in accesses for permission in access.get_permissions(self.top_categories)
+                       if self.assessor_has_access in (None, permission['assessor_has_access'])]
+        return self.get_paginated_response(AssessmentTopCategoryPermissionListSerializer(permissions, many=True).data)
 
     def put(self, request, uid, format=None):
         """
@@ -343,44 +452,56 @@ class TeamChosenAssessmentListUpdateCreate(APIView):
 
     def get_object(self, request, tid):
         try:
-            team = Team.objects.using(request.user.country).get(pk=tid)
+            team = get_object(Team, pk=tid)
             self.check_object_permissions(self.request, team)
             return team
         except Team.DoesNotExist:
             raise Http404
 
     def get_queryset(self, team):
-        team_members_data = []
-
-        for member in team.athletes.all().order_by('user_id'):
+        """
+        Chosen assessments of the team members, or their `Assessed` when they have none, ordered by member.
+        The values of all the members are fetched at once, with their assessed user and format.
+        """
+        roster = Assessed.objects \
+            .filter(athlete__team_membership=team) \
+            .select_related('athlete__user') \
+            .order_by('athlete__user_id')
 
-            queryset = member.assessed.chosenassessment_set.filter(team_id=team.id)
+        queryset = ChosenAssessment.objects \
+            .filter(team_id=team.id, assessed__athlete__team_membership=team) \
+            .select_related('assessed__athlete__user', 'assessment__format')
 
-            assessor_id = self.request.query_params.get('assessor_id', None)
-            if assessor_id is not None:
-                queryset = queryset.filter(assessor_id=assessor_id)
+        assessor_id = self.request.query_params.get('assessor_id', None)
+        if assessor_id is not None:
+            queryset = queryset.filter(assessor_id=assessor_id)
 
-            assessment_id = self.request.query_params.get('assessment_id', None)
-            if assessment_id is not None:
-                queryset = queryset.filter(assessment_id=assessment_id)
+        assessment_id = self.request.query_params.get('assessment_id', None)
+        if assessment_id is not None:
+            queryset = queryset.filter(assessment_id=assessment_id)
 
-            latest = self.request.query_params.get('latest', None)
-            if latest is not None:
-                queryset = queryset.order_by('-date_assessed')[:1]
+        start_date = self.request.query_params.get('start_date', None)
+        if start_date is not None:
+            queryset = queryset.filter(date_assessed__gt=parse_date(start_date))
 
-            start_date = self.request.query_params.get('start_date', None)
-            if start_date is not None:
-                queryset = queryset.filter(date_assessed__gt=parse_date(start_date))
+        end_date = self.request.query_params.get('end_date', None)
+        if end_date is not None:
+            queryset = queryset.filter(date_assessed__lt=parse_date(end_date))
 
-            end_date = self.request.query_params.get('end_date', None)
-            if end_date is not None:
-                queryset = queryset.filter(date_assessed__lt=parse_date(end_date))
+        latest = self.request.query_params.get('latest', None)
+        if latest is not None:
+            # Latest value of every member (DISTINCT ON)
+            queryset = queryset.order_by('assessed_id', '-date_assessed', '-id').distinct('assessed_id')
+        else:
+            queryset = queryset.order_by('assessed_id', 'id')
 
-            if queryset:
-                team_members_data += queryset[:]
-            else:
-                team_members_data.append(member.assessed)
+        values = {}
+        for chosen_assessment in queryset:
+            values.setdefault(chosen_assessment.assessed_id, []).append(chosen_assessment)
 
+        team_members_data = []
+        for assessed in roster:
+            team_members_data += values.get(assessed.id) or [assessed]
         return team_members_data
 
     def get(self, request, tid):
@@ -408,13 +529,17 @@ class TeamChosenAssessmentListUpdateCreate(APIView):
         rejected_data = []
         error_found = False
 
+        # Provide assessed_id = None as it is an assessment made through a team
+        context = {
+            'team_id': tid,
+            'assessed_id': None,
+            'country': request.user.country,
+            'user': request.user,
+            'batch': ChosenAssessmentBatch(request.user, request.user.country, request.data, team_id=tid),
+        }
+
         for assessment in request.data:
-            # Provide assessed_id = None as it is an assessment made through a team
-            validation_serializer = ChosenAssessmentCreateSerializer(data=assessment,
-                                                                     context={'team_id': tid,
-                                                                              'assessed_id': None,
-                                                                              'country': request.user.country,
-                                                                              'user': request.user})
+            validation_serializer = ChosenAssessmentCreateSerializer(data=assessment, context=context)
 
             if validation_serializer.is_valid():
                 valid_data.append(validation_serializer.data)
@@ -433,10 +558,7 @@ class TeamChosenAssessmentListUpdateCreate(APIView):
             return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
         else:
             serializer = ChosenAssessmentCreateSerializer(data=valid_data, many=isinstance(valid_data, list),
-                                                          context={'team_id': tid,
-                                                                   'assessed_id': None,
-                                                                   'country': request.user.country,
-                                                                   'user': request.user})
+                                                          context=context)
             if serializer.is_valid():
                 serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
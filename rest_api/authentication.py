@@ -1,19 +1,83 @@
+from django.contrib.auth import get_user_model
 from django.utils.dateformat import format
 from django.utils.translation import ugettext as _
 from rest_framework import exceptions
 from rest_framework_jwt.authentication import JSONWebTokenAuthentication
 from rest_framework_jwt.settings import api_settings
 
+from multidb_account.auth_cache import get_auth_user_cache
 from multidb_account.constants import USER_TYPE_ATHLETE
+from multidb_account.identity_map import remember
+from multidb_account.replicas import route_request_reads
+from multidb_account.shards import get_shard_databases, set_current_shard
 from multidb_account.utils import get_user_from_localized_databases
+from payment_gateway.models import Customer
 
 jwt_get_username_from_payload = api_settings.JWT_PAYLOAD_GET_USERNAME_HANDLER
 jwt_get_user_id_from_payload_handler = api_settings.JWT_PAYLOAD_GET_USER_ID_HANDLER
 
+UserModel = get_user_model()
+
+
+def jwt_get_shard_from_payload(payload):
+    return payload.get('shard')
+
 
 class PsrJSONWebTokenAuthentication(JSONWebTokenAuthentication):
     """ Expire token on password change and force user to re-authenticate. """
 
+    @staticmethod
+    def is_locked_out(user):
+        """ Only for Athlete users who have a customer model extension """
+        if user.user_type != USER_TYPE_ATHLETE:
+            return False
+        return Customer.objects.using(user._state.db) \
+            .filter(athlete_id=user.pk, payment_status='locked_out') \
+            .exists()
+
+    def get_user_from_payload(self, payload, username, payload_user_id):
+        """
+        Tokens carrying a shard claim are resolved with a single primary key lookup on that database,
+        or from the per-process auth cache. Tokens issued before the claim existed are resolved by email.
+        Returns a `(user, locked_out)` tuple.
+        """
+        shard = jwt_get_shard_from_payload(payload)
+        if shard is None:
+            user = get_user_from_localized_databases(username)
+            return user, user is not None and self.is_locked_out(user)
+
+        if shard not in get_shard_databases():
+            return None, False
+
+        auth_user_cache = get_auth_user_cache()
+        cached = auth_user_cache.get(shard, payload_user_id) if auth_user_cache else None
+        if cached is not None:
+            user, state = cached
+            locked_out = state['locked_out']
+        else:
+            version = auth_user_cache.get_version(shard, payload_user_id) if auth_user_cache else None
+            try:
+                user = UserModel.objects.using(shard).get(pk=payload_user_id)
+            except UserModel.DoesNotExist:
+                return None, False
+            locked_out = self.is_locked_out(user)
+            if auth_user_cache:
+                auth_user_cache.set(shard, payload_user_id, user, version, locked_out=locked_out)
+
+        if user.country != shard or user.email.lower() != username.lower():
+            return None, False
+
+        return user, locked_out
+
+    def authenticate(self, request):
+        user_auth = super().authenticate(request)
+        if user_auth is not None:
+            # Safe requests may read from the replica of the user's database
+            route_request_reads(request.method, user_auth[0])
+            # The models of the request share the authenticated user instead of loading it again
+            remember(user_auth[0])
+        return user_auth
+
     def authenticate_credentials(self, payload):
         """
         Returns an active user that matches the payload's user id and email.
@@ -25,7 +89,7 @@ class PsrJSONWebTokenAuthentication(JSONWebTokenAuthentication):
             msg = _('Invalid payload.')
             raise exceptions.AuthenticationFailed(msg)
 
-        user = get_user_from_localized_databases(username)
+        user, locked_out = self.get_user_from_payload(payload, username, payload_user_id)
         if not user:
             msg = _('Invalid signature.')
             raise exceptions.AuthenticationFailed(msg)
@@ -34,11 +98,9 @@ class PsrJSONWebTokenAuthentication(JSONWebTokenAuthentication):
             msg = _('Invalid signature.')
             raise exceptions.AuthenticationFailed(msg)
 
-        # Only for Athlete users who have a customer model extension
-        if user.user_type == USER_TYPE_ATHLETE and hasattr(user.athleteuser, 'customer'):
-            if user.athleteuser.customer.payment_status == 'locked_out':
-                msg = _('User account has been locked out.')
-                raise exceptions.AuthenticationFailed(msg)
+        if locked_out:
+            msg = _('User account has been locked out.')
+            raise exceptions.AuthenticationFailed(msg)
 
         if not user.is_active:
             msg = _('User account is disabled.')
@@ -51,4 +113,7 @@ class PsrJSONWebTokenAuthentication(JSONWebTokenAuthentication):
             msg = 'Users must re-authenticate after logging out.'
             raise exceptions.AuthenticationFailed(msg)
 
+        # Route the ORM queries of the rest of the request to the user's database
+        set_current_shard(user._state.db)
+
         return user
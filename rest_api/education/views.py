@@ -14,4 +14,4 @@ class EducationViewSet(ModelViewSet):
     lookup_url_kwarg = 'eid'
 
     def get_queryset(self):
-        return Education.objects.using(self.request.user.country).filter(user=self.kwargs['uid'])
+        return Education.objects.filter(user=self.kwargs['uid'])
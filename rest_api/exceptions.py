@@ -0,0 +1,20 @@
+from django.conf import settings as django_settings
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import exception_handler
+
+from multidb_account.fanout import ShardTimeoutError
+from multidb_account.shard_health import ShardUnavailableError
+
+
+def shard_exception_handler(exc, context):
+    """
+    A lookup which couldn't reach every localized database doesn't know whether the object exists: answer 503 so
+    that the client (e.g. Stripe for the webhooks) retries once the database is back, rather than acting on a miss.
+    """
+    if isinstance(exc, (ShardUnavailableError, ShardTimeoutError)):
+        retry_after = getattr(django_settings, 'SHARD_HEALTH', {}).get('RESET_TIMEOUT', 30)
+        return Response({'error': _('Service temporarily unavailable, please retry later')},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': str(retry_after)})
+    return exception_handler(exc, context)
@@ -19,7 +19,7 @@ class AreUsersConnected(permissions.BasePermission):
     """
     def has_permission(self, request, view):
         try:
-            target_user = UserModel.objects.using(request.user.country).get(pk=view.kwargs['uid'])
+            target_user = UserModel.objects.get(pk=view.kwargs['uid'])
         except Exception:
             return False
         return request.user in {u.user for u in target_user.get_linked_users()}
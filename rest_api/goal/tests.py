@@ -1,3 +1,4 @@
+import re
 from datetime import timedelta, datetime
 from django.contrib.auth import get_user_model
 from django.core.urlresolvers import reverse_lazy
@@ -202,3 +203,30 @@ class GoalTests(ApiTests):
 
 
 
+
+    def test_goals_are_paginated(self):
+        user = self.coach_ca
+        auth = 'JWT {}'.format(user.token)
+        goals = [Goal.objects.using(user.country).create(user=user, description='#{}'.format(i),
+                                                         achieve_by=(datetime.utcnow() + timedelta(weeks=i)).date())
+                 for i in range(3)]
+        url = reverse_lazy('rest_api:goal-list')
+
+        # First page, with a link to the next one only
+        response = self.client.get(url, {'page_size': 2}, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([goal['id'] for goal in response.data], [goals[0].id, goals[1].id])
+        next_url, rel = re.match(r'<(.*)>; rel="(.*)"', response['Link']).groups()
+        self.assertEqual(rel, 'next')
+
+        # Last page
+        response = self.client.get(next_url, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([goal['id'] for goal in response.data], [goals[2].id])
+        self.assertNotIn('rel="next"', response['Link'])
+        self.assertIn('rel="prev"', response['Link'])
+
+        # Every goal fits in a larger page, capped at the maximum page size
+        response = self.client.get(url, {'page_size': 10000}, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(len(response.data), 3)
+        self.assertFalse(response.has_header('Link'))
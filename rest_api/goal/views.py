@@ -3,6 +3,7 @@ from rest_framework.viewsets import ModelViewSet, GenericViewSet
 from rest_framework import mixins
 
 from multidb_account.goal.models import Goal
+from rest_api.pagination import LinkHeaderCursorPagination
 from .serializers import GoalSerializer
 from .permissions import IsOwner, AreUsersConnected
 
@@ -15,10 +16,11 @@ class MyGoalViewSet(ModelViewSet):
     """
     permission_classes = (IsOwner,)
     serializer_class = GoalSerializer
+    pagination_class = LinkHeaderCursorPagination
 
     def get_queryset(self):
         # A user sees only his own goals
-        return Goal.objects.using(self.request.user.country).filter(user=self.request.user)
+        return Goal.objects.filter(user=self.request.user)
 
 
 class UserGoalViewSet(mixins.ListModelMixin, GenericViewSet):
@@ -27,6 +29,7 @@ class UserGoalViewSet(mixins.ListModelMixin, GenericViewSet):
     """
     permission_classes = (AreUsersConnected,)
     serializer_class = GoalSerializer
+    pagination_class = LinkHeaderCursorPagination
 
     def get_queryset(self):
-        return Goal.objects.using(self.request.user.country).filter(user_id=self.kwargs['uid'])
+        return Goal.objects.filter(user_id=self.kwargs['uid'])
@@ -15,7 +15,7 @@ class HelpCenterReportViewSet(CreateModelMixin, GenericViewSet):
     serializer_class = HelpCenterReportSerializer
 
     def get_queryset(self):
-        return HelpCenterReport.objects.using(self.request.user.country).select_related('owner')
+        return HelpCenterReport.objects.select_related('owner')
 
     def perform_create(self, serializer):
         obj = serializer.save()
@@ -30,7 +30,7 @@ class OrganisationSupportViewSet(CreateModelMixin, GenericViewSet):
     serializer_class = OrganisationSupportSerializer
 
     def get_queryset(self):
-        return OrganisationSupport.objects.using(self.request.user.country).select_related('owner')
+        return OrganisationSupport.objects.select_related('owner')
 
     def perform_create(self, serializer):
         obj = serializer.save()
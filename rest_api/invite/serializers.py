@@ -7,7 +7,7 @@ from multidb_account.constants import USER_TYPE_COACH, USER_TYPE_ATHLETE, INVITE
     INVITE_PENDING, USER_TYPE_ORG
 from multidb_account.user.models import Coaching
 from multidb_account.invite.models import Invite
-from multidb_account.assessment.models import AssessmentTopCategory, AssessmentTopCategoryPermission
+from multidb_account.assessment.models import AssessmentTopCategory, AssessmentAccess
 from multidb_account.team.models import Team
 
 from rest_api.mixins import ValidateInviteTokenMixin
@@ -30,7 +30,7 @@ class UserInviteSerializer(serializers.Serializer):
         self.custom_validated_data = []  # Keep the `.validated_data` for non-errored objects when `many=True`
 
     def validate_team_id(self, value):
-        self.team = Team.objects.using(self.context['request'].user.country).filter(id=value).first()
+        self.team = Team.objects.filter(id=value).first()
         if not self.team:
             raise serializers.ValidationError(_("Team id is not valid."))
         return value
@@ -217,116 +217,97 @@ class UserInviteConfirmSerializer(ValidateInviteTokenMixin, serializers.Serializ
         if athlete and coach:
             Coaching.create_if_not_exist(self.localized_db, athlete, coach)
 
-        for top_category in AssessmentTopCategory.objects.using(self.localized_db).all():
-            # we want all top categories granted by default to Coaches
-            # we want category (general-leadership(id=10001)) granted by default to athlete
-            coach_has_access = True
-            athlete_has_access = top_category.id == 10001
+        # we want all top categories granted by default to Coaches
+        # we want category (general-leadership(id=10001)) granted by default to athlete
+        coach_top_category_ids = set(AssessmentTopCategory.objects.using(self.localized_db)
+                                     .values_list('id', flat=True))
+        athlete_top_category_ids = coach_top_category_ids & {10001}
 
-            if self.recipient.user_type != self.requester.user_type:
+        if self.recipient.user_type != self.requester.user_type:
 
-                # Create coach->athlete assessment permissions
-                if coach and athlete:
+            # Create coach->athlete assessment permissions
+            if coach and athlete:
+                self._set_category_perm(assessed=athlete.get_assessed(),
+                                        assessor=coach.get_assessor(),
+                                        top_category_ids=coach_top_category_ids)
+
+                # Create athlete->coach assessment permissions
+                self._set_category_perm(assessed=coach.get_assessed(),
+                                        assessor=athlete.get_assessor(),
+                                        top_category_ids=athlete_top_category_ids)
+
+            if self.invite.team and self.invite.team.owner.user_type != USER_TYPE_ORG:
+                # We grant team owner coach on new athlete
+                if self.recipient.user_type == USER_TYPE_ATHLETE:
                     self._set_category_perm(assessed=athlete.get_assessed(),
-                                            assessor=coach.get_assessor(),
-                                            assessment_top_category=top_category,
-                                            assessor_has_access=coach_has_access)
+                                            assessor=self.invite.team.owner.get_assessor(),
+                                            top_category_ids=coach_top_category_ids)
 
-                    # Create athlete->coach assessment permissions
-                    self._set_category_perm(assessed=coach.get_assessed(),
+                    # We grant new athlete on team owner coach
+                    self._set_category_perm(assessed=self.invite.team.owner.get_assessed(),
                                             assessor=athlete.get_assessor(),
-                                            assessment_top_category=top_category,
-                                            assessor_has_access=athlete_has_access)
+                                            top_category_ids=athlete_top_category_ids)
 
-                if self.invite.team and self.invite.team.owner.user_type != USER_TYPE_ORG:
-                    # We grant team owner coach on new athlete
-                    if self.recipient.user_type == USER_TYPE_ATHLETE:
+                    # We grant all the other coaches of the team on new athlete
+                    for other_coach_member in self.invite.team.coaches.all():
                         self._set_category_perm(assessed=athlete.get_assessed(),
-                                                assessor=self.invite.team.owner.get_assessor(),
-                                                assessment_top_category=top_category,
-                                                assessor_has_access=coach_has_access)
+                                                assessor=other_coach_member.get_assessor(),
+                                                top_category_ids=coach_top_category_ids)
 
-                        # We grant new athlete on team owner coach
-                        self._set_category_perm(assessed=self.invite.team.owner.get_assessed(),
+                        # We grant new athlete on all the other coaches of the team
+                        self._set_category_perm(assessed=other_coach_member.get_assessed(),
                                                 assessor=athlete.get_assessor(),
-                                                assessment_top_category=top_category,
-                                                assessor_has_access=athlete_has_access)
-
-                        # We grant all the other coaches of the team on new athlete
-                        for other_coach_member in self.invite.team.coaches.all():
-                            self._set_category_perm(assessed=athlete.get_assessed(),
-                                                    assessor=other_coach_member.get_assessor(),
-                                                    assessment_top_category=top_category,
-                                                    assessor_has_access=coach_has_access)
-
-                            # We grant new athlete on all the other coaches of the team
-                            self._set_category_perm(assessed=other_coach_member.get_assessed(),
-                                                    assessor=athlete.get_assessor(),
-                                                    assessment_top_category=top_category,
-                                                    assessor_has_access=athlete_has_access)
-
-            if self.invite.team \
-                    and self.recipient.user_type == USER_TYPE_COACH \
-                    and self.invite.team.owner.user_type != USER_TYPE_ORG:
-
-                # Grant new coach permission to asses the owner of the team
-                self._set_category_perm(assessed=self.invite.team.owner.get_assessed(),
-                                        assessor=self.recipient.coachuser.get_assessor(),
-                                        assessment_top_category=top_category,
-                                        assessor_has_access=coach_has_access)
+                                                top_category_ids=athlete_top_category_ids)
 
-                # Grant owner of the team permission to asses a new coach
-                self._set_category_perm(assessed=self.recipient.coachuser.get_assessed(),
-                                        assessor=self.invite.team.owner.get_assessor(),
-                                        assessment_top_category=top_category,
-                                        assessor_has_access=athlete_has_access)
+        if self.invite.team \
+                and self.recipient.user_type == USER_TYPE_COACH \
+                and self.invite.team.owner.user_type != USER_TYPE_ORG:
 
-                for athlete in self.invite.team.athletes.all():
-                    # Grant new coach permission to assess athletes
-                    self._set_category_perm(assessed=athlete.get_assessed(),
-                                            assessor=self.recipient.coachuser.get_assessor(),
-                                            assessment_top_category=top_category,
-                                            assessor_has_access=coach_has_access)
+            # Grant new coach permission to asses the owner of the team
+            self._set_category_perm(assessed=self.invite.team.owner.get_assessed(),
+                                    assessor=self.recipient.coachuser.get_assessor(),
+                                    top_category_ids=coach_top_category_ids)
 
-                    # Grant athletes permission to assess new coach
-                    self._set_category_perm(assessed=self.recipient.coachuser.get_assessed(),
-                                            assessor=athlete.get_assessor(),
-                                            assessment_top_category=top_category,
-                                            assessor_has_access=athlete_has_access)
+            # Grant owner of the team permission to asses a new coach
+            self._set_category_perm(assessed=self.recipient.coachuser.get_assessed(),
+                                    assessor=self.invite.team.owner.get_assessor(),
+                                    top_category_ids=athlete_top_category_ids)
 
-            if self.invite.team:
-                self._grant_team_coach_athlete_perms(top_category, coach_has_access, athlete_has_access)
+            for athlete in self.invite.team.athletes.all():
+                # Grant new coach permission to assess athletes
+                self._set_category_perm(assessed=athlete.get_assessed(),
+                                        assessor=self.recipient.coachuser.get_assessor(),
+                                        top_category_ids=coach_top_category_ids)
+
+                # Grant athletes permission to assess new coach
+                self._set_category_perm(assessed=self.recipient.coachuser.get_assessed(),
+                                        assessor=athlete.get_assessor(),
+                                        top_category_ids=athlete_top_category_ids)
+
+        if self.invite.team:
+            self._grant_team_coach_athlete_perms(coach_top_category_ids, athlete_top_category_ids)
 
         return {'requester_first_name': self.requester.first_name,
                 'requester_last_name': self.requester.last_name,
                 'requester_id': self.requester.id,
                 'requester_type': self.requester.user_type}
 
-    def _set_category_perm(self, assessed, assessor, assessment_top_category, assessor_has_access):
-        AssessmentTopCategoryPermission.objects.using(self.localized_db).get_or_create(
-            assessed=assessed,
-            assessor=assessor,
-            assessment_top_category=assessment_top_category,
-            defaults={
-              'assessor_has_access': assessor_has_access,
-            },
-        )
+    def _set_category_perm(self, assessed, assessor, top_category_ids):
+        AssessmentAccess.create_if_not_exist(self.localized_db, assessed, assessor, top_category_ids)
 
-    def _grant_team_coach_athlete_perms(self, top_category, coach_has_access, athlete_has_access):
+    def _grant_team_coach_athlete_perms(self, coach_top_category_ids, athlete_top_category_ids):
         if self.recipient.user_type == USER_TYPE_COACH:
             # New user is COACH
             for athlete in self.invite.team.athletes.all():
                 # Grant new coach permission to assess athletes
                 self._set_category_perm(assessed=athlete.get_assessed(),
                                         assessor=self.recipient.coachuser.get_assessor(),
-                                        assessment_top_category=top_category,
-                                        assessor_has_access=coach_has_access)
+                                        top_category_ids=coach_top_category_ids)
 
                 # Grant athletes permission to assess new coach
                 self._set_category_perm(assessed=self.recipient.coachuser.get_assessed(),
                                         assessor=athlete.get_assessor(),
-                                        assessment_top_category=top_category,
-                                        assessor_has_access=athlete_has_access)
+                                        top_category_ids=athlete_top_category_ids)
 
                 Coaching.objects.using(self.localized_db).get_or_create(athlete=athlete, coach=self.recipient.coachuser)
         else:
@@ -335,14 +316,12 @@ class UserInviteConfirmSerializer(ValidateInviteTokenMixin, serializers.Serializ
                 # We grant all the other coaches of the team on new athlete
                 self._set_category_perm(assessed=self.recipient.get_assessed(),
                                         assessor=coach.get_assessor(),
-                                        assessment_top_category=top_category,
-                                        assessor_has_access=coach_has_access)
+                                        top_category_ids=coach_top_category_ids)
 
                 # We grant new athlete on all the other coaches of the team
                 self._set_category_perm(assessed=coach.get_assessed(),
                                         assessor=self.recipient.get_assessor(),
-                                        assessment_top_category=top_category,
-                                        assessor_has_access=athlete_has_access)
+                                        top_category_ids=athlete_top_category_ids)
 
                 Coaching.create_if_not_exist(self.localized_db, self.recipient.athleteuser, coach)
 
@@ -389,11 +368,9 @@ class UserInviteUnlinkSerializer(serializers.Serializer):
         ).update(status=INVITE_CANCELED)
 
         # delete coach-athlete permissions
-        AssessmentTopCategoryPermission.objects.using(self.localized_db). \
-            filter(assessed_id=self.athlete.user.id, assessor_id=self.coach.user.id).delete()
+        AssessmentAccess.revoke(self.localized_db, assessed_id=self.athlete.user.id, assessor_id=self.coach.user.id)
         # delete athlete-coach permissions
-        AssessmentTopCategoryPermission.objects.using(self.localized_db). \
-            filter(assessed_id=self.coach.user.id, assessor_id=self.athlete.user.id).delete()
+        AssessmentAccess.revoke(self.localized_db, assessed_id=self.coach.user.id, assessor_id=self.athlete.user.id)
 
         return True
 
@@ -6,7 +6,7 @@ from django.contrib.auth import get_user_model
 from django.core.urlresolvers import reverse_lazy
 from rest_framework import status
 
-from multidb_account.assessment.models import AssessmentTopCategoryPermission
+from multidb_account.assessment.models import AssessmentAccess
 from multidb_account.constants import USER_TYPE_ATHLETE, USER_TYPE_COACH, INVITE_ACCEPTED, INVITE_CANCELED
 from multidb_account.invite.models import Invite
 from multidb_account.user.models import Coaching
@@ -294,7 +294,7 @@ class InviteTests(ApiTests):
         self.assertIn(self.athlete_ca.athleteuser, team.athletes.using(localized_db).all())
 
         # Check that coach-athlete permissions are set
-        permissions = AssessmentTopCategoryPermission.objects.using(localized_db) \
+        permissions = AssessmentAccess.objects.using(localized_db) \
             .filter(assessed=self.athlete_ca.get_assessed(), assessor=self.coach_ca.get_assessor())
         self.assertTrue(permissions.exists())
 
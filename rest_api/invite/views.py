@@ -11,7 +11,9 @@ from rest_framework.views import APIView
 
 from multidb_account.constants import INVITE_PENDING
 from rest_api.mixins import UserInviteSaltMixin
+from rest_api.pagination import PaginationMixin
 
+from multidb_account.identity_map import get_object
 from multidb_account.invite.models import Invite
 from multidb_account.team.models import Team
 
@@ -67,7 +69,7 @@ class UserInviteResend(UserInviteSaltMixin, APIView):
         return Response({"detail": _("User invite e-mails have been resent.")}, status=status.HTTP_200_OK)
 
 
-class UserPendingInviteList(UserInviteSaltMixin, APIView):
+class UserPendingInviteList(UserInviteSaltMixin, PaginationMixin, APIView):
 
     """
     An endpoint to list user's invites (sent to him or created by him).
@@ -77,7 +79,7 @@ class UserPendingInviteList(UserInviteSaltMixin, APIView):
 
     def get_object(self, request, pk):
         try:
-            user = UserModel.objects.using(request.user.country).get(pk=pk)
+            user = UserModel.objects.get(pk=pk)
 
             # Call to check permissions first
             self.check_object_permissions(self.request, user)
@@ -87,18 +89,18 @@ class UserPendingInviteList(UserInviteSaltMixin, APIView):
             raise Http404
 
     def get_queryset(self):
-        return Invite.objects.using(self.request.user.country).all()
+        return Invite.objects.all()
 
     def get(self, request, uid):
         user = self.get_object(request, uid)
 
-        # Fetch all pending invites for the current user
+        # Fetch the pending invites of the current user, by id: the order they were sent
         filters = Q(requester=user)
         filters = filters & Q(status=INVITE_PENDING)
-        invites = self.get_queryset().filter(filters).order_by('date_sent')
+        invites = self.paginate_queryset(self.get_queryset().filter(filters))
 
         serializer = UserPendingInviteListSerializer(invites, many=True, context={'request': request})
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
 
 class TeamPendingInviteList(UserInviteSaltMixin, APIView):
@@ -109,7 +111,7 @@ class TeamPendingInviteList(UserInviteSaltMixin, APIView):
 
     def get_object(self, request, pk):
         try:
-            team = Team.objects.using(request.user.country).get(pk=pk)
+            team = get_object(Team, pk=pk)
 
             # Call to check permissions first
             self.check_object_permissions(self.request, team)
@@ -119,7 +121,7 @@ class TeamPendingInviteList(UserInviteSaltMixin, APIView):
             raise Http404
 
     def get_queryset(self):
-        return Invite.objects.using(self.request.user.country).all()
+        return Invite.objects.all()
 
     def get(self, request, tid):
         team = self.get_object(request, tid)
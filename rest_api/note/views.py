@@ -1,10 +1,13 @@
 from django.contrib.auth import get_user_model
 from django.db.models import Q
 from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
 from multidb_account.constants import USER_TYPE_ATHLETE
 from multidb_account.note.models import AthleteNote, CoachNote, File, ReturnToPlayType
+from multidb_account.reference_data.cache import get_reference_data
+from rest_api.pagination import LinkHeaderCursorPagination
 from .permissions import IsOwnerOrReadOnly
 from .serializers import FileSerializer, AthleteNoteSerializer, CoachNoteSerializer, ReturnToPlayTypeSerializer
 
@@ -20,7 +23,7 @@ class FileViewSet(ModelViewSet):
     parser_classes = (MultiPartParser,)
 
     def get_queryset(self):
-        return File.objects.using(self.request.user.country).all()
+        return File.objects.all()
 
 
 class AthleteNoteViewSet(ModelViewSet):
@@ -29,6 +32,7 @@ class AthleteNoteViewSet(ModelViewSet):
     """
     permission_classes = (IsOwnerOrReadOnly,)
     serializer_class = AthleteNoteSerializer
+    pagination_class = LinkHeaderCursorPagination
     lookup_url_kwarg = 'nid'
 
     def get_queryset(self):
@@ -58,6 +62,7 @@ class CoachNoteViewSet(ModelViewSet):
     """
     permission_classes = (IsOwnerOrReadOnly,)
     serializer_class = CoachNoteSerializer
+    pagination_class = LinkHeaderCursorPagination
     lookup_url_kwarg = 'nid'
 
     def get_queryset(self):
@@ -94,4 +99,9 @@ class ReturnToPlayTypeViewSet(ReadOnlyModelViewSet):
     serializer_class = ReturnToPlayTypeSerializer
 
     def get_queryset(self):
-        return ReturnToPlayType.objects.using(self.request.user.country).all()
+        return ReturnToPlayType.objects.all()
+
+    def list(self, request, *args, **kwargs):
+        return_to_play_types = get_reference_data(request.user.country).return_to_play_types.values()
+        serializer = self.get_serializer(list(return_to_play_types), many=True)
+        return Response(serializer.data)
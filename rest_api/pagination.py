@@ -0,0 +1,51 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class LinkHeaderCursorPagination(CursorPagination):
+    """
+    Keyset pagination of the unbounded list endpoints, on the `pagination_ordering` of the view (`id` by default),
+    which must be stable and indexed. Views opt in with `pagination_class` (or `PaginationMixin`), it isn't the
+    default one. The page is returned as a plain list, the links to the next and previous pages in a `Link` header
+    (RFC 5988): a client which ignores it only gets the first `page_size` items.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = 'id'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return type(self).page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'pagination_ordering', self.ordering)
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+
+    def get_paginated_response(self, data):
+        links = [(self.get_next_link(), 'next'), (self.get_previous_link(), 'prev')]
+        links = ', '.join('<{}>; rel="{}"'.format(url, rel) for url, rel in links if url)
+        return Response(data, headers={'Link': links} if links else None)
+
+
+class PaginationMixin(object):
+    """
+    Pagination of the generic views for an `APIView` which lists a queryset: `paginate_queryset()` returns the page
+    to serialize, `get_paginated_response()` its response.
+    """
+    pagination_class = LinkHeaderCursorPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = self.pagination_class()
+        return self._paginator
+
+    def paginate_queryset(self, queryset):
+        return self.paginator.paginate_queryset(queryset, self.request, view=self)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
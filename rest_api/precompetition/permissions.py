@@ -1,6 +1,8 @@
 from rest_framework import permissions
 from rest_framework.compat import is_authenticated
 
+from multidb_account.user_access import get_user_access
+
 
 class IsAuthenticatedAthleteOrConnectedCoach(permissions.BasePermission):
     """
@@ -12,7 +14,7 @@ class IsAuthenticatedAthleteOrConnectedCoach(permissions.BasePermission):
         if request.method == 'GET':
             return is_authenticated(request.user) and \
                    (request.user.id == int(view.kwargs.get('uid')) or
-                    request.user.is_connected_to(view.kwargs.get('uid')))
+                    get_user_access(request.user).is_connected_to(view.kwargs.get('uid')))
         # check if user is an authenticated athlete
         if request.method == 'POST':
             return is_authenticated(request.user) and request.user.is_athlete() and \
@@ -29,7 +31,7 @@ class IsPreCompetitionOwnerOrConnectedCoach(permissions.BasePermission):
         if request.method == 'GET':
             return is_authenticated(request.user) and \
                    (request.user.id == int(view.kwargs.get('uid')) or
-                    request.user.is_connected_to(view.kwargs.get('uid')))
+                    get_user_access(request.user).is_connected_to(view.kwargs.get('uid')))
         if request.method == 'PUT':
             return is_authenticated(request.user) and request.user.id == int(view.kwargs.get('uid'))
         return False
@@ -18,7 +18,7 @@ class PreCompetitionCreateList(APIView):
 
     def get_queryset(self, uid):
 
-        queryset = PreCompetition.objects.using(self.request.user.country).filter(athlete_id=uid).all()
+        queryset = PreCompetition.objects.filter(athlete_id=uid).all()
 
         latest = self.request.query_params.get('latest', None)
         if latest is not None:
@@ -65,7 +65,7 @@ class PreCompetitionDetail(APIView):
 
     def get_object(self, request, pcid):
         try:
-            pre_competition = PreCompetition.objects.using(request.user.country).get(pk=pcid)
+            pre_competition = PreCompetition.objects.get(pk=pcid)
             self.check_object_permissions(request, pre_competition)
             return pre_competition
         except PreCompetition.DoesNotExist:
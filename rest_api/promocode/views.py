@@ -15,4 +15,4 @@ class PromocodeViewSet(RetrieveModelMixin, GenericViewSet):
     lookup_field = 'code'
 
     def get_queryset(self):
-        return Promocode.objects.using(self.request.user.country)
+        return Promocode.objects.all()
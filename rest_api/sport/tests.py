@@ -3,6 +3,9 @@ from django.core.urlresolvers import reverse_lazy
 from rest_framework import status
 from rest_api.tests import ApiTests
 
+from multidb_account.reference_data.models import ReferenceDataVersion
+from multidb_account.sport.models import Sport
+
 UserModel = get_user_model()
 
 
@@ -41,3 +44,19 @@ class SportTests(ApiTests):
             self.assertEqual(sport.get('is_displayed'), data[inc].get('is_displayed'))
             self.assertEqual(sport.get('is_chosen'), data[inc].get('is_chosen'))
             inc += 1
+
+    def test_sports_list_is_refreshed_on_change(self):
+        auth = 'JWT {}'.format(self.athlete_ca.token)
+        url = reverse_lazy('rest_api:sports')
+        response = self.client.get(url, HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sport_names = [sport['name'] for sport in response.data]
+        self.assertNotIn('Underwater hockey', sport_names)
+
+        version = ReferenceDataVersion.get_version('ca')
+        Sport.objects.using('ca').create(name='Underwater hockey')
+        self.assertEqual(ReferenceDataVersion.get_version('ca'), version + 1)
+
+        response = self.client.get(url, HTTP_AUTHORIZATION=auth)
+        self.assertEqual(len(response.data), len(sport_names) + 1)
+        self.assertIn('Underwater hockey', [sport['name'] for sport in response.data])
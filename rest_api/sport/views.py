@@ -7,6 +7,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from multidb_account.reference_data.cache import get_reference_data
 from multidb_account.sport.models import Sport
 from .serializers import SportSerializer, ChosenSportSerializer
 from rest_api.permissions import IsOwnerOrDeny
@@ -23,14 +24,14 @@ class SportList(ListCreateAPIView):
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
-        return Sport.objects.using(self.request.user.country).filter(is_available=True)
+        return Sport.objects.filter(is_available=True)
 
     def get(self, request, format=None):
         """
         List all sports available.
         """
-        queryset = self.get_queryset()
-        serializer = SportSerializer(queryset, many=True)
+        sports = get_reference_data(request.user.country).get_available_sports()
+        serializer = SportSerializer(sports, many=True)
         return Response(serializer.data)
 
     def post(self, request, format=None):
@@ -54,7 +55,7 @@ class ChosenSport(APIView):
 
     def get_object(self, request, uid):
         try:
-            user = UserModel.objects.using(request.user.country).get(pk=uid)
+            user = UserModel.objects.get(pk=uid)
             self.check_object_permissions(self.request, user)
             return user
         except ObjectDoesNotExist:
@@ -2,6 +2,7 @@ from django.db.models import Q
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
+from rest_api.pagination import LinkHeaderCursorPagination
 from rest_api.team.serializers import TeamSerializer
 from sport_engine.models import SportEngineEvent, SportEngineGame
 from .serializers import SportEngineEventSerializer, SportEngineGameSerializer
@@ -9,6 +10,7 @@ from .serializers import SportEngineEventSerializer, SportEngineGameSerializer
 
 class SportEngineBaseViewSet(ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
+    pagination_class = LinkHeaderCursorPagination
 
     def get_queryset(self):
         # Validate team_id
@@ -23,13 +25,14 @@ class SportEngineEventViewSet(SportEngineBaseViewSet):
     def get_queryset(self):
         super().get_queryset()
 
-        # Filter queryset
+        # Filter queryset, once per event whatever the number of teams of the user
         user = self.request.user
         return self.model.objects \
             .using(user.country) \
             .filter(Q(sport_engine_team__team__athletes__pk=user.pk) |
                     Q(sport_engine_team__team__coaches__pk=user.pk) |
-                    Q(sport_engine_team__team__owner__pk=user.pk))
+                    Q(sport_engine_team__team__owner__pk=user.pk)) \
+            .distinct()
 
 
 class SportEngineGameViewSet(SportEngineBaseViewSet):
@@ -39,10 +42,11 @@ class SportEngineGameViewSet(SportEngineBaseViewSet):
     def get_queryset(self):
         super().get_queryset()
 
-        # Filter queryset
+        # Filter queryset, once per game whatever the number of teams of the user
         user = self.request.user
         return self.model.objects \
             .using(user.country) \
             .filter(Q(sport_engine_teams__team__athletes__pk=user.pk) |
                     Q(sport_engine_teams__team__coaches__pk=user.pk) |
-                    Q(sport_engine_teams__team__owner__pk=user.pk))
+                    Q(sport_engine_teams__team__owner__pk=user.pk)) \
+            .distinct()
@@ -1,6 +1,8 @@
 from rest_framework import permissions
 from rest_framework.compat import is_authenticated
 
+from multidb_account.user_access import get_user_access
+
 
 class IsCoachTeamMember(permissions.BasePermission):
     """
@@ -11,10 +13,8 @@ class IsCoachTeamMember(permissions.BasePermission):
         return is_authenticated(request.user)
 
     def has_object_permission(self, request, view, team):
-        # check if user is a team member
-        return team.coaches.filter(pk=request.user.id).exists() \
-               or request.user.id == team.owner.id \
-               or (team.organisation and team.organisation.login_users.filter(id=request.user.id).exists())
+        # check if user is a team coach
+        return get_user_access(request.user).is_team_coach(team.id)
 
 
 class IsAuthenticatedCoachOrOrganisation(permissions.BasePermission):
@@ -39,13 +39,10 @@ class IsTeamMemberOrOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, team):
         # check if user is a team member or team's owner for listing
         if request.method == 'GET':
-            return team.athletes.filter(pk=request.user.id).exists() \
-                   or team.coaches.filter(pk=request.user.id).exists() \
-                   or request.user.id == team.owner.id \
-                   or (team.organisation and team.organisation.login_users.filter(pk=request.user.id).exists())
+            return get_user_access(request.user).is_team_member(team.id)
         # check if user is the team's owner for update
         if request.method == 'PUT':
-            return request.user.id == team.owner.id
+            return request.user.id == team.owner_id
         return False
 
 
@@ -59,4 +56,4 @@ class IsTeamOwner(permissions.BasePermission):
 
     def has_object_permission(self, request, view, team):
         # check if user is a team member or team's owner for listing
-        return request.user.id == team.owner.id
+        return request.user.id == team.owner_id
@@ -21,24 +21,25 @@ class AthleteCoachTeamMembersSerializer(serializers.Serializer):
     status = serializers.SerializerMethodField()
 
     def get_id(self, obj):
-        return obj.user.id
+        return obj.user_id
 
     def get_email(self, obj):
-        return obj.user.email
+        return obj.get_user().email
 
     def get_first_name(self, obj):
-        return obj.user.first_name
+        return obj.get_user().first_name
 
     def get_last_name(self, obj):
-        return obj.user.last_name
+        return obj.get_user().last_name
 
     def get_user_type(self, obj):
-        return obj.user.user_type
+        return obj.get_user().user_type
 
     def get_status(self, obj):
-        if not obj.user.is_athlete():
+        user = obj.get_user()
+        if not user.is_athlete():
             return
-        status = obj.user.athleteuser.precompetition_set.using(obj.user.country).order_by('-date_created').first()
+        status = obj.precompetition_set.using(user.country).order_by('-date_created').first()
         if status:
             ser = PreCompetitionCreateUpdateListSerializer(status)
             return {
@@ -48,8 +49,9 @@ class AthleteCoachTeamMembersSerializer(serializers.Serializer):
 
     def get_profile_picture_url(self, obj):
         request = self.context.get('request')
-        if obj.user.profile_picture and obj.user.profile_picture.url and request:
-            return request.build_absolute_uri(obj.user.profile_picture.url)
+        user = obj.get_user()
+        if user.profile_picture and user.profile_picture.url and request:
+            return request.build_absolute_uri(user.profile_picture.url)
         return ''
 
 
@@ -62,7 +64,7 @@ class TeamSerializer(serializers.ModelSerializer):
 
     def validate_team_id(self, team_id):
         try:
-            Team.objects.using(self.context['request'].user.country).get(id=team_id)
+            Team.objects.get(id=team_id)
         except Team.DoesNotExist:
             raise serializers.ValidationError({"team_id": _("Unknown team: {}".format(team_id))})
 
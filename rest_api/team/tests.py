@@ -2,11 +2,16 @@ from unittest import mock
 from datetime import timedelta, date
 
 from django.core.urlresolvers import reverse_lazy
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 
 from rest_api.tests import ApiTests
+from multidb_account.assessment.models import ChosenAssessment, TeamAssessmentRollup
 from multidb_account.constants import USER_TYPE_COACH, USER_TYPE_ATHLETE
-from multidb_account.user.models import AthleteUser, Coaching
+from multidb_account.user.models import AthleteUser, Coaching, UserConnection
+from multidb_account.user_connections import get_user_connections
 from multidb_account.team.models import Team
 
 
@@ -217,6 +222,118 @@ class TeamTests(ApiTests):
             self.assertEqual(int(float(assessment.get('value'))), int(float(expected_data[inc].get('value'))))
             inc += 1
 
+    @override_settings(TEAM_ASSESSMENT_ROLLUP=True)
+    def test_team_assessments_rollup(self):
+        localized_db = self.coach_us.country
+        response = self.create_team(self.coach_us)
+        team = Team.objects.using(localized_db).get(id=response.data['id'])
+
+        with mock.patch('multidb_account.invite.models.loader.render_to_string') as mock_render_to_string:
+            mock_render_to_string.return_value = 'some email text'
+            self.invite_users(requester=self.coach_us, recipient=self.athlete_us, team_id=team.id)
+            token = mock_render_to_string.call_args_list[0][0][1]['token']
+        self.confirm_invite(token=token, confirmer=self.athlete_us)
+
+        auth = 'JWT {}'.format(self.coach_us.token)
+        url = reverse_lazy('rest_api:team-assessments', kwargs={'tid': team.id})
+        data = [{"assessment_id": 1, "assessed_id": self.athlete_us.id, "value": 1},
+                {"assessment_id": 1, "assessed_id": self.athlete_us.id, "value": 3},
+                {"assessment_id": 2, "assessed_id": self.athlete_us.id, "value": 2}]
+        response = self.client.post(url, data, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        rollups = TeamAssessmentRollup.objects.using(localized_db).filter(team=team)
+        rollup = rollups.get(assessment_id=1)
+        self.assertEqual((rollup.value_count, rollup.value_sum, rollup.value_min, rollup.value_max, rollup.latest_value),
+                         (2, 4, 1, 3, 3))
+
+        url = reverse_lazy('rest_api:team-assessments-average', kwargs={'tid': team.id})
+        response = self.client.get(url, format='json', HTTP_AUTHORIZATION=auth)
+        gen_phys = next(x for x in response.data if x['name'] == 'General-Physical')
+        fms = next(x for x in gen_phys['childs'] if x['name'] == 'Fundamental Movement Skills')
+        got_id_1_value = next(x for x in fms['childs'] if x[0]['assessment_id'] == 1)
+        self.assertEqual(float(got_id_1_value[0]['value']), 2)
+
+        ChosenAssessment.objects.using(localized_db).get(team=team, assessment_id=1, value=3).delete()
+        rollup = rollups.get(assessment_id=1)
+        self.assertEqual((rollup.value_count, rollup.value_max, rollup.latest_value), (1, 1, 1))
+
+        # Moved to another assessment (possible in the admin): both rollups follow
+        chosen_assessment = ChosenAssessment.objects.using(localized_db).get(team=team, assessment_id=1)
+        chosen_assessment.assessment_id = 2
+        chosen_assessment.save(using=localized_db)
+        self.assertFalse(rollups.filter(assessment_id=1).exists())
+        rollup = rollups.get(assessment_id=2)
+        self.assertEqual((rollup.value_count, rollup.value_sum), (2, 3))
+
+    def test_create_team_assessments_query_count_is_flat(self):
+        localized_db = self.coach_us.country
+        response = self.create_team(self.coach_us)
+        team = Team.objects.using(localized_db).get(id=response.data['id'])
+
+        with mock.patch('multidb_account.invite.models.loader.render_to_string') as mock_render_to_string:
+            mock_render_to_string.return_value = 'some email text'
+            self.invite_users(requester=self.coach_us, recipient=self.athlete_us, team_id=team.id)
+            token = mock_render_to_string.call_args_list[0][0][1]['token']
+        self.confirm_invite(token=token, confirmer=self.athlete_us)
+
+        auth = 'JWT {}'.format(self.coach_us.token)
+        url = reverse_lazy('rest_api:team-assessments', kwargs={'tid': team.id})
+
+        def post(data):
+            with CaptureQueriesContext(connections[localized_db]) as queries:
+                response = self.client.post(url, data, format='json', HTTP_AUTHORIZATION=auth)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        # Load the reference data
+        post([{"assessment_id": 1, "assessed_id": self.athlete_us.id, "value": 1}])
+
+        query_count = post([{"assessment_id": 1, "assessed_id": self.athlete_us.id, "value": 1}])
+        more_query_count = post([{"assessment_id": assessment_id, "assessed_id": self.athlete_us.id, "value": 2}
+                                 for assessment_id in (1, 1, 2, 3, 4)])
+        self.assertEqual(more_query_count, query_count)
+        self.assertEqual(ChosenAssessment.objects.using(localized_db).filter(team=team).count(), 7)
+
+        # Rejected items are still reported one by one
+        response = self.client.post(url, [{"assessment_id": 1, "assessed_id": self.athlete_us.id, "value": 2},
+                                          {"assessment_id": 1, "assessed_id": 0, "value": 2}],
+                                    format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data['valid']), 1)
+        self.assertEqual(len(response.data['rejected']), 1)
+
+    def test_list_team_assessments_query_count_is_flat(self):
+        localized_db = self.coach_us.country
+        response = self.create_team(self.coach_us)
+        team = Team.objects.using(localized_db).get(id=response.data['id'])
+        auth = 'JWT {}'.format(self.coach_us.token)
+        url = reverse_lazy('rest_api:team-assessments', kwargs={'tid': team.id})
+
+        def get_latest():
+            with CaptureQueriesContext(connections[localized_db]) as queries:
+                response = self.client.get(url, {'latest': ''}, format='json', HTTP_AUTHORIZATION=auth)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [(x['assessed']['id'], x['value'] and float(x['value'])) for x in response.data], len(queries)
+
+        athletes = [self.athlete_us] + [self.create_random_user(country=localized_db, user_type=USER_TYPE_ATHLETE)
+                                        for _ in range(2)]
+        team.athletes.add(self.athlete_us.athleteuser)
+        ChosenAssessment.objects.using(localized_db).create(team=team, assessed_id=self.athlete_us.id,
+                                                            assessor_id=self.athlete_us.id, assessment_id=1, value=1)
+        data, query_count = get_latest()
+        self.assertEqual(data, [(self.athlete_us.id, 1)])
+
+        for athlete in athletes[1:]:
+            team.athletes.add(athlete.athleteuser)
+        for value in (2, 3):
+            ChosenAssessment.objects.using(localized_db).create(team=team, assessed_id=athletes[1].id,
+                                                                assessor_id=self.athlete_us.id, assessment_id=1,
+                                                                value=value)
+        data, more_query_count = get_latest()
+        self.assertEqual(data, sorted([(self.athlete_us.id, 1), (athletes[1].id, 3), (athletes[2].id, None)]))
+        self.assertEqual(more_query_count, query_count)
+
     def test_revoke_from_team(self):
         localized_db = self.coach_ca.country
         team_owner = self.coach_ca
@@ -376,3 +493,50 @@ class TeamTests(ApiTests):
         got_coach = response.data['linked_users'][0]
         self.assertEqual(got_coach['id'], our_coach_2.pk)
         self.assertEqual(got_coach['teams'], [])
+
+    @override_settings(USER_CONNECTION_GRAPH=True)
+    def test_user_connection_graph(self):
+        localized_db = self.coach_ca.country
+        team_coach = self.create_random_user(country=localized_db, user_type=USER_TYPE_COACH)
+        response = self.create_team(owner=self.coach_ca)
+        team = Team.objects.using(localized_db).get(id=response.data['id'])
+
+        team.athletes.add(self.athlete_ca.athleteuser)
+        team.coaches.add(team_coach.coachuser)
+        self.assertTrue(self.athlete_ca.is_connected_to(team_coach.id))
+        self.assertTrue(team_coach.is_connected_to(self.athlete_ca.id))
+        self.assertTrue(self.coach_ca.is_connected_to(self.athlete_ca.id))
+        self.assertEqual(self.athlete_ca.get_linked_users(), {team_coach.coachuser})
+        self.assertEqual(self.coach_ca.get_linked_users(), {self.athlete_ca.athleteuser})
+
+        Coaching.objects.using(localized_db).create(athlete=self.athlete_ca.athleteuser, coach=team_coach.coachuser)
+        team.athletes.remove(self.athlete_ca.athleteuser)
+        self.assertTrue(team_coach.is_connected_to(self.athlete_ca.id))
+        self.assertFalse(self.coach_ca.is_connected_to(self.athlete_ca.id))
+
+        Coaching.objects.using(localized_db).filter(coach=team_coach.coachuser).delete()
+        self.assertFalse(self.athlete_ca.is_connected_to(team_coach.id))
+
+        # The maintained graph is the one rebuilt from scratch
+        connections = set(UserConnection.objects.using(localized_db).values_list('user_id', 'other_user_id', 'link'))
+        self.assertEqual(connections, get_user_connections(localized_db))
+
+    def test_team_access_follows_the_memberships(self):
+        localized_db = self.coach_ca.country
+        coach = self.create_random_user(country=localized_db, user_type=USER_TYPE_COACH)
+        response = self.create_team(owner=self.coach_ca)
+        team = Team.objects.using(localized_db).get(id=response.data['id'])
+
+        auth = 'JWT {}'.format(coach.token)
+        url = reverse_lazy('rest_api:team-assessments', kwargs={'tid': team.id})
+        response = self.client.get(url, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # The access cached by the previous request is invalidated
+        team.coaches.add(coach.coachuser)
+        response = self.client.get(url, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        team.coaches.remove(coach.coachuser)
+        response = self.client.get(url, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
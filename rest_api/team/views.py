@@ -5,7 +5,9 @@ from rest_framework.generics import DestroyAPIView
 from rest_framework import status
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
+from multidb_account.identity_map import get_object
 from multidb_account.team.models import Team
+from rest_api.pagination import PaginationMixin
 from .permissions import IsCoachTeamMember, IsAuthenticatedCoachOrOrganisation, IsTeamMemberOrOwner, IsTeamOwner
 from .serializers import TeamPreCompetitionListSerializer, TeamListSerializer, TeamCreateSerializer,\
     TeamUpdateSerializer, TeamPictureUploadSerializer, TeamRevokeSerializer
@@ -20,7 +22,7 @@ class TeamPreCompetitionList(APIView):
 
     def get_object(self, request, tid):
         try:
-            team = Team.objects.using(request.user.country).get(pk=tid)
+            team = get_object(Team, pk=tid)
             self.check_object_permissions(self.request, team)
             return team
         except Team.DoesNotExist:
@@ -43,7 +45,7 @@ class TeamPreCompetitionList(APIView):
                                                          context={'request': request}).data)
 
 
-class TeamCreateList(APIView):
+class TeamCreateList(PaginationMixin, APIView):
     """
     List all teams available, or create a new team.
     """
@@ -51,15 +53,15 @@ class TeamCreateList(APIView):
     permission_classes = (IsAuthenticatedCoachOrOrganisation,)
 
     def get_queryset(self):
-        return Team.objects.using(self.request.user.country).all()
+        return Team.objects.all().prefetch_related('athletes__user', 'coaches__user')
 
     def get(self, request, format=None):
         """
-        List all teams available.
+        List all teams available, a page at a time.
         """
-        queryset = self.get_queryset()
-        serializer = TeamListSerializer(queryset, many=True)
-        return Response(serializer.data)
+        teams = self.paginate_queryset(self.get_queryset())
+        serializer = TeamListSerializer(teams, many=True)
+        return self.get_paginated_response(serializer.data)
 
     def post(self, request, format=None):
         """
@@ -82,7 +84,7 @@ class TeamDetail(APIView):
 
     def get_object(self, request, tid):
         try:
-            team = Team.objects.using(request.user.country).get(pk=tid)
+            team = get_object(Team, pk=tid)
             self.check_object_permissions(self.request, team)
             return team
         except Team.DoesNotExist:
@@ -118,7 +120,7 @@ class TeamPictureUpload(APIView):
 
     def get_object(self, request, tid):
         try:
-            team = Team.objects.using(request.user.country).get(pk=tid)
+            team = get_object(Team, pk=tid)
             self.check_object_permissions(self.request, team)
             return team
         except Team.DoesNotExist:
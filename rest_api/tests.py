@@ -10,7 +10,10 @@ from typing import List
 from multidb_account.constants import USER_TYPE_ATHLETE, USER_TYPE_COACH, USER_TYPE_ORG
 from multidb_account.user.models import CoachUser, AthleteUser, Organisation
 from multidb_account.assessment.models import Assessor, Assessed
+from multidb_account.assessment_norms import clear_assessment_norms
+from multidb_account.reference_data.cache import clear_reference_data
 from multidb_account.sport.models import Sport, ChosenSport
+from multidb_account.user_access import clear_user_access
 from payment_gateway.models import Customer
 
 from rest_api.utils import generate_user_jwt_token
@@ -24,6 +27,11 @@ class ApiTests(APITestCase):
     user_counter = 0
 
     def setUp(self):
+        # The reference data, assessments and memberships changed by a previous test were rolled back
+        clear_reference_data()
+        clear_assessment_norms()
+        clear_user_access()
+
         self.profile_items = ["email", "country", "user_type", "province_or_state", "city", "first_name", "last_name",
                               "date_of_birth", "newsletter", "terms_conditions", "measuring_system", "tagline",
                               ]
@@ -19,7 +19,8 @@ from .user.views import CustomUserLogin, CustomUserLogout, CustomUserRegisterLis
     CustomUserProfilePictureUpload, CustomUserChangePassword, CustomUserResetPassword, CustomUserResetPasswordConfirm, \
     BaseCustomUserAutocomplete
 from .assessment.views import ChosenAssessmentListUpdateCreate, AssessmentTopCategoryPermission, \
-    TeamChosenAssessmentListUpdateCreate, AssessmentList, TeamAssessmentsAverage
+    TeamChosenAssessmentListUpdateCreate, AssessmentList, TeamAssessmentsAverage, ChosenAssessmentHistory, \
+    ChosenAssessmentPercentiles
 from .sport_engine.views import SportEngineEventViewSet, SportEngineGameViewSet
 
 root_router = DefaultRouter()
@@ -65,6 +66,10 @@ urlpatterns = [
     url(r'^users/(?P<uid>[0-9]+)/invites/$', UserPendingInviteList.as_view(), name="user-invites"),
     url(r'^users/(?P<uid>[0-9]+)/picture/$', CustomUserProfilePictureUpload.as_view(), name="user-picture"),
     url(r'^users/(?P<uid>[0-9]+)/assessments/$', ChosenAssessmentListUpdateCreate.as_view(), name="chosen-assessments"),
+    url(r'^users/(?P<uid>[0-9]+)/assessments/history/$', ChosenAssessmentHistory.as_view(),
+        name="chosen-assessments-history"),
+    url(r'^users/(?P<uid>[0-9]+)/assessments/percentiles/$', ChosenAssessmentPercentiles.as_view(),
+        name="chosen-assessments-percentiles"),
     url(r'^users/(?P<uid>[0-9]+)/goals/$', UserGoalViewSet.as_view({'get': 'list'}), name="user-goals"),
     url(r'^users/(?P<uid>[0-9]+)/assessments/permissions/$', AssessmentTopCategoryPermission.as_view(),
         name="assessment-permissions"),
@@ -4,13 +4,15 @@ from itertools import chain
 from django.conf import settings as django_settings
 from django.contrib.auth import get_user_model
 from django.core import signing
-from django.db.models import Q
+from django.db.models import Prefetch, Q, prefetch_related_objects
 from rest_framework import serializers
 
-from multidb_account.assessment.models import AssessmentTopCategory, Assessed, AssessmentTopCategoryPermission, Assessor
+from multidb_account.assessment.models import Assessed, AssessmentAccess, Assessor
 from multidb_account.choices import MEASURING, USER_TYPES
 from multidb_account.constants import USER_TYPE_COACH, USER_TYPE_ATHLETE, USER_TYPE_ORG
-from multidb_account.sport.models import Sport, ChosenSport
+from multidb_account.reference_data.cache import get_reference_data
+from multidb_account.sport.models import ChosenSport
+from multidb_account.team.models import Team
 from multidb_account.user.models import AthleteUser, CoachUser, Organisation, Coaching
 from multidb_account.utils import get_user_from_localized_databases
 from payment_gateway.models import Customer
@@ -182,6 +184,31 @@ class UserAllTeamsSerializer(serializers.Serializer):
     team_id = serializers.IntegerField()
 
 
+class AthleteCoachLinkedListSerializer(serializers.ListSerializer):
+    """
+    Serialize the linked users at once: their chosen sports, organisation teams and granted assessment top categories
+    are loaded for all of them first.
+    """
+
+    def to_representation(self, data):
+        linked_users = list(data)
+        users = [self.child._get_user(obj) for obj in linked_users]
+
+        chosen_sports = ChosenSport.objects.select_related('sport')
+        prefetch_related_objects(users, Prefetch('chosensport_set', queryset=chosen_sports))
+        # Only the teams of users, not of athlete or coach profiles, are listed (see `get_all_teams`)
+        organisation_teams = Team.objects.filter(organisation__isnull=False)
+        prefetch_related_objects([obj for obj, user in zip(linked_users, users) if obj is user],
+                                 Prefetch('athleteuser__team_membership', queryset=organisation_teams,
+                                          to_attr='organisation_teams'),
+                                 Prefetch('coachuser__team_membership', queryset=organisation_teams,
+                                          to_attr='organisation_teams'))
+        self.context['granted_top_category_ids'] = self.child.get_granted_top_category_ids(
+            [user.pk for user in users if user.user_type == USER_TYPE_ATHLETE])
+
+        return super().to_representation(linked_users)
+
+
 class AthleteCoachLinkedSerializer(serializers.Serializer):
     id = serializers.SerializerMethodField()
     email = serializers.SerializerMethodField()
@@ -195,6 +222,9 @@ class AthleteCoachLinkedSerializer(serializers.Serializer):
     all_teams = serializers.SerializerMethodField()
     chosen_sports = serializers.SerializerMethodField()
 
+    class Meta:
+        list_serializer_class = AthleteCoachLinkedListSerializer
+
     def _get_user(self, obj):
         return obj.user if hasattr(obj, 'user') else obj
 
@@ -229,14 +259,21 @@ class AthleteCoachLinkedSerializer(serializers.Serializer):
     def get_all_teams(self, obj):
         qs = []
         is_coaching = None
+        profile = None
         only_org_teams = Q(organisation__isnull=False)
 
         if hasattr(obj, 'athleteuser'):
             is_coaching = False
-            qs = obj.athleteuser.team_membership.filter(only_org_teams)
+            profile = obj.athleteuser
         elif hasattr(obj, 'coachuser'):
             is_coaching = True
-            qs = obj.coachuser.team_membership.filter(only_org_teams)
+            profile = obj.coachuser
+
+        if profile is not None:
+            # Prefetched by `AthleteCoachLinkedListSerializer`
+            qs = getattr(profile, 'organisation_teams', None)
+            if qs is None:
+                qs = profile.team_membership.filter(only_org_teams)
 
         data = [{
             'is_coaching': is_coaching,
@@ -255,24 +292,37 @@ class AthleteCoachLinkedSerializer(serializers.Serializer):
             return request.build_absolute_uri(user.profile_picture.url)
         return ''
 
+    def get_granted_top_category_ids(self, assessed_ids):
+        """
+        Top category ids granted to the request user by athletes, as their assessor or as a login user of the
+        organisation of their teams, by athlete
+        """
+        granted_top_category_ids = defaultdict(set)
+        if not assessed_ids:
+            return granted_top_category_ids
+
+        request_user = self.context.get('request').user
+        assessed_from_org_team = Q(assessed__athlete__team_membership__organisation__login_users=request_user) | \
+            Q(assessed__coach__team_membership__organisation__login_users=request_user)
+        for assessed_id, top_category_ids in AssessmentAccess.objects \
+                .filter(Q(assessor_id=request_user.id) | assessed_from_org_team, assessed_id__in=assessed_ids) \
+                .values_list('assessed_id', 'top_category_ids'):
+            granted_top_category_ids[assessed_id].update(top_category_ids)
+        return granted_top_category_ids
+
     def get_granted_assessment_top_categories(self, obj):
         request = self.context.get('request')
-        request_user = request.user
         obj_user = self._get_user(obj)
         # we list sports chosen + displayed + granted to coach by the athlete (athlete=obj here)
         if obj_user.user_type == USER_TYPE_ATHLETE:
-            assessed_from_org_team = Q(assessed__athlete__team_membership__organisation__login_users=request_user) | \
-                                     Q(assessed__coach__team_membership__organisation__login_users=request_user)
-
-            granted_assessment_top_category_ids = AssessmentTopCategoryPermission.objects.using(request.user.country) \
-                .filter(Q(assessor_id=request_user.id) | assessed_from_org_team,
-                        assessed_id=obj_user.pk,
-                        assessor_has_access=True) \
-                .values_list('assessment_top_category__id', flat=True)
-
-            granted_assessment_top_categories = AssessmentTopCategory.objects.using(request.user.country) \
-                .filter(pk__in=granted_assessment_top_category_ids)
-
+            granted_top_category_ids = self.context.get('granted_top_category_ids')
+            if granted_top_category_ids is None:
+                granted_top_category_ids = self.get_granted_top_category_ids([obj_user.pk])
+
+            top_categories = get_reference_data(request.user.country).top_categories
+            granted_assessment_top_categories = [top_categories[pk]
+                                                 for pk in sorted(granted_top_category_ids.get(obj_user.pk, ()))
+                                                 if pk in top_categories]
             return AssessmentTopCategorySerializer(granted_assessment_top_categories, many=True).data
         return []
 
@@ -420,7 +470,7 @@ class CustomUserRegistrationSerializer(serializers.ModelSerializer):
         user.measuring_system = validated_data.get('measuring_system', 'metric')
 
         # create default user's chosen sport and set value if if specified in the validated_data
-        for default_sport in Sport.objects.using(user.country).filter(is_available=True):
+        for default_sport in get_reference_data(user.country).get_available_sports():
             ChosenSport.objects.using(user.country).create(user_id=user.id, sport_id=default_sport.id,
                                                            is_chosen=False, is_displayed=False)
 
@@ -480,13 +530,12 @@ class CustomUserRegistrationSerializer(serializers.ModelSerializer):
         if not data.get('country') in getattr(django_settings, 'LOCALIZED_DATABASES', None):
             raise serializers.ValidationError({"country": "Unsupported country code: {}".format(data.get('country'))})
 
-        try:
-            if data.get('chosensport_set'):
-                for sport_data in data.get('chosensport_set'):
-                    Sport.objects.using(data.get('country')).get(pk=sport_data.get('sport_id'))
-        except Sport.DoesNotExist:
-            raise serializers.ValidationError({"chosen_sports": "Unknown sport_id: {}".
-                                              format(sport_data.get('sport_id'))})
+        if data.get('chosensport_set'):
+            sports = get_reference_data(data.get('country')).sports
+            for sport_data in data.get('chosensport_set'):
+                if sport_data.get('sport_id') not in sports:
+                    raise serializers.ValidationError({"chosen_sports": "Unknown sport_id: {}".
+                                                      format(sport_data.get('sport_id'))})
         return data
 
 
@@ -695,13 +744,12 @@ class CustomUserUpdateSerializer(serializers.ModelSerializer):
         return instance
 
     def validate(self, data):
-        try:
-            if data.get('chosensport_set'):
-                for sport_data in data.get('chosensport_set'):
-                    Sport.objects.using(self.instance.country).get(pk=sport_data.get('sport_id'))
-        except Sport.DoesNotExist:
-            raise serializers.ValidationError({"chosen_sports": "Unknown sport_id: {}".
-                                              format(sport_data.get('sport_id'))})
+        if data.get('chosensport_set'):
+            sports = get_reference_data(self.instance.country).sports
+            for sport_data in data.get('chosensport_set'):
+                if sport_data.get('sport_id') not in sports:
+                    raise serializers.ValidationError({"chosen_sports": "Unknown sport_id: {}".
+                                                      format(sport_data.get('sport_id'))})
 
         return data
 
@@ -797,6 +845,21 @@ class OrganisationUserUpdateSerializer(CustomUserUpdateSerializer):
                  ('size', 'description', 'sports', 'phone_number', 'organisation_name', 'team_ownerships')
 
 
+def _profiles(model):
+    """ Athlete or coach profiles with their user """
+    return model.objects.select_related('user')
+
+
+def _teams(athletes=False, coaches=False):
+    """ Teams with their sport, and their athletes and/or coaches """
+    teams = Team.objects.select_related('sport')
+    if athletes:
+        teams = teams.prefetch_related(Prefetch('athletes', queryset=_profiles(AthleteUser)))
+    if coaches:
+        teams = teams.prefetch_related(Prefetch('coaches', queryset=_profiles(CoachUser)))
+    return teams
+
+
 class CustomUserListSerializer(serializers.ModelSerializer):
     """
     Serializer for user list endpoint.
@@ -820,6 +883,15 @@ class CustomUserListSerializer(serializers.ModelSerializer):
                   'measuring_system', 'profile_picture_url', 'linked_users', 'team_memberships', 'schools',
                   'new_dashboard', 'organisations')
 
+    @classmethod
+    def get_prefetch_related(cls):
+        """
+        Lookups loading what is serialized for a user, to pass to `prefetch_related_objects()`: its linked users
+        and teams are then read from the prefetched relations.
+        """
+        return [Prefetch('chosensport_set', queryset=ChosenSport.objects.select_related('sport')), 'education_set',
+                'member_of_organisations']
+
     def get_profile_picture_url(self, obj):
         request = self.context.get('request')
         if obj.profile_picture and obj.profile_picture.url and request:
@@ -856,7 +928,8 @@ class CustomUserListSerializer(serializers.ModelSerializer):
             # one to one connections
             athletes.extend(list(obj.coachuser.athleteuser_set.all()))
             # connections through teams
-            for team in (obj.coachuser.team_membership.all() | obj.team_ownership.all()).distinct():
+            teams = {team.pk: team for team in chain(obj.coachuser.team_membership.all(), obj.team_ownership.all())}
+            for team in teams.values():
                 athletes.extend(team.get_all_athletes())
 
             athletes = self._filter_by_perms(obj, athletes)
@@ -864,8 +937,9 @@ class CustomUserListSerializer(serializers.ModelSerializer):
 
         elif obj.user_type == USER_TYPE_ORG and request:
             org_members = obj.organisation.members.all()
-            org_teams_athletes = (a.user for t in obj.organisation.teams.all() for a in t.athletes.all())
-            org_teams_coaches = (c.user for t in obj.organisation.teams.all() for c in t.coaches.all())
+            org_teams = obj.organisation.teams.all()
+            org_teams_athletes = (a.user for t in org_teams for a in t.athletes.all())
+            org_teams_coaches = (c.user for t in org_teams for c in t.coaches.all())
             users = set(chain(org_members, org_teams_athletes, org_teams_coaches))
             linked_users = AthleteCoachLinkedSerializer(users, many=True, context={"request": request}).data
         return linked_users
@@ -874,14 +948,14 @@ class CustomUserListSerializer(serializers.ModelSerializer):
     def _filter_by_perms(me, users):
         """ Leave only those users who are connected via permissions """
         qs = Coaching.objects.using(me.country)
-        user_ids = {u.user.id for u in users}
+        user_ids = {u.user_id for u in users}
 
         if me.user_type == USER_TYPE_ATHLETE:
             ids = set(qs.filter(athlete_id=me.id, coach_id__in=user_ids).values_list('coach_id', flat=True).distinct())
         else:
             ids = set(qs.filter(coach_id=me.id, athlete_id__in=user_ids).values_list('athlete_id', flat=True).distinct())
 
-        return [u for u in users if u.user.id in ids]
+        return [u for u in users if u.user_id in ids]
 
     def get_team_memberships(self, obj):
         request = self.context.get('request')
@@ -905,6 +979,13 @@ class AthleteUserListSerializer(CustomUserListSerializer):
     class Meta(CustomUserListSerializer.Meta):
         fields = CustomUserListSerializer.Meta.fields + ('referral_code', 'athlete_terms_conditions',)
 
+    @classmethod
+    def get_prefetch_related(cls):
+        return super().get_prefetch_related() + [
+            Prefetch('athleteuser__coaches', queryset=_profiles(CoachUser)),
+            Prefetch('athleteuser__team_membership', queryset=_teams(coaches=True)),
+        ]
+
 
 class AthleteUserCustomerListSerializer(AthleteUserListSerializer):
     """
@@ -915,6 +996,10 @@ class AthleteUserCustomerListSerializer(AthleteUserListSerializer):
     class Meta(AthleteUserListSerializer.Meta):
         fields = AthleteUserListSerializer.Meta.fields + ('payment_status',)
 
+    @classmethod
+    def get_prefetch_related(cls):
+        return super().get_prefetch_related() + ['athleteuser__customer']
+
 
 class CoachUserListSerializer(CustomUserListSerializer):
     """
@@ -922,6 +1007,14 @@ class CoachUserListSerializer(CustomUserListSerializer):
     """
     team_ownerships = serializers.SerializerMethodField()
 
+    @classmethod
+    def get_prefetch_related(cls):
+        return super().get_prefetch_related() + [
+            Prefetch('coachuser__athleteuser_set', queryset=_profiles(AthleteUser)),
+            Prefetch('coachuser__team_membership', queryset=_teams(athletes=True)),
+            Prefetch('team_ownership', queryset=_teams(athletes=True)),
+        ]
+
     def get_team_ownerships(self, obj):
         request = self.context.get('request')
         teams = []
@@ -944,6 +1037,16 @@ class OrganisationUserListSerializer(CustomUserListSerializer):
     phone_number = serializers.CharField()
     team_ownerships = serializers.SerializerMethodField()
 
+    @classmethod
+    def get_prefetch_related(cls):
+        return super().get_prefetch_related() + [
+            # Ordered, so that `BaseCustomUser.organisation` (`first()`) is the prefetched one
+            Prefetch('organisations', queryset=Organisation.objects.order_by('pk')),
+            'organisations__members',
+            Prefetch('organisations__teams', queryset=_teams(athletes=True, coaches=True)),
+            Prefetch('team_ownership', queryset=_teams()),
+        ]
+
     def get_team_ownerships(self, obj):
         request = self.context.get('request')
         teams = []
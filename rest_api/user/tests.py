@@ -1,13 +1,29 @@
+import time
+
+from django.conf import settings as django_settings
 from django.contrib.auth import get_user_model
 from django.core import signing
 from django.core.urlresolvers import reverse_lazy
+from django.db import connections
 from django.forms.models import model_to_dict
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
+from rest_framework_jwt.settings import api_settings
 
 from multidb_account.constants import USER_TYPE_ATHLETE, USER_TYPE_COACH, PROFILE_PICTURE_WIDTH, PROFILE_PICTURE_HEIGHT, \
     USER_TYPE_ORG
-from multidb_account.user.models import CoachUser, AthleteUser
+from multidb_account.assessment.models import Assessed
+from multidb_account.directory.models import UserDirectoryEntry
+from multidb_account.identity_map import identity_map
+from multidb_account.replicas import is_replica_sticky
+from multidb_account.shard_health import get_circuit_breaker
+from multidb_account.shards import get_current_shard
+from multidb_account.team.models import Team
+from multidb_account.user.models import CoachUser, AthleteUser, Coaching
+from multidb_account.utils import clear_user_directory_miss, is_user_directory_miss
 from rest_api.tests import ApiTests
+from rest_api.utils import custom_jwt_payload_handler
 
 UserModel = get_user_model()
 
@@ -79,6 +95,128 @@ class UserTests(ApiTests):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_login_athlete_through_user_directory(self):
+        entry = UserDirectoryEntry.objects.using('default').get(email=self.athlete_us.email.lower())
+        self.assertEqual(entry.localized_db, self.athlete_us.country)
+        self.assertEqual(entry.user_id, self.athlete_us.id)
+
+        url = reverse_lazy("rest_api:login")
+        data = {"email": self.athlete_us.email.upper(), "password": "password"}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data.get('id'), self.athlete_us.id)
+
+        # Email change is reflected in the directory
+        self.athlete_us.email = 'athlete-directory@test.com'
+        self.athlete_us.save(using=self.athlete_us.country)
+        self.assertEqual(UserDirectoryEntry.get_localized_db('Athlete-Directory@test.com'), self.athlete_us.country)
+        self.assertFalse(UserDirectoryEntry.objects.using('default').filter(email=entry.email).exists())
+
+        # Unknown email
+        data = {"email": 'nobody-directory@test.com', "password": "password"}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_register_while_a_database_is_unavailable(self):
+        url = reverse_lazy("rest_api:users")
+        data = dict(self.user_common_data, **self.athlete_extended_data)
+        data.update({'email': 'athlete-unavailable@test.com', 'country': 'ca', 'user_type': USER_TYPE_ATHLETE,
+                     'password': 'password', 'confirm_password': 'password'})
+
+        # Open the circuit breaker of the 'us' database: the email could be taken there
+        breaker = get_circuit_breaker('us')
+        breaker.opened_at = time.monotonic()
+        self.addCleanup(setattr, breaker, 'opened_at', None)
+
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertTrue(response.has_header('Retry-After'))
+        self.assertFalse(UserModel.objects.using('ca').filter(email=data['email']).exists())
+
+        breaker.opened_at = None
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(USER_DIRECTORY_CACHE='default', USER_DIRECTORY_CACHE_LOCAL_ONLY=True)
+    def test_unknown_email_is_not_cached_while_a_database_is_unavailable(self):
+        url = reverse_lazy("rest_api:password-reset")
+        email = 'nobody-unavailable@test.com'
+        self.addCleanup(clear_user_directory_miss, email)
+
+        breaker = get_circuit_breaker('us')
+        breaker.opened_at = time.monotonic()
+        self.addCleanup(setattr, breaker, 'opened_at', None)
+
+        response = self.client.post(url, {'email': email}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(is_user_directory_miss(email))
+
+        # Every database answered
+        breaker.opened_at = None
+        response = self.client.post(url, {'email': email}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(is_user_directory_miss(email))
+
+    def test_authenticate_with_shard_claim(self):
+        url = reverse_lazy('rest_api:user-detail', kwargs={'uid': self.athlete_us.id})
+
+        payload = custom_jwt_payload_handler(self.athlete_us)
+        self.assertEqual(payload['shard'], self.athlete_us.country)
+        response = self.client.get(url, format='json', HTTP_AUTHORIZATION='JWT {}'.format(self.athlete_us.token))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Tokens issued before the shard claim existed
+        del payload['shard']
+        auth = 'JWT {}'.format(api_settings.JWT_ENCODE_HANDLER(payload))
+        response = self.client.get(url, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Shard claim not matching the user's country
+        payload['shard'] = 'ca'
+        auth = 'JWT {}'.format(api_settings.JWT_ENCODE_HANDLER(payload))
+        response = self.client.get(url, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_current_shard_is_scoped_to_the_request(self):
+        url = reverse_lazy('rest_api:user-detail', kwargs={'uid': self.athlete_us.id})
+        response = self.client.get(url, format='json', HTTP_AUTHORIZATION='JWT {}'.format(self.athlete_us.token))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['email'], self.athlete_us.email)
+
+        self.assertIsNone(get_current_shard())
+
+        # A user of the same id in another database is not served from the previous request's shard
+        url = reverse_lazy('rest_api:user-detail', kwargs={'uid': self.athlete_ca.id})
+        response = self.client.get(url, format='json', HTTP_AUTHORIZATION='JWT {}'.format(self.athlete_ca.token))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['email'], self.athlete_ca.email)
+
+    def test_api_requests_do_not_use_the_session(self):
+        url = reverse_lazy('rest_api:user-detail', kwargs={'uid': self.athlete_us.id})
+        # E.g. an admin session cookie sent along by the browser
+        self.client.cookies[django_settings.SESSION_COOKIE_NAME] = 'admin-session-key'
+
+        response = self.client.get(url, format='json', HTTP_AUTHORIZATION='JWT {}'.format(self.athlete_us.token))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.wsgi_request.session.session_key)
+        self.assertNotIn(django_settings.SESSION_COOKIE_NAME, response.cookies)
+
+    @override_settings(SHARD_REPLICAS={'us': 'us_replica'}, SHARD_REPLICA_CACHE='default',
+                       SHARD_REPLICA_CACHE_LOCAL_ONLY=True)
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        url = reverse_lazy('rest_api:user-detail', kwargs={'uid': self.athlete_us.id})
+        auth = 'JWT {}'.format(self.athlete_us.token)
+        self.assertFalse(is_replica_sticky('us', self.athlete_us.id))
+
+        response = self.client.patch(url, {'tagline': 'New tagline'}, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(is_replica_sticky('us', self.athlete_us.id))
+
+        # Served by the primary: the replica alias isn't even declared here
+        response = self.client.get(url, format='json', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['tagline'], 'New tagline')
+
     def cancel_athlete(self):
         auth = 'JWT {}'.format(self.athlete_ca.token)
         data = {"token": 'tok_visa', 'plan': 'monthly'}
@@ -121,8 +259,52 @@ class UserTests(ApiTests):
         self.assertEqual(athlete_canceled.coaching_set.all().count(), 0)
         assessed = athlete_canceled.get_assessed()
         assessor = athlete_canceled.get_assessor()
-        self.assertEqual(assessed.assessmenttopcategorypermission_set.all().count(), 0)
-        self.assertEqual(assessor.assessmenttopcategorypermission_set.all().count(), 0)
+        self.assertEqual(assessed.assessmentaccess_set.all().count(), 0)
+        self.assertEqual(assessor.assessmentaccess_set.all().count(), 0)
+
+    def test_identity_map_shares_the_users_of_the_request(self):
+        localized_db = self.athlete_ca.country
+        assessed_id = self.athlete_ca.get_assessed().pk
+
+        with identity_map(), CaptureQueriesContext(connections[localized_db]) as queries:
+            first = Assessed.objects.using(localized_db).get(pk=assessed_id)
+            second = Assessed.objects.using(localized_db).get(pk=assessed_id)
+            self.assertEqual(first.get_email(), self.athlete_ca.email)
+            self.assertIs(second.get_user(), first.get_user())
+            self.assertEqual(second.get_first_name(), self.athlete_ca.first_name)
+
+        # The two assessed, then their user once
+        self.assertEqual(len(queries), 3)
+
+    def test_coach_profile_is_loaded_in_a_fixed_number_of_queries(self):
+        coach = self.coach_ca
+        auth = 'JWT {}'.format(coach.token)
+        url = reverse_lazy('rest_api:user-detail', kwargs={'uid': coach.id})
+        team = Team.objects.using(coach.country).get(pk=self.create_team(owner=coach).data['id'])
+
+        def add_athlete():
+            athlete = self.create_random_user(country=coach.country, user_type=USER_TYPE_ATHLETE)
+            Coaching.objects.using(coach.country).create(coach=coach.coachuser, athlete=athlete.athleteuser)
+            team.athletes.add(athlete.athleteuser)
+
+        def get_profile():
+            with CaptureQueriesContext(connections[coach.country]) as queries:
+                response = self.client.get(url, format='json', HTTP_AUTHORIZATION=auth)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return response.data, len(queries)
+
+        # Measured once the caches of the request (authentication, reference data) are filled
+        add_athlete()
+        get_profile()
+        data, query_count = get_profile()
+        self.assertEqual(len(data['linked_users']), 1)
+
+        for _ in range(3):
+            add_athlete()
+        get_profile()
+        data, more_athletes_query_count = get_profile()
+        self.assertEqual(len(data['linked_users']), 4)
+        self.assertEqual(more_athletes_query_count, query_count)
 
     def test_list_athlete_details(self):
         auth = 'JWT {}'.format(self.athlete_ca.token)
@@ -383,8 +565,8 @@ class UserTests(ApiTests):
         self.assertEqual(coach_canceled.coaching_set.all().count(), 0)
         assessed = coach_canceled.get_assessed()
         assessor = coach_canceled.get_assessor()
-        self.assertEqual(assessed.assessmenttopcategorypermission_set.all().count(), 0)
-        self.assertEqual(assessor.assessmenttopcategorypermission_set.all().count(), 0)
+        self.assertEqual(assessed.assessmentaccess_set.all().count(), 0)
+        self.assertEqual(assessor.assessmentaccess_set.all().count(), 0)
 
     def test_list_coach_details(self):
         auth = 'JWT {}'.format(self.coach_us.token)
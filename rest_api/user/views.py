@@ -3,7 +3,7 @@ from django.conf import settings as django_settings
 from django.contrib.auth import get_user_model
 from django.core import signing
 from django.core.mail import send_mail
-from django.db.models import Q
+from django.db.models import Q, prefetch_related_objects
 from django.http import Http404
 from django.template import loader
 from django.utils.translation import ugettext_lazy as _
@@ -129,7 +129,7 @@ class CustomUserLogout(APIView):
 
     def get_object(self, request):
         try:
-            return UserModel.objects.using(request.user.country).get(email=request.user.email)
+            return UserModel.objects.get(email=request.user.email)
         except UserModel.DoesNotExist:
             raise Http404
 
@@ -164,7 +164,7 @@ class CustomUserProfilePictureUpload(APIView):
 
     def get_object(self, request, uid):
         try:
-            user = UserModel.objects.using(request.user.country).get(pk=uid)
+            user = UserModel.objects.get(pk=uid)
             # Call to check permissions first
             self.check_object_permissions(self.request, user)
             return user
@@ -194,7 +194,7 @@ class CustomUserRegisterList(APIView):
     """
 
     # def get_queryset(self):
-    #     return UserModel.objects.using(self.request.user.country).all()
+    #     return UserModel.objects.all()
     #
     # def get(self, request, format=None):
     #     """
@@ -232,7 +232,7 @@ class CustomUserDetail(APIView):
 
     def get_object(self, request, uid):
         try:
-            user = UserModel.objects.using(request.user.country).prefetch_related('organisations').get(pk=uid)
+            user = UserModel.objects.get(pk=uid)
             # Call to check permissions first
             self.check_object_permissions(self.request, user)
             return user
@@ -249,6 +249,7 @@ class CustomUserDetail(APIView):
             USER_TYPE_ORG: OrganisationUserListSerializer,
         }
         serializer_class = map_usertype_to_serializerclass.get(user.user_type, CoachUserListSerializer)
+        prefetch_related_objects([user], *serializer_class.get_prefetch_related())
         serializer = serializer_class(user, context={"request": request})
         return Response(serializer.data)
 
@@ -302,7 +303,7 @@ class BaseCustomUserAutocomplete(autocomplete.Select2QuerySetView):
         if not self.request.user.is_authenticated() or not self.request.user.is_staff:
             return BaseCustomUser.objects.none()
 
-        qs = BaseCustomUser.objects.using(self.request.user.country).all()
+        qs = BaseCustomUser.objects.all()
         if self.q:
             qs = qs.filter(
                 Q(email__istartswith=self.q) |
@@ -23,6 +23,9 @@ def custom_jwt_payload_handler(user, timedelta_hours=None):
     }
     if hasattr(user, 'email'):
         payload['email'] = user.email
+    if getattr(user, 'country', None):
+        # Localized database of the user, so that authentication goes straight to it
+        payload['shard'] = user.country
     if isinstance(user.pk, uuid.UUID):
         payload['user_id'] = str(user.pk)
 
@@ -1,4 +1,5 @@
 from rest_framework.viewsets import ModelViewSet
+from rest_api.pagination import LinkHeaderCursorPagination
 from .permissions import IsOwnerOrReadOnly
 from .serializers import VideoSerializer
 from multidb_account.videos.models import Video
@@ -10,9 +11,10 @@ class VideoViewSet(ModelViewSet):
     """
     permission_classes = (IsOwnerOrReadOnly,)
     serializer_class = VideoSerializer
+    pagination_class = LinkHeaderCursorPagination
 
     def get_queryset(self):
-        return Video.objects.using(self.request.user.country).filter(user=self.kwargs['uid'])
+        return Video.objects.filter(user=self.kwargs['uid'])
 
     def get_serializer(self, *args, **kwargs):
         if kwargs.get('data') is not None:
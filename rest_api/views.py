@@ -3,6 +3,9 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from multidb_account.db.pool import get_pools_stats
+from multidb_account.replicas import get_replicas_lag
+from multidb_account.shard_health import get_shards_health
 from payment_gateway.models import Customer
 from rest_api.permissions import IsValidDisableCustomersToken
 
@@ -16,8 +19,13 @@ class AwsHealth(APIView):
     def get(self, request):
         """
         An endpoint for aws to check health.
+        The databases' state is only reported: a degraded country database must not take the instances down.
         """
-        return Response(status=status.HTTP_200_OK)
+        return Response({
+            'databases': get_shards_health(),
+            'replicas_lag': get_replicas_lag(),
+            'connection_pools': get_pools_stats(),
+        }, status=status.HTTP_200_OK)
 
 
 class DisableExpiredCustomers(APIView):